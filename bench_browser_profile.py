@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+浏览器配置基准测试
+对比默认配置与精简配置 (LEAN_BROWSER) 的页面加载耗时和内存占用
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from bupa_scraper_v2 import BupaMedicalScraperV2
+from circuit_breaker import CircuitBreaker
+from fake_bupa_site import FakeBupaSite
+from process_stats import get_memory_stats
+from session_cache import SessionCache
+
+
+def measure(lean, rounds):
+    """运行若干轮完整流程，返回每轮耗时 (秒) 和内存 (MB)"""
+    load_times = []
+    location_times = []
+    rss = []
+
+    for _ in range(rounds):
+        with tempfile.TemporaryDirectory() as tmp:
+            # 独立的熔断和会话状态，保证每轮都走完整的首页 + postback 流程
+            scraper = BupaMedicalScraperV2(
+                headless=True,
+                breaker=CircuitBreaker(state_file=f"{tmp}/circuit.json"),
+                session_cache=SessionCache(cache_file=f"{tmp}/session.json"),
+                lean=lean,
+            )
+            try:
+                if not scraper.setup_driver():
+                    raise RuntimeError("WebDriver 初始化失败")
+
+                start = time.time()
+                if not scraper.load_page():
+                    continue
+                load_times.append(time.time() - start)
+
+                start = time.time()
+                if not (scraper.click_new_individual_booking() and scraper.wait_for_location_page()):
+                    continue
+                scraper.extract_location_data()
+                location_times.append(time.time() - start)
+
+                rss.append(get_memory_stats()['total_rss_mb'])
+            finally:
+                scraper.close()
+
+    return load_times, location_times, rss
+
+
+def summarize(label, values, unit):
+    """格式化一组测量值"""
+    if not values:
+        return f"{label}: 无数据"
+    return (f"{label}: 中位数 {statistics.median(values):.2f}{unit}, "
+            f"最小 {min(values):.2f}{unit}, 最大 {max(values):.2f}{unit} (n={len(values)})")
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='对比默认配置与精简配置的页面加载耗时和内存占用')
+    parser.add_argument('rounds', type=int, nargs='?', default=5, help='每种配置运行的轮数')
+    parser.add_argument('--fake', action='store_true', help='对本地模拟网站测试，结果不受网络波动影响')
+    parser.add_argument('--centres', type=int, default=200, help='模拟网站的医疗中心数量')
+    args = parser.parse_args()
+
+    site = None
+    if args.fake:
+        site = FakeBupaSite(centres=args.centres).start()
+        os.environ['BUPA_BASE_URL'] = site.base_url
+
+    print("浏览器配置基准测试")
+    print("=" * 50)
+    print(f"目标: {os.getenv('BUPA_BASE_URL', '真实站点')}")
+
+    try:
+        for lean in (False, True):
+            load_times, location_times, rss = measure(lean, args.rounds)
+            print(f"\n{'精简配置' if lean else '默认配置'}:")
+            print("  " + summarize("首页加载", load_times, "s"))
+            print("  " + summarize("postback + 提取", location_times, "s"))
+            print("  " + summarize("进程树 RSS", rss, "MB"))
+    finally:
+        if site:
+            site.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据导出基准测试
+对比原有的直接覆盖写入 (JSON indent=2) 与原子写入、内容未变化跳过、NDJSON 增量追加
+"""
+
+import csv
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from data_export import DataExporter, FIELDNAMES, snapshot_fingerprint
+
+
+def make_rows(count, version=0, changed_every=100):
+    """生成模拟数据；version 变化时每 changed_every 行中有一行可用时间变化"""
+    rows = []
+    for i in range(count):
+        changed = version and i % changed_every == 0
+        rows.append({
+            "location_id": str(i),
+            "location_name": f"Centre {i}",
+            "full_address": f"Centre {i} - Bupa Centre\nLevel 3,\n{i} Mill Street,\nPerth",
+            "distance": f"{i % 500} km",
+            "availability": f"Friday {1 + (version % 28 if changed else 0):02d}/09/2025\n10:15 AM",
+            "coordinates": "-31.9548200,115.8526330",
+            "center_type": "Bupa Centre" if i % 2 else "Regional Medical Centre",
+            "has_available_slots": True,
+            "extracted_time": f"2025-08-20 10:{version % 60:02d}:00",
+        })
+    return rows
+
+
+def legacy_write(rows, csv_path, json_path):
+    """原有写法：直接覆盖写入，JSON 缩进"""
+    with open(csv_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDNAMES)
+        writer.writeheader()
+        writer.writerows(rows)
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump(rows, f, ensure_ascii=False, indent=2)
+
+
+def timed(func, repeats):
+    """重复运行，返回每次耗时 (毫秒)"""
+    timings = []
+    for i in range(repeats):
+        start = time.perf_counter()
+        func(i)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    """主函数"""
+    row_count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    unchanged = make_rows(row_count)
+    versions = [make_rows(row_count, version=v + 1) for v in range(repeats)]
+
+    print(f"数据导出基准测试: {row_count} 行, 每种方式 {repeats} 次 (中位数)")
+    print("=" * 70)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "locations.csv")
+        json_path = os.path.join(tmp, "locations.json")
+        ndjson_path = os.path.join(tmp, "locations.ndjson")
+
+        legacy = timed(lambda i: legacy_write(versions[i], csv_path, json_path), repeats)
+        legacy_size = os.path.getsize(json_path)
+        print(f"{'原有写法 (覆盖写入, indent=2)':<34} {legacy:9.1f}ms  JSON {legacy_size / 1024:8.0f}KB")
+
+        exporter = DataExporter(state_file=os.path.join(tmp, "state.json"))
+
+        def changed(i):
+            fingerprint = snapshot_fingerprint(versions[i])
+            exporter.export_csv(versions[i], csv_path, fingerprint)
+            exporter.export_json(versions[i], json_path, fingerprint)
+        atomic = timed(changed, repeats)
+        print(f"{'原子写入, 紧凑 JSON (内容变化)':<34} {atomic:9.1f}ms  JSON {os.path.getsize(json_path) / 1024:8.0f}KB")
+
+        exporter.export_csv(unchanged, csv_path)
+        exporter.export_json(unchanged, json_path)
+
+        def same(i):
+            fingerprint = snapshot_fingerprint(unchanged)
+            exporter.export_csv(unchanged, csv_path, fingerprint)
+            exporter.export_json(unchanged, json_path, fingerprint)
+        skipped = timed(same, repeats)
+        print(f"{'内容未变化 (跳过写入)':<34} {skipped:9.1f}ms")
+
+        exporter.append_ndjson(unchanged, ndjson_path)
+        before = os.path.getsize(ndjson_path)
+        ndjson = timed(lambda i: exporter.append_ndjson(versions[i], ndjson_path), repeats)
+        appended = (os.path.getsize(ndjson_path) - before) / repeats
+        print(f"{'NDJSON 增量追加 (约 1% 行变化)':<34} {ndjson:9.1f}ms  追加 {appended / 1024:8.1f}KB/次")
+
+
+if __name__ == "__main__":
+    main()
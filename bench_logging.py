@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+日志开销基准测试
+模拟 1000 行位置表格的一次提取，对比逐行 INFO 日志与汇总日志 / JSON 队列日志的开销
+"""
+
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from log_config import setup_logging
+
+logger = logging.getLogger("bench")
+
+
+def make_rows(count):
+    """生成模拟的位置数据"""
+    return [
+        {
+            "location_name": f"Centre {i}",
+            "availability": "No available slot" if i % 3 else "Friday 29/08/2025\n10:15 AM",
+            "has_available_slots": i % 3 == 0,
+        }
+        for i in range(count)
+    ]
+
+
+def legacy_run(rows):
+    """原有写法：每行两条 INFO 日志，f-string 总是被格式化"""
+    for i, row in enumerate(rows):
+        logger.info(f"提取第 {i+1} 行数据...")
+        logger.info(f"✅ 提取数据: {row['location_name']} - {row['availability']}")
+    logger.info(f"成功提取 {len(rows)} 个位置的数据")
+
+
+def summary_run(rows):
+    """新写法：逐行日志为 DEBUG 且延迟格式化，只输出一条汇总"""
+    for i, row in enumerate(rows):
+        logger.debug("提取第 %d 行数据...", i + 1)
+        logger.debug("提取数据: %s - %s", row["location_name"], row["availability"])
+    available = sum(1 for row in rows if row["has_available_slots"])
+    logger.info(
+        "成功提取 %d/%d 个位置的数据 (有可用时段 %d 个)", len(rows), len(rows), available,
+        extra={"fields": {"event": "extract_summary", "rows": len(rows), "available": available}}
+    )
+
+
+def measure(label, run, rows, repeats, log_format, use_queue):
+    """重复运行并统计每次调用方耗时、总耗时 (含后台写完) 和日志体积"""
+    with tempfile.TemporaryDirectory() as tmp:
+        log_file = os.path.join(tmp, "bench.log")
+        listener = setup_logging(log_file=log_file, log_format=log_format, use_queue=use_queue)
+        # 控制台输出会淹没测量结果，只保留文件处理器
+        handlers = listener.handlers if listener else logging.getLogger().handlers
+        for handler in [h for h in handlers if type(h) is logging.StreamHandler]:
+            handler.setStream(open(os.devnull, "w"))
+
+        timings = []
+        total_start = time.perf_counter()
+        for _ in range(repeats):
+            start = time.perf_counter()
+            run(rows)
+            timings.append((time.perf_counter() - start) * 1000)
+        setup_logging(log_format="text", use_queue=False)
+        total = (time.perf_counter() - total_start) * 1000 / repeats
+        size = os.path.getsize(log_file) / repeats
+
+    print(f"{label:<28} 调用方 p50 {statistics.median(timings):8.3f}ms  "
+          f"含写盘 {total:8.3f}ms  日志 {size / 1024:8.1f}KB/次")
+
+
+def main():
+    """主函数"""
+    row_count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    rows = make_rows(row_count)
+
+    print(f"日志开销基准测试: {row_count} 行, 每种方式 {repeats} 次")
+    print("=" * 80)
+    measure("逐行 INFO (原有写法)", legacy_run, rows, repeats, "text", False)
+    measure("逐行 INFO + JSON 队列", legacy_run, rows, repeats, "json", True)
+    measure("汇总 (文本, 同步)", summary_run, rows, repeats, "text", False)
+    measure("汇总 (JSON, 队列)", summary_run, rows, repeats, "json", True)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,36 +5,68 @@ Bupa Medical Visa Services 预约监控系统
 每次运行爬虫后检查条件并发送邮件通知
 """
 
+import json
 import logging
 import os
 import sys
+import time
 from datetime import datetime
 from dotenv import load_dotenv
 from bupa_scraper_v2 import BupaMedicalScraperV2
-from email_notifier import EmailNotifier
+from email_notifier import EmailNotifier, DigestQueue
+from log_config import setup_logging
+from monitor_config import load_active_ruleset
+from slot_forecast import SlotForecaster
+from slot_ranking import SlotRanker
+from slot_tracker import SlotTracker
 
 # 加载环境变量
 load_dotenv()
 
-# 配置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
 class BupaMonitor:
-    def __init__(self):
-        """初始化监控系统"""
-        self.monitor_locations = os.getenv('MONITOR_LOCATIONS', 'Perth,Booragoon,Fremantle').split(',')
-        self.cutoff_date = os.getenv('CUTOFF_DATE', '2025-08-29')
+    def __init__(self, ruleset=None):
+        """
+        初始化监控系统
         
-        # 清理空格
-        self.monitor_locations = [loc.strip() for loc in self.monitor_locations]
+        Args:
+            ruleset (monitor_config.Ruleset): 订阅规则集，为空时从配置文件或环境变量加载
+        """
+        # 最近一次检查筛选出的预约时段
+        self.last_matching_slots = []
         
-        logger.info(f"监控配置:")
-        logger.info(f"  监控地点: {', '.join(self.monitor_locations)}")
-        logger.info(f"  截止日期: {self.cutoff_date}")
+        # 放号规律统计，供调度器调整检查频率
+        self.forecaster = SlotForecaster()
+        
+        # 时段存续与通知延迟统计
+        self.slot_tracker = SlotTracker()
+        
+        # 时段排序，中心特征在多次检查之间缓存
+        self.ranker = SlotRanker()
+        
+        self.apply_ruleset(ruleset or load_active_ruleset())
+    
+    def apply_ruleset(self, ruleset):
+        """替换订阅规则集，只在两次检查之间调用"""
+        self.ruleset = ruleset
+        self.monitor_locations = list(ruleset.all_locations)
+        # 多个订阅时取最晚的截止日期作为整体条件
+        self.cutoff_date = max(sub.cutoff_date for sub in ruleset.subscriptions)
+        # 按订阅缓存邮件通知器，规则集替换后重新创建
+        self._notifiers = {}
+        
+        logger.info(f"监控配置 ({ruleset.source}):")
+        for sub in ruleset.subscriptions:
+            logger.info(f"  [{sub.name}] 监控地点: {', '.join(sub.locations)}, 截止日期: {sub.cutoff_date}")
+    
+    def _notifier_for(self, subscription):
+        """订阅对应的邮件通知器"""
+        notifier = self._notifiers.get(subscription.name)
+        if notifier is None:
+            notifier = EmailNotifier(self.ruleset.email_config(subscription))
+            self._notifiers[subscription.name] = notifier
+        return notifier
     
     def parse_availability_date(self, availability_text):
         """解析预约时间文本，返回日期对象"""
@@ -59,39 +91,64 @@ class BupaMonitor:
             logger.warning(f"解析日期失败: {availability_text} -> {e}")
             return None
     
-    def filter_matching_slots(self, locations_data):
-        """筛选符合条件的预约时段"""
+    def filter_matching_slots(self, locations_data, subscription=None):
+        """筛选符合条件的预约时段，subscription 为空时使用全部监控地点和整体截止日期"""
         matching_slots = []
-        cutoff_date = datetime.strptime(self.cutoff_date, '%Y-%m-%d').date()
+        if subscription is None:
+            monitor_locations = set(self.monitor_locations)
+            cutoff_text = self.cutoff_date
+        else:
+            monitor_locations = subscription.location_set
+            cutoff_text = subscription.cutoff_date
+        cutoff_date = datetime.strptime(cutoff_text, '%Y-%m-%d').date()
+        monitored = 0
+        unavailable = 0
+        too_late = 0
         
-        logger.info(f"开始筛选条件：监控地点 {self.monitor_locations}，截止日期 {self.cutoff_date}")
+        logger.debug("开始筛选条件：监控地点 %s，截止日期 %s", sorted(monitor_locations), cutoff_text)
         
         for location in locations_data:
             location_name = location['location_name'].strip()
             
             # 检查是否是监控的地点
-            if location_name not in self.monitor_locations:
-                logger.debug(f"跳过非监控地点: {location_name}")
+            if location_name not in monitor_locations:
+                logger.debug("跳过非监控地点: %s", location_name)
                 continue
+            monitored += 1
             
             # 检查是否有可用时段
             if not location['has_available_slots']:
-                logger.info(f"{location_name}: 无可用时段")
+                unavailable += 1
+                logger.debug("%s: 无可用时段", location_name)
                 continue
             
             # 解析预约日期
             availability_date = self.parse_availability_date(location['availability'])
             if not availability_date:
-                logger.warning(f"{location_name}: 无法解析预约日期 - {location['availability']}")
+                logger.warning("%s: 无法解析预约日期 - %s", location_name, location['availability'])
                 continue
             
             # 检查是否在截止日期之前
             if availability_date <= cutoff_date:
                 matching_slots.append(location)
-                logger.info(f"✅ 符合条件: {location_name} - {location['availability']} (日期: {availability_date})")
+                logger.debug("符合条件: %s - %s (日期: %s)", location_name, location['availability'], availability_date)
             else:
-                logger.info(f"❌ 超出截止日期: {location_name} - {location['availability']} (日期: {availability_date})")
+                too_late += 1
+                logger.debug("超出截止日期: %s - %s (日期: %s)", location_name, location['availability'], availability_date)
         
+        logger.info(
+            "筛选完成: 监控地点 %d 个，符合条件 %d 个，无可用时段 %d 个，超出截止日期 %d 个",
+            monitored, len(matching_slots), unavailable, too_late,
+            extra={'fields': {
+                'event': 'filter_summary',
+                'monitored': monitored,
+                'matched': len(matching_slots),
+                'unavailable': unavailable,
+                'too_late': too_late,
+                'cutoff_date': cutoff_text,
+                'subscription': subscription.name if subscription else None,
+            }}
+        )
         return matching_slots
     
     def check_and_notify(self, locations_data):
@@ -104,39 +161,131 @@ class BupaMonitor:
                 logger.warning("没有位置数据可检查")
                 return False
             
-            # 筛选符合条件的预约
-            matching_slots = self.filter_matching_slots(locations_data)
+            # 记录放号统计和时段存续
+            scrape_time = self.slot_tracker.scrape_time(locations_data)
+            self.forecaster.observe_all(locations_data)
+            self.forecaster.save()
+            self.slot_tracker.observe(locations_data, scrape_time)
+            self.slot_tracker.save()
             
-            if matching_slots:
-                logger.info(f"🎯 发现 {len(matching_slots)} 个符合条件的预约时段:")
+            # 按订阅筛选并通知
+            notified = False
+            all_matching = {}
+            for subscription in self.ruleset.subscriptions:
+                matching_slots = self.ranker.rank(self.filter_matching_slots(locations_data, subscription),
+                                                  subscription.home, subscription.urgent_days)
+                match_time = time.time()
                 for slot in matching_slots:
-                    logger.info(f"  📍 {slot['location_name']} ({slot['distance']}) - {slot['availability']}")
+                    key = (slot['location_id'], slot['availability'])
+                    if key not in all_matching or slot['rank_score'] < all_matching[key]['rank_score']:
+                        all_matching[key] = slot
                 
-                # 发送邮件通知
-                try:
-                    email_notifier = EmailNotifier()
-                    if email_notifier.send_notification(matching_slots, self.cutoff_date):
-                        logger.info("✅ 邮件通知发送成功！")
-                        return True
-                    else:
-                        logger.error("❌ 邮件通知发送失败")
-                        return False
-                        
-                except Exception as email_error:
-                    logger.error(f"❌ 邮件通知失败: {email_error}")
-                    logger.info("💡 提示: 请检查 .env 文件中的邮箱配置")
-                    return False
-            else:
-                logger.info("ℹ️  未找到符合条件的预约时段")
-                logger.info(f"  条件: {', '.join(self.monitor_locations)} 在 {self.cutoff_date} 之前")
-                return False
+                if matching_slots:
+                    logger.info(f"🎯 [{subscription.name}] 发现 {len(matching_slots)} 个符合条件的预约时段:")
+                    for slot in matching_slots:
+                        logger.info(f"  📍 {slot['location_name']} ({slot['distance']}) - {slot['availability']} "
+                                    f"[得分 {slot['rank_score']}{', 紧急' if slot['urgent'] else ''}{', 就近' if slot['near'] else ''}]")
+                    notified = self._notify(subscription, matching_slots, scrape_time, match_time) or notified
+                else:
+                    logger.info(f"ℹ️  [{subscription.name}] 未找到符合条件的预约时段")
+                    logger.info(f"  条件: {', '.join(subscription.locations)} 在 {subscription.cutoff_date} 之前")
+                    notified = self._flush_digests(subscription, scrape_time, match_time) or notified
+            
+            # 多个订阅合并后同样按得分排序，最好的时段在前
+            self.last_matching_slots = sorted(all_matching.values(), key=lambda slot: slot['rank_score'])
+            return notified
                 
         except Exception as e:
             logger.error(f"检查过程中发生错误: {e}")
             return False
+    
+    def _notify(self, subscription, matching_slots, scrape_time, match_time):
+        """发送邮件通知 (开启汇总模式时非紧急时段会先排队合并)"""
+        try:
+            email_notifier = self._notifier_for(subscription)
+            if email_notifier.notify(matching_slots, subscription.cutoff_date):
+                logger.info("✅ 邮件通知发送成功！")
+                self._record_alert(email_notifier, matching_slots, scrape_time, match_time)
+                return True
+            elif email_notifier.queued_slots:
+                logger.info("📥 符合条件的预约已加入汇总队列，稍后合并发送")
+                return False
+            elif email_notifier.unchanged_slots:
+                logger.info("🔁 符合条件的预约都已通知过，没有变化")
+                return False
+            else:
+                logger.error("❌ 邮件通知发送失败")
+                return False
+                
+        except Exception as email_error:
+            logger.error(f"❌ 邮件通知失败: {email_error}")
+            logger.info("💡 提示: 请检查 .env 文件或 monitor_config.json 中的邮箱配置")
+            return False
+    
+    def _record_alert(self, email_notifier, matching_slots, scrape_time, match_time):
+        """记录已发送通知的各阶段时间"""
+        timings = email_notifier.last_timings
+        self.slot_tracker.record_alert(
+            timings.get('slots', matching_slots),
+            timings.get('scrape_time') or scrape_time,
+            match_time, timings['render_time'], timings['send_time']
+        )
+        self.slot_tracker.save()
+    
+    def _flush_digests(self, subscription, scrape_time, match_time):
+        """没有新时段时发送该订阅已到期的汇总邮件，并清理已失效时段的发送记录"""
+        queue = DigestQueue()
+        if not any(queue.tracks(recipient) for recipient in subscription.recipients):
+            return False
+        try:
+            email_notifier = self._notifier_for(subscription)
+            if email_notifier.notify([], subscription.cutoff_date):
+                logger.info("✅ 汇总邮件发送成功！")
+                self._record_alert(email_notifier, [], scrape_time, match_time)
+                return True
+        except Exception as email_error:
+            logger.error(f"❌ 汇总邮件发送失败: {email_error}")
+        return False
+
+    def alert_selector_drift(self, drift):
+        """
+        页面结构变化时发送告警，同一种变化在 DRIFT_ALERT_INTERVAL_HOURS 内只发送一次
+        
+        Args:
+            drift (dict): 爬虫记录的 selector_drift
+        """
+        state_file = os.getenv('DRIFT_ALERT_STATE_FILE', '.selector_drift_alert.json')
+        interval = float(os.getenv('DRIFT_ALERT_INTERVAL_HOURS', '24')) * 3600
+        signature = drift['strategy'] or 'failed'
+        try:
+            with open(state_file, 'r', encoding='utf-8') as f:
+                last = json.load(f)
+            if last.get('signature') == signature and time.time() - last.get('sent_at', 0) < interval:
+                return False
+        except (OSError, ValueError):
+            pass
+        
+        # DRIFT_ALERT_EMAIL 未设置时通知所有订阅的收件人
+        recipients = [email.strip() for email in os.getenv('DRIFT_ALERT_EMAIL', '').split(',') if email.strip()]
+        if not recipients:
+            recipients = list(dict.fromkeys(r for sub in self.ruleset.subscriptions for r in sub.recipients))
+        try:
+            sent = self._notifier_for(self.ruleset.subscriptions[0]).send_drift_alert(drift, recipients)
+        except Exception as email_error:
+            logger.error(f"❌ 页面结构变化告警失败: {email_error}")
+            return False
+        if sent:
+            try:
+                with open(state_file, 'w', encoding='utf-8') as f:
+                    json.dump({'signature': signature, 'sent_at': time.time()}, f)
+            except OSError as e:
+                logger.warning(f"保存告警状态失败: {e}")
+        return sent
 
 def main():
     """主函数：运行爬虫并检查通知"""
+    # 定时模式下本程序作为子进程运行，日志同样按 LOG_FORMAT 写入自己的轮转文件
+    setup_logging(log_file=os.getenv('MONITOR_LOG_FILE', 'bupa_monitor.log'))
     print("🏥 Bupa Medical Visa Services 爬虫 + 邮件通知")
     print("=" * 60)
     print("此程序将:")
@@ -162,6 +311,11 @@ def main():
             
         scraper = BupaMedicalScraperV2(headless=headless)
         success, locations_data = scraper.run()
+        monitor = BupaMonitor()
+        
+        # 页面结构变化时告警，而不是只当作没有数据
+        if scraper.selector_drift:
+            monitor.alert_selector_drift(scraper.selector_drift)
         
         if not success:
             print("❌ 爬虫运行失败")
@@ -175,7 +329,6 @@ def main():
         
         # 2. 检查条件并发送通知
         print("\n📧 步骤2: 检查条件并发送通知...")
-        monitor = BupaMonitor()
         notification_sent = monitor.check_and_notify(locations_data)
         
         # 3. 总结
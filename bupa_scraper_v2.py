@@ -5,10 +5,12 @@ Bupa Medical Visa Services Web Scraper V2
 改进版数据提取爬虫
 """
 
+import os
+import shutil
+import tempfile
+import threading
 import time
 import logging
-import csv
-import json
 from datetime import datetime
 from selenium import webdriver
 from selenium.webdriver.common.by import By
@@ -16,22 +18,66 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.options import Options
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
+from circuit_breaker import CircuitBreaker
+from session_cache import SessionCache
+from data_export import DataExporter, snapshot_fingerprint
+from log_config import setup_logging
+from process_stats import chrome_profile_locked
+from location_pages import LocationPageFetcher, SelectorDriftError, collect_location_pages, merge_location_pages
 
-# 配置日志
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# 精简模式下屏蔽的资源：图片、字体、媒体和第三方统计脚本
+# blue-dot.png 只需要出现在 innerHTML 中，无需真正下载
+BLOCKED_URL_PATTERNS = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.svg", "*.ico", "*.webp",
+    "*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot",
+    "*.mp4", "*.webm", "*.mp3",
+    "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*",
+    "*facebook.net*", "*hotjar.com*", "*clarity.ms*",
+]
+
+# 位置页面加载完成的标志：原有表格，或页面结构变化后任何含单选框的表格
+LOCATION_TABLE_READY = "table.tbl-location, table input[type=radio]"
+
+# 加在 Chrome 命令行上的标记，用于识别本程序启动后遗留的孤儿浏览器进程
+BROWSER_MARKER = "--bupa-monitor-scraper"
+
+# 本进程中正在使用的共享配置目录 (同一进程内多个爬虫实例并发运行时)
+_profiles_in_use = set()
+_profiles_lock = threading.Lock()
+
 class BupaMedicalScraperV2:
-    def __init__(self, headless=False):
+    def __init__(self, headless=False, breaker=None, session_cache=None, lean=None):
         """
         初始化爬虫
         
         Args:
             headless (bool): 是否使用无头模式
+            breaker (CircuitBreaker): 站点访问熔断器，默认从环境变量创建
+            session_cache (SessionCache): 会话缓存，默认从环境变量创建
+            lean (bool): 是否使用精简浏览器配置，默认读取 LEAN_BROWSER
         """
-        self.url = "https://bmvs.onlineappointmentscheduling.net.au/oasis/Default.aspx"
+        # BUPA_BASE_URL 可指向本地模拟网站 (fake_bupa_site.py)
+        base_url = os.getenv('BUPA_BASE_URL', 'https://bmvs.onlineappointmentscheduling.net.au/oasis').rstrip('/')
+        self.url = f"{base_url}/Default.aspx"
+        self.location_url = f"{base_url}/Location.aspx"
+        # 页面加载的默认超时 (秒)，熔断器按 p95 耗时在此基础上缩短
+        self.page_timeout = 20
         self.driver = None
         self.headless = headless
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+        self.session_cache = session_cache if session_cache is not None else SessionCache()
+        self.exporter = DataExporter()
+        if lean is None:
+            lean = os.getenv('LEAN_BROWSER', 'false').lower() in ['true', '1', 'yes']
+        self.lean = lean
+        self.profile_dir = os.getenv('CHROME_PROFILE_DIR', '.chrome_profile')
+        # 当前浏览器实际使用的配置目录，以及它是否为需要删除的临时目录
+        self.active_profile_dir = None
+        self.temp_profile = False
+        # 最近一次提取检测到的页面结构变化，没有变化时为 None
+        self.selector_drift = None
         
     def setup_driver(self):
         """设置Chrome WebDriver"""
@@ -42,7 +88,25 @@ class BupaMedicalScraperV2:
             chrome_options.add_argument('--no-sandbox')
             chrome_options.add_argument('--disable-dev-shm-usage')
             chrome_options.add_argument('--disable-gpu')
-            chrome_options.add_argument('--window-size=1920,1080')
+            chrome_options.add_argument(BROWSER_MARKER)
+            
+            if self.lean:
+                # 精简模式：DOMContentLoaded 即返回，小视口，复用磁盘上的浏览器配置缓存
+                chrome_options.page_load_strategy = 'eager'
+                chrome_options.add_argument('--window-size=1024,768')
+                chrome_options.add_argument(f'--user-data-dir={self._acquire_profile_dir()}')
+                chrome_options.add_argument('--blink-settings=imagesEnabled=false')
+                chrome_options.add_argument('--disable-extensions')
+                chrome_options.add_argument('--disable-background-networking')
+                chrome_options.add_argument('--disable-component-update')
+                chrome_options.add_argument('--no-first-run')
+                chrome_options.add_argument('--mute-audio')
+                chrome_options.add_experimental_option('prefs', {
+                    'profile.managed_default_content_settings.images': 2,
+                    'profile.default_content_setting_values.notifications': 2,
+                })
+            else:
+                chrome_options.add_argument('--window-size=1920,1080')
             
             # 用户代理
             chrome_options.add_argument('--user-agent=Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
@@ -55,24 +119,63 @@ class BupaMedicalScraperV2:
             self.driver = webdriver.Chrome(options=chrome_options)
             self.driver.implicitly_wait(10)
             
-            logger.info("Chrome WebDriver 初始化成功")
+            # 在网络层屏蔽字体、媒体和统计脚本 (图片设置无法覆盖这些资源)
+            if self.lean:
+                self.driver.execute_cdp_cmd("Network.enable", {})
+                self.driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URL_PATTERNS})
+            
+            logger.info(f"Chrome WebDriver 初始化成功{' (精简模式)' if self.lean else ''}")
             return True
             
         except Exception as e:
             logger.error(f"WebDriver 初始化失败: {e}")
+            self._release_profile_dir()
             return False
     
+    def _acquire_profile_dir(self):
+        """
+        精简模式的浏览器配置目录：优先复用共享目录 (CHROME_PROFILE_DIR)，
+        共享目录已被其他 Chrome (常驻进程、基准测试或并发的爬虫实例) 占用时改用临时目录
+        """
+        shared = os.path.abspath(self.profile_dir)
+        with _profiles_lock:
+            if shared not in _profiles_in_use and not chrome_profile_locked(shared):
+                _profiles_in_use.add(shared)
+                self.active_profile_dir, self.temp_profile = shared, False
+                return shared
+        
+        self.active_profile_dir = tempfile.mkdtemp(prefix='bupa-chrome-profile-')
+        self.temp_profile = True
+        logger.info(f"浏览器配置目录 {shared} 正在被使用，改用临时目录 {self.active_profile_dir}")
+        return self.active_profile_dir
+    
+    def _release_profile_dir(self):
+        """释放配置目录，临时目录直接删除"""
+        if self.active_profile_dir is None:
+            return
+        if self.temp_profile:
+            shutil.rmtree(self.active_profile_dir, ignore_errors=True)
+        else:
+            with _profiles_lock:
+                _profiles_in_use.discard(self.active_profile_dir)
+        self.active_profile_dir = None
+        self.temp_profile = False
+    
     def load_page(self):
         """加载目标页面"""
         try:
-            logger.info(f"正在访问: {self.url}")
+            timeout = self.breaker.timeout_for("load_page", self.page_timeout)
+            logger.info(f"正在访问: {self.url} (超时 {timeout:.0f} 秒)")
+            start = time.time()
+            self.driver.set_page_load_timeout(timeout)
             self.driver.get(self.url)
             
             # 等待页面加载完成
-            WebDriverWait(self.driver, 20).until(
+            WebDriverWait(self.driver, timeout).until(
                 EC.presence_of_element_located((By.TAG_NAME, "body"))
             )
             
+            self.breaker.record_latency("load_page", time.time() - start)
             logger.info("页面加载成功")
             return True
             
@@ -110,13 +213,16 @@ class BupaMedicalScraperV2:
     def wait_for_location_page(self, timeout=30):
         """等待位置选择页面加载"""
         try:
-            logger.info("等待页面跳转到位置选择...")
+            timeout = self.breaker.timeout_for("location_page", timeout)
+            logger.info(f"等待页面跳转到位置选择... (超时 {timeout:.0f} 秒)")
+            start = time.time()
             
             # 等待URL包含Location.aspx
             WebDriverWait(self.driver, timeout).until(
                 lambda driver: "Location.aspx" in driver.current_url
             )
             
+            self.breaker.record_latency("location_page", time.time() - start)
             logger.info(f"页面已跳转到: {self.driver.current_url}")
             return True
             
@@ -127,78 +233,128 @@ class BupaMedicalScraperV2:
             logger.error(f"等待页面跳转失败: {e}")
             return False
     
+    def restore_session(self):
+        """使用缓存的会话 Cookie 直接打开位置选择页面，会话失效时返回 False"""
+        cookies = self.session_cache.load()
+        if not cookies:
+            return False
+        
+        try:
+            logger.info("尝试复用缓存会话...")
+            # 通过 CDP 在导航前写入 Cookie，无需先打开首页
+            self.driver.execute_cdp_cmd("Network.enable", {})
+            for cookie in cookies:
+                params = {k: cookie[k] for k in ("name", "value", "domain", "path", "secure", "httpOnly") if k in cookie}
+                params["url"] = self.location_url
+                self.driver.execute_cdp_cmd("Network.setCookie", params)
+            
+            timeout = self.breaker.timeout_for("load_page", self.page_timeout)
+            self.driver.set_page_load_timeout(timeout)
+            self.driver.get(self.location_url)
+            
+            # 会话过期时服务器会跳回首页或错误页
+            if "Location.aspx" not in self.driver.current_url:
+                logger.info(f"缓存会话已失效，页面跳转到: {self.driver.current_url}")
+                self.session_cache.invalidate()
+                return False
+            
+            WebDriverWait(self.driver, 5).until(
+                EC.presence_of_element_located((By.CSS_SELECTOR, LOCATION_TABLE_READY))
+            )
+            logger.info("缓存会话有效，已直接进入位置选择页面")
+            return True
+            
+        except Exception as e:
+            logger.info(f"缓存会话不可用，重新建立会话: {e}")
+            self.session_cache.invalidate()
+            return False
+    
+    def open_location_page(self):
+        """进入位置选择页面：优先复用会话，失败时走首页 + postback 完整流程"""
+        if self.restore_session():
+            self.breaker.record_success()
+            return True
+        
+        # 会话失效时服务器通常已跳回首页，可直接点击按钮
+        if "Default.aspx" not in (self.driver.current_url or ""):
+            if not self.load_page():
+                self.breaker.record_failure("页面加载失败")
+                return False
+        
+        # 截图保存初始页面
+        self.take_screenshot("initial_page.png")
+        
+        # 点击 "New Individual booking"
+        if not self.click_new_individual_booking():
+            self.take_screenshot("error_page.png")
+            self.breaker.record_failure("点击 'New Individual booking' 失败")
+            return False
+        
+        # 等待页面跳转到位置选择
+        if not self.wait_for_location_page():
+            self.breaker.record_failure("等待位置选择页面超时")
+            return False
+        
+        self.breaker.record_success()
+        self.session_cache.save(self.driver.get_cookies())
+        return True
+    
+    def scrape(self):
+        """在常驻浏览器中抓取一次位置数据，浏览器未启动时先启动"""
+        if not self.breaker.allow_request():
+            logger.warning(f"站点访问已熔断，{self.breaker.remaining_backoff():.0f} 秒后再试")
+            return False, []
+        
+        if self.driver is None and not self.setup_driver():
+            return False, []
+        
+        if not self.open_location_page():
+            return False, []
+        
+        return True, self.extract_location_data()
+    
     def extract_location_data(self):
-        """提取医疗中心位置和预约数据"""
+        """提取医疗中心位置和预约数据，存在分页时并发获取其余页面并按距离合并"""
         try:
             logger.info("开始提取位置数据...")
+            start = time.time()
             
             # 等待表格加载
-            table = WebDriverWait(self.driver, 15).until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, "table.tbl-location"))
+            WebDriverWait(self.driver, 15).until(
+                EC.presence_of_element_located((By.CSS_SELECTOR, LOCATION_TABLE_READY))
             )
             
-            # 提取所有行数据
-            rows = table.find_elements(By.CSS_SELECTOR, "tbody tr.trlocation")
-            logger.info(f"找到 {len(rows)} 行数据")
-            
-            locations_data = []
-            
-            for i, row in enumerate(rows):
-                try:
-                    logger.info(f"提取第 {i+1} 行数据...")
-                    
-                    # 提取基本信息
-                    radio_input = row.find_element(By.CSS_SELECTOR, "input.rbLocation")
-                    location_id = radio_input.get_attribute("value")
-                    
-                    # 提取位置名称
-                    name_cell = row.find_element(By.CSS_SELECTOR, ".tdloc_name")
-                    location_name = name_cell.find_element(By.CSS_SELECTOR, ".tdlocNameTitle").text.strip()
-                    
-                    # 提取完整地址
-                    address_span = name_cell.find_element(By.TAG_NAME, "span")
-                    full_address = address_span.text.strip()
-                    
-                    # 提取距离
-                    distance_cell = row.find_element(By.CSS_SELECTOR, ".td-distance span")
-                    distance = distance_cell.text.strip()
-                    
-                    # 提取可用日期
-                    availability_cell = row.find_element(By.CSS_SELECTOR, ".tdloc_availability span")
-                    availability = availability_cell.text.strip()
-                    
-                    # 提取坐标
-                    try:
-                        coords_input = row.find_element(By.ID, f"{location_id}hidCoords")
-                        coordinates = coords_input.get_attribute("value")
-                    except:
-                        coordinates = ""
-                    
-                    # 确定中心类型
-                    center_type = "Bupa Centre" if "blue-dot.png" in row.get_attribute("innerHTML") else "Regional Medical Centre"
-                    
-                    location_data = {
-                        "location_id": location_id,
-                        "location_name": location_name,
-                        "full_address": full_address,
-                        "distance": distance,
-                        "availability": availability,
-                        "coordinates": coordinates,
-                        "center_type": center_type,
-                        "has_available_slots": "No available slot" not in availability,
-                        "extracted_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    }
-                    
-                    locations_data.append(location_data)
-                    logger.info(f"✅ 提取数据: {location_name} - {availability}")
-                    
-                except Exception as row_error:
-                    logger.warning(f"❌ 提取第 {i+1} 行数据失败: {row_error}")
-                    continue
-            
-            logger.info(f"成功提取 {len(locations_data)} 个位置的数据")
+            # 一次取回页面源码后离线解析，避免逐行逐字段的 WebDriver 往返
+            result = collect_location_pages(self.driver.page_source, self._page_fetcher().fetch_all)
+            locations_data = merge_location_pages(result['pages'])
+            if result['rows']:
+                self._record_drift(result['strategy'])
+            
+            if result['failed_rows']:
+                logger.warning("❌ %d 行数据提取失败，首个错误: %s", result['failed_rows'], result['first_error'])
+            if result['failed_pages']:
+                logger.warning("❌ %d 个分页获取失败，本次数据可能不完整", result['failed_pages'])
+            available = sum(1 for loc in locations_data if loc["has_available_slots"])
+            elapsed = time.time() - start
+            logger.info(
+                "成功提取 %d/%d 个位置的数据 (%d 页, 有可用时段 %d 个, 耗时 %.2f 秒)",
+                len(locations_data), result['rows'], result['page_count'], available, elapsed,
+                extra={"fields": {
+                    "event": "extract_summary",
+                    "rows": result['rows'],
+                    "extracted": len(locations_data),
+                    "failed": result['failed_rows'],
+                    "pages": result['page_count'],
+                    "failed_pages": result['failed_pages'],
+                    "available": available,
+                    "elapsed_seconds": round(elapsed, 3),
+                }}
+            )
             return locations_data
             
+        except SelectorDriftError as e:
+            self._record_drift(None, str(e))
+            return []
         except TimeoutException:
             logger.error("等待位置表格加载超时")
             return []
@@ -206,47 +362,88 @@ class BupaMedicalScraperV2:
             logger.error(f"提取位置数据失败: {e}")
             return []
     
-    def save_data_to_csv(self, data, filename="bupa_locations.csv"):
-        """保存数据到CSV文件"""
+    def _record_drift(self, strategy, error=None):
+        """记录页面结构变化：主选择器失效但后备策略成功，或所有策略都失败"""
+        if strategy == "css":
+            self.selector_drift = None
+            return
+        self.selector_drift = {
+            'detected_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'strategy': strategy,
+            'error': error,
+        }
+        if strategy is None:
+            logger.error("🚨 页面结构已变化，所有提取策略均失败: %s", error,
+                         extra={"fields": {"event": "selector_drift", "strategy": None, "error": error}})
+        else:
+            logger.warning("⚠️  页面结构已变化，主选择器失效，已改用后备策略 %s", strategy,
+                           extra={"fields": {"event": "selector_drift", "strategy": strategy}})
+    
+    def _page_fetcher(self):
+        """用浏览器当前会话的 Cookie 和 User-Agent 创建分页抓取器"""
+        return LocationPageFetcher(
+            self.driver.current_url.split('#')[0],
+            self.driver.get_cookies(),
+            user_agent=self.driver.execute_script("return navigator.userAgent"),
+            timeout=self.breaker.timeout_for("load_page", self.page_timeout),
+        )
+    
+    def save_data_to_csv(self, data, filename="bupa_locations.csv", fingerprint=None):
+        """保存数据到CSV文件 (原子替换，内容未变化时不重写)"""
         try:
             if not data:
                 logger.warning("没有数据需要保存")
                 return False
             
-            fieldnames = [
-                "location_id", "location_name", "full_address", "distance", 
-                "availability", "coordinates", "center_type", "has_available_slots", "extracted_time"
-            ]
-            
-            with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
-                writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-                writer.writeheader()
-                writer.writerows(data)
-            
-            logger.info(f"数据已保存到CSV文件: {filename}")
+            if self.exporter.export_csv(data, filename, fingerprint):
+                logger.info(f"数据已保存到CSV文件: {filename}")
+            else:
+                logger.info(f"数据未变化，保留CSV文件: {filename}")
             return True
             
         except Exception as e:
             logger.error(f"保存CSV文件失败: {e}")
             return False
     
-    def save_data_to_json(self, data, filename="bupa_locations.json"):
-        """保存数据到JSON文件"""
+    def save_data_to_json(self, data, filename="bupa_locations.json", fingerprint=None):
+        """保存数据到JSON文件 (原子替换，内容未变化时不重写)"""
         try:
             if not data:
                 logger.warning("没有数据需要保存")
                 return False
             
-            with open(filename, 'w', encoding='utf-8') as jsonfile:
-                json.dump(data, jsonfile, ensure_ascii=False, indent=2)
-            
-            logger.info(f"数据已保存到JSON文件: {filename}")
+            if self.exporter.export_json(data, filename, fingerprint):
+                logger.info(f"数据已保存到JSON文件: {filename}")
+            else:
+                logger.info(f"数据未变化，保留JSON文件: {filename}")
             return True
             
         except Exception as e:
             logger.error(f"保存JSON文件失败: {e}")
             return False
     
+    def append_data_to_ndjson(self, data, filename):
+        """把发生变化的位置追加到NDJSON文件"""
+        try:
+            appended = self.exporter.append_ndjson(data, filename)
+            if appended:
+                logger.info(f"已追加 {appended} 条变化记录到NDJSON文件: {filename}")
+            return True
+            
+        except Exception as e:
+            logger.error(f"追加NDJSON文件失败: {e}")
+            return False
+    
+    def export_data(self, data):
+        """导出CSV、JSON，以及配置了 EXPORT_NDJSON_FILE 时的NDJSON流"""
+        # 两个文件共用同一份内容指纹
+        fingerprint = snapshot_fingerprint(data) if data else None
+        self.save_data_to_csv(data, "bupa_locations.csv", fingerprint)
+        self.save_data_to_json(data, "bupa_locations.json", fingerprint)
+        ndjson_file = os.getenv('EXPORT_NDJSON_FILE')
+        if ndjson_file and data:
+            self.append_data_to_ndjson(data, ndjson_file)
+    
     def analyze_data(self, data):
         """分析提取的数据"""
         try:
@@ -296,14 +493,30 @@ class BupaMedicalScraperV2:
             logger.error(f"截图失败: {e}")
             return False
     
+    def browser_pids(self):
+        """当前浏览器的 chromedriver 进程 (Chrome 是其子进程)，未启动时为空"""
+        try:
+            return [self.driver.service.process.pid]
+        except AttributeError:
+            return []
+    
     def close(self):
         """关闭浏览器"""
         if self.driver:
-            self.driver.quit()
-            logger.info("浏览器已关闭")
+            try:
+                self.driver.quit()
+                logger.info("浏览器已关闭")
+            finally:
+                self.driver = None
+                self._release_profile_dir()
     
     def run(self):
         """运行完整的爬虫流程"""
+        # 熔断期间直接返回，不启动浏览器也不访问站点
+        if not self.breaker.allow_request():
+            logger.warning(f"站点访问已熔断，{self.breaker.remaining_backoff():.0f} 秒后再试")
+            return False, []
+        
         try:
             logger.info("开始运行Bupa Medical Visa Services爬虫 V2")
             
@@ -311,20 +524,8 @@ class BupaMedicalScraperV2:
             if not self.setup_driver():
                 return False, []
             
-            # 2. 加载页面
-            if not self.load_page():
-                return False, []
-            
-            # 3. 截图保存初始页面
-            self.take_screenshot("initial_page.png")
-            
-            # 4. 点击 "New Individual booking"
-            if not self.click_new_individual_booking():
-                self.take_screenshot("error_page.png")
-                return False, []
-            
-            # 5. 等待页面跳转到位置选择
-            if not self.wait_for_location_page():
+            # 2-5. 进入位置选择页面 (复用会话或首页 + postback)
+            if not self.open_location_page():
                 return False, []
             
             # 6. 截图保存位置选择页面
@@ -339,8 +540,7 @@ class BupaMedicalScraperV2:
                 self.analyze_data(locations_data)
                 
                 # 9. 保存数据到文件
-                self.save_data_to_csv(locations_data, "bupa_locations.csv")
-                self.save_data_to_json(locations_data, "bupa_locations.json")
+                self.export_data(locations_data)
                 
                 logger.info("数据提取和保存完成！")
             else:
@@ -364,6 +564,7 @@ class BupaMedicalScraperV2:
 
 def main():
     """主函数"""
+    setup_logging()
     print("Bupa Medical Visa Services 爬虫 V2")
     print("=" * 50)
     print("此爬虫将自动:")
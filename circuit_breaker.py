@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+站点访问熔断器
+连续失败后暂停访问预约网站，按带抖动的指数退避进入半开探测，
+并根据实测页面加载耗时的分位数收紧超时时间
+"""
+
+import json
+import logging
+import os
+import random
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    # 每个步骤保留的耗时样本数量
+    MAX_SAMPLES = 50
+    # 样本不足时使用默认超时
+    MIN_SAMPLES = 5
+
+    def __init__(self, state_file=None, failure_threshold=None, base_backoff=None, max_backoff=None):
+        """
+        初始化熔断器
+
+        Args:
+            state_file (str): 状态文件路径，用于在多次运行之间保留熔断状态
+            failure_threshold (int): 连续失败多少次后熔断
+            base_backoff (float): 首次熔断的退避秒数
+            max_backoff (float): 退避秒数上限
+        """
+        self.state_file = state_file or os.getenv('CIRCUIT_STATE_FILE', 'circuit_state.json')
+        self.failure_threshold = failure_threshold or int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', '3'))
+        self.base_backoff = base_backoff or float(os.getenv('CIRCUIT_BASE_BACKOFF', '60'))
+        self.max_backoff = max_backoff or float(os.getenv('CIRCUIT_MAX_BACKOFF', '3600'))
+        self.timeout_factor = float(os.getenv('CIRCUIT_TIMEOUT_FACTOR', '2.0'))
+        self.min_timeout = float(os.getenv('CIRCUIT_MIN_TIMEOUT', '5'))
+
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.trip_count = 0
+        self.open_until = 0.0
+        self.latencies = {}
+
+        self._load()
+
+    def _load(self):
+        """从状态文件恢复熔断状态"""
+        if not os.path.exists(self.state_file):
+            return
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.state = data.get('state', self.CLOSED)
+            self.consecutive_failures = data.get('consecutive_failures', 0)
+            self.trip_count = data.get('trip_count', 0)
+            self.open_until = data.get('open_until', 0.0)
+            self.latencies = data.get('latencies', {})
+        except Exception as e:
+            logger.warning(f"读取熔断状态失败，使用初始状态: {e}")
+
+    def _save(self):
+        """保存熔断状态"""
+        try:
+            data = {
+                'state': self.state,
+                'consecutive_failures': self.consecutive_failures,
+                'trip_count': self.trip_count,
+                'open_until': self.open_until,
+                'latencies': self.latencies,
+            }
+            with open(self.state_file, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+        except Exception as e:
+            logger.warning(f"保存熔断状态失败: {e}")
+
+    def is_open(self):
+        """熔断中且退避时间未到"""
+        return self.state == self.OPEN and time.time() < self.open_until
+
+    def remaining_backoff(self):
+        """距离下一次半开探测的秒数"""
+        if self.state != self.OPEN:
+            return 0.0
+        return max(0.0, self.open_until - time.time())
+
+    def allow_request(self):
+        """是否允许访问站点；退避时间到达后进入半开状态放行一次探测"""
+        if self.state == self.OPEN:
+            if time.time() < self.open_until:
+                return False
+            self.state = self.HALF_OPEN
+            self._save()
+            logger.info("熔断退避结束，进入半开状态进行探测")
+        return True
+
+    def record_success(self):
+        """记录一次成功访问"""
+        if self.state != self.CLOSED:
+            logger.info("探测成功，熔断器恢复为关闭状态")
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.trip_count = 0
+        self.open_until = 0.0
+        self._save()
+
+    def record_failure(self, reason=""):
+        """记录一次失败访问，达到阈值或半开探测失败时熔断"""
+        self.consecutive_failures += 1
+        if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            self._trip(reason)
+        else:
+            logger.warning(f"站点访问失败 ({self.consecutive_failures}/{self.failure_threshold}): {reason}")
+        self._save()
+
+    def _trip(self, reason):
+        """打开熔断器，退避时间按指数增长并加入抖动"""
+        self.trip_count += 1
+        backoff = min(self.max_backoff, self.base_backoff * (2 ** (self.trip_count - 1)))
+        # 一半固定、一半随机，避免多个实例同时恢复
+        backoff = backoff / 2 + random.uniform(0, backoff / 2)
+        self.state = self.OPEN
+        self.open_until = time.time() + backoff
+        logger.error(f"站点连续访问失败，熔断 {backoff:.0f} 秒 (第 {self.trip_count} 次): {reason}")
+
+    def record_latency(self, step, seconds):
+        """记录某个步骤的实测耗时"""
+        samples = self.latencies.setdefault(step, [])
+        samples.append(round(seconds, 3))
+        if len(samples) > self.MAX_SAMPLES:
+            del samples[:-self.MAX_SAMPLES]
+
+    def percentile(self, step, pct):
+        """计算某个步骤耗时的分位数，样本不足时返回 None"""
+        samples = self.latencies.get(step, [])
+        if len(samples) < self.MIN_SAMPLES:
+            return None
+        ordered = sorted(samples)
+        index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def timeout_for(self, step, default):
+        """根据 p95 耗时计算快速失败超时，不超过原有默认值"""
+        p95 = self.percentile(step, 95)
+        if p95 is None:
+            return default
+        return max(self.min_timeout, min(default, p95 * self.timeout_factor))
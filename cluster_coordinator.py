@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多节点协调
+多个常驻监控节点通过共享的 SQLite 数据库协调：节点心跳、按顺序轮流检查
+(整个集群每个间隔只检查一次)、通过租约选出唯一的通知节点。
+检查节点把抓取结果写入数据库，由通知节点筛选并发送邮件；
+节点停止后，其检查轮次和通知职责在一个检查间隔内由其他节点接管。
+
+数据库需要放在所有节点都能可靠加锁的文件系统上 (同一台主机或支持文件锁的共享存储)
+"""
+
+import json
+import logging
+import os
+import socket
+import sqlite3
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS nodes (node_id TEXT PRIMARY KEY, heartbeat REAL NOT NULL, started_at REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, holder TEXT NOT NULL, expires_at REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS snapshots (id INTEGER PRIMARY KEY AUTOINCREMENT, node_id TEXT NOT NULL,
+                                      created_at REAL NOT NULL, locations TEXT NOT NULL);
+"""
+
+NOTIFIER_LEASE = 'notifier'
+
+
+class ClusterCoordinator:
+    # 保留的抓取结果数量
+    MAX_SNAPSHOTS = 20
+
+    def __init__(self, db_path=None, node_id=None, tick_seconds=None, lease_seconds=None):
+        """
+        初始化协调器
+
+        Args:
+            db_path (str): 共享数据库路径
+            node_id (str): 节点标识，默认为 主机名-进程号
+            tick_seconds (float): 节点循环间隔 (秒)，决定心跳频率和接管速度
+            lease_seconds (float): 通知租约和心跳的有效期 (秒)，节点停止后最迟这么久被接管；
+                                   需要长于一次检查的耗时并短于检查间隔
+        """
+        self.db_path = db_path or os.getenv('CLUSTER_DB', 'cluster.db')
+        self.node_id = node_id or os.getenv('CLUSTER_NODE_ID') or f"{socket.gethostname()}-{os.getpid()}"
+        self.tick_seconds = tick_seconds or float(os.getenv('CLUSTER_TICK_SECONDS', '10'))
+        self.lease_seconds = lease_seconds or float(os.getenv('CLUSTER_LEASE_SECONDS', '120'))
+        # 超过该时间没有心跳的节点视为已停止 (检查期间不更新心跳)
+        self.node_ttl = self.lease_seconds
+        self.started_at = time.time()
+
+        db = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(SCHEMA)
+        finally:
+            db.close()
+
+    @contextmanager
+    def _transaction(self):
+        """立即获取写锁的事务，保证检查轮次和租约的判断与更新是原子的"""
+        db = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                yield db
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        finally:
+            db.close()
+
+    @staticmethod
+    def _get_state(db, key):
+        """读取共享状态"""
+        row = db.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    @staticmethod
+    def _set_state(db, key, value):
+        """写入共享状态"""
+        db.execute("INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+
+    def _live_nodes(self, db, now):
+        """心跳未过期的节点，按标识排序"""
+        rows = db.execute("SELECT node_id FROM nodes WHERE heartbeat >= ? ORDER BY node_id",
+                          (now - self.node_ttl,)).fetchall()
+        return [row[0] for row in rows]
+
+    def heartbeat(self):
+        """更新本节点心跳"""
+        with self._transaction() as db:
+            db.execute("INSERT OR REPLACE INTO nodes (node_id, heartbeat, started_at) VALUES (?, ?, ?)",
+                       (self.node_id, time.time(), self.started_at))
+
+    def live_nodes(self):
+        """当前存活的节点"""
+        with self._transaction() as db:
+            return self._live_nodes(db, time.time())
+
+    def is_notifier(self):
+        """
+        获取或续期通知租约，返回本节点是否为通知节点
+
+        租约未过期时只有持有者能续期，持有者停止后租约到期即由下一个调用的节点接管
+        """
+        now = time.time()
+        with self._transaction() as db:
+            row = db.execute("SELECT holder, expires_at FROM leases WHERE name = ?", (NOTIFIER_LEASE,)).fetchone()
+            if row and row[0] != self.node_id and row[1] > now:
+                return False
+            db.execute("INSERT OR REPLACE INTO leases (name, holder, expires_at) VALUES (?, ?, ?)",
+                       (NOTIFIER_LEASE, self.node_id, now + self.lease_seconds))
+        if not row or row[0] != self.node_id:
+            logger.info(f"👑 节点 {self.node_id} 成为通知节点" + (f" (接管 {row[0]})" if row else ""))
+        return True
+
+    def claim_poll(self, interval_seconds):
+        """
+        领取一次检查：距上次检查满一个间隔后，轮到上次检查节点的下一个存活节点；
+        该节点错过轮次 (超过两个循环间隔) 时任何节点都可以接管
+
+        Args:
+            interval_seconds (float): 检查间隔，通知节点写入的集群间隔优先
+
+        Returns:
+            bool: 本节点是否应当执行本次检查
+        """
+        now = time.time()
+        with self._transaction() as db:
+            interval_seconds = self._get_state(db, 'interval_seconds') or interval_seconds
+            last = self._get_state(db, 'last_poll')
+            if last:
+                elapsed = now - last['at']
+                if elapsed < interval_seconds:
+                    return False
+                live = self._live_nodes(db, now) or [self.node_id]
+                following = [node for node in live if node > last['node']]
+                turn = following[0] if following else live[0]
+                if turn != self.node_id and elapsed < interval_seconds + 2 * self.tick_seconds:
+                    return False
+                if turn != self.node_id:
+                    logger.info(f"🔁 节点 {turn} 错过检查轮次，由 {self.node_id} 接管")
+            self._set_state(db, 'last_poll', {'at': now, 'node': self.node_id})
+        return True
+
+    def set_interval(self, interval_seconds):
+        """通知节点根据放号预测设置集群的检查间隔"""
+        with self._transaction() as db:
+            self._set_state(db, 'interval_seconds', interval_seconds)
+
+    def publish(self, locations_data):
+        """写入一次抓取结果，供通知节点处理"""
+        with self._transaction() as db:
+            db.execute("INSERT INTO snapshots (node_id, created_at, locations) VALUES (?, ?, ?)",
+                       (self.node_id, time.time(), json.dumps(locations_data, ensure_ascii=False)))
+            db.execute("DELETE FROM snapshots WHERE id <= (SELECT MAX(id) FROM snapshots) - ?", (self.MAX_SNAPSHOTS,))
+
+    def take_snapshot(self):
+        """
+        取出最新的未处理抓取结果 (只由通知节点调用)
+
+        Returns:
+            tuple: (节点标识, 位置数据)，没有新结果时返回 None
+        """
+        with self._transaction() as db:
+            processed = self._get_state(db, 'processed_snapshot') or 0
+            row = db.execute("SELECT id, node_id, locations FROM snapshots WHERE id > ? ORDER BY id DESC LIMIT 1",
+                             (processed,)).fetchone()
+            if not row:
+                return None
+            self._set_state(db, 'processed_snapshot', row[0])
+        return row[1], json.loads(row[2])
+
+    def leave(self):
+        """退出集群：删除心跳并释放通知租约，其他节点无需等待超时即可接管"""
+        try:
+            with self._transaction() as db:
+                db.execute("DELETE FROM nodes WHERE node_id = ?", (self.node_id,))
+                db.execute("DELETE FROM leases WHERE holder = ?", (self.node_id,))
+        except sqlite3.Error as e:
+            logger.warning(f"退出集群失败: {e}")
+
+    def status(self):
+        """集群状态"""
+        now = time.time()
+        with self._transaction() as db:
+            lease = db.execute("SELECT holder, expires_at FROM leases WHERE name = ?", (NOTIFIER_LEASE,)).fetchone()
+            last = self._get_state(db, 'last_poll')
+            return {
+                'node_id': self.node_id,
+                'live_nodes': self._live_nodes(db, now),
+                'notifier': lease[0] if lease and lease[1] > now else None,
+                'last_poll_node': last['node'] if last else None,
+                'last_poll_age_seconds': round(now - last['at'], 1) if last else None,
+            }
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据导出
+CSV / JSON 导出通过临时文件 + 重命名原子替换，内容未变化时不重写；
+可选的 NDJSON 追加模式只写入发生变化的位置，供流式消费者读取
+"""
+
+import csv
+import hashlib
+import io
+import json
+import logging
+import os
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+FIELDNAMES = [
+    "location_id", "location_name", "full_address", "distance",
+    "availability", "coordinates", "center_type", "has_available_slots", "extracted_time"
+]
+
+# 每次抓取都会变化、不代表内容变化的字段
+VOLATILE_FIELDS = ("extracted_time",)
+
+
+def _read_umask():
+    """读取进程的 umask：Linux 上从 /proc 读取，其他系统只能先设置再恢复"""
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('Umask:'):
+                    return int(line.split()[1], 8)
+    except (OSError, ValueError):
+        pass
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+# 导入时读取一次：运行中修改 umask 是进程级的，会影响其他线程同时创建的文件
+_DEFAULT_MODE = 0o666 & ~_read_umask()
+
+
+def _file_mode(path):
+    """目标文件已存在时沿用其权限，否则按 umask 计算普通 open() 会使用的权限"""
+    try:
+        return os.stat(path).st_mode & 0o7777
+    except FileNotFoundError:
+        return _DEFAULT_MODE
+
+
+def atomic_write_bytes(path, data, fsync=True):
+    """写入同目录下的临时文件 (默认 fsync)，然后原子替换目标文件"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=directory)
+    try:
+        # mkstemp 创建的文件权限为 0600，替换后其他用户的读取程序将无法读取
+        os.fchmod(fd, _file_mode(path))
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _stable_text(row):
+    """位置数据中除抓取时间以外的字段，按字段名排序拼接"""
+    return '\x1f'.join(f"{k}={v}" for k, v in sorted(row.items()) if k not in VOLATILE_FIELDS)
+
+
+def row_fingerprint(row):
+    """单个位置的内容指纹，忽略抓取时间"""
+    return hashlib.sha1(_stable_text(row).encode('utf-8')).hexdigest()
+
+
+def snapshot_fingerprint(rows):
+    """整份数据的内容指纹"""
+    return hashlib.sha1('\x1e'.join(_stable_text(row) for row in rows).encode('utf-8')).hexdigest()
+
+
+class DataExporter:
+    def __init__(self, state_file=None, pretty_json=None):
+        """
+        初始化导出器
+
+        Args:
+            state_file (str): 记录已导出内容指纹的文件，用于跨多次运行判断内容是否变化
+            pretty_json (bool): JSON 是否缩进，默认读取 EXPORT_JSON_PRETTY
+        """
+        self.state_file = state_file or os.getenv('EXPORT_STATE_FILE', '.export_state.json')
+        if pretty_json is None:
+            pretty_json = os.getenv('EXPORT_JSON_PRETTY', 'false').lower() in ['true', '1', 'yes']
+        self.pretty_json = pretty_json
+        self.state = {'files': {}, 'rows': {}}
+        if os.path.exists(self.state_file):
+            try:
+                with open(self.state_file, 'r', encoding='utf-8') as f:
+                    self.state = json.load(f)
+            except Exception as e:
+                logger.warning(f"读取导出状态失败: {e}")
+
+    def _save_state(self):
+        """保存导出状态 (丢失时只会多重写一次导出文件，无需 fsync)"""
+        try:
+            atomic_write_bytes(self.state_file, json.dumps(self.state).encode('utf-8'), fsync=False)
+        except Exception as e:
+            logger.warning(f"保存导出状态失败: {e}")
+
+    def _unchanged(self, path, fingerprint):
+        """目标文件存在且内容指纹未变化"""
+        return self.state['files'].get(path) == fingerprint and os.path.exists(path)
+
+    def _write_if_changed(self, path, rows, render, fingerprint=None):
+        """内容变化时原子写入，返回是否实际写入"""
+        fingerprint = fingerprint or snapshot_fingerprint(rows)
+        if self._unchanged(path, fingerprint):
+            logger.debug("内容未变化，跳过写入: %s", path)
+            return False
+        atomic_write_bytes(path, render(rows))
+        self.state['files'][path] = fingerprint
+        self._save_state()
+        return True
+
+    def export_csv(self, rows, path, fingerprint=None):
+        """导出 CSV，返回是否实际写入；fingerprint 可传入预先计算的内容指纹"""
+        def render(data):
+            buffer = io.StringIO(newline='')
+            writer = csv.DictWriter(buffer, fieldnames=FIELDNAMES)
+            writer.writeheader()
+            writer.writerows(data)
+            return buffer.getvalue().encode('utf-8')
+        return self._write_if_changed(path, rows, render, fingerprint)
+
+    def export_json(self, rows, path, fingerprint=None):
+        """导出 JSON，默认紧凑格式，返回是否实际写入"""
+        def render(data):
+            if self.pretty_json:
+                return json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8')
+            return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        return self._write_if_changed(path, rows, render, fingerprint)
+
+    def append_ndjson(self, rows, path):
+        """只把内容发生变化的位置追加为 NDJSON 行，返回追加的行数"""
+        known = self.state['rows'].setdefault(path, {})
+        lines = []
+        for row in rows:
+            fingerprint = row_fingerprint(row)
+            if known.get(row['location_id']) != fingerprint:
+                known[row['location_id']] = fingerprint
+                lines.append(json.dumps(row, ensure_ascii=False, separators=(',', ':')))
+        if not lines:
+            return 0
+        # 单次 write 追加整块内容，消费者按行读取
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self._save_state()
+        return len(lines)
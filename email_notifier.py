@@ -7,7 +7,9 @@
 
 import smtplib
 import ssl
+import json
 import logging
+import time
 from datetime import datetime
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
@@ -15,46 +17,205 @@ from email.mime.base import MIMEBase
 from email import encoders
 import os
 from dotenv import load_dotenv
+from slot_forecast import parse_slot_date
 
 # 加载环境变量
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+class DigestQueue:
+    """按收件人暂存待合并发送的预约时段，保存在文件中以便跨多次运行合并"""
+    
+    def __init__(self, queue_file=None):
+        """
+        初始化汇总队列
+        
+        Args:
+            queue_file (str): 队列文件路径
+        """
+        self.queue_file = queue_file or os.getenv('DIGEST_QUEUE_FILE', '.email_digest_queue.json')
+        self.pending = {}
+        # 每个收件人最近一次已发送的时段: {recipient: {location_id: {'availability', 'scope'}}}
+        self.sent = {}
+        if os.path.exists(self.queue_file):
+            try:
+                with open(self.queue_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if 'pending' in data or 'sent' in data:
+                    self.pending = data.get('pending', {})
+                    self.sent = data.get('sent', {})
+                else:
+                    # 旧格式只有待发送队列
+                    self.pending = data
+            except Exception as e:
+                logger.warning(f"读取汇总队列失败: {e}")
+    
+    def has_pending(self):
+        """是否有待发送的汇总"""
+        return bool(self.pending)
+    
+    def add(self, recipient, slots, cutoff_date, now, scope=None):
+        """
+        加入待汇总的时段：每个地点只保留最新的一个时段，时段不变时保留首次入队时间
+
+        Args:
+            scope (str): 入队的订阅范围，prune 只清理同一范围的时段
+        """
+        entry = self.pending.setdefault(recipient, {'first_queued': now, 'cutoff_date': cutoff_date, 'slots': {}})
+        entry['cutoff_date'] = cutoff_date
+        for slot in slots:
+            queued = entry['slots'].get(slot['location_id'], {})
+            queued_at = queued['queued_at'] if queued.get('availability') == slot['availability'] else now
+            entry['slots'][slot['location_id']] = dict(slot, queued_at=queued_at, scope=scope)
+    
+    def prune(self, recipient, current_slots, scope=None):
+        """
+        删除已不在本次检查结果中的排队时段和发送记录 (已被订走或地点的最早时段已变化)
+
+        Args:
+            current_slots (list): 本次检查中该订阅符合条件的全部时段
+            scope (str): 只清理该订阅范围入队或发送的时段
+
+        Returns:
+            int: 删除的排队时段数
+        """
+        current = {(slot['location_id'], slot['availability']) for slot in current_slots}
+        sent = self.sent.get(recipient)
+        if sent:
+            self._drop_stale(sent, current, scope)
+            if not sent:
+                del self.sent[recipient]
+        entry = self.pending.get(recipient)
+        if not entry:
+            return 0
+        # 兼容旧格式 (location_id|availability 为键)：统一按地点重建
+        queued = {slot['location_id']: slot for slot in entry['slots'].values()}
+        stale = self._drop_stale(queued, current, scope)
+        entry['slots'] = queued
+        if not queued:
+            del self.pending[recipient]
+        return stale
+    
+    @staticmethod
+    def _drop_stale(slots, current, scope):
+        """从按地点索引的时段中删除同一范围内已失效的时段，返回删除数"""
+        stale = [location_id for location_id, slot in slots.items()
+                 if slot.get('scope') == scope and (location_id, slot['availability']) not in current]
+        for location_id in stale:
+            del slots[location_id]
+        return len(stale)
+    
+    def is_new(self, recipient, slot):
+        """时段是否还没有发给该收件人 (新出现或可预约时间已变化)"""
+        sent = self.sent.get(recipient, {}).get(slot['location_id'])
+        return sent is None or sent['availability'] != slot['availability']
+    
+    def mark_sent(self, recipient, slots, scope=None):
+        """记录已发送的时段，排队时段沿用入队时的范围"""
+        sent = self.sent.setdefault(recipient, {})
+        for slot in slots:
+            sent[slot['location_id']] = {'availability': slot['availability'], 'scope': slot.get('scope', scope)}
+    
+    def tracks(self, recipient):
+        """收件人是否有排队的时段或发送记录"""
+        return recipient in self.pending or recipient in self.sent
+    
+    def is_due(self, recipient, window, now):
+        """收件人的合并窗口是否已到期"""
+        entry = self.pending.get(recipient)
+        return entry is not None and now - entry['first_queued'] >= window
+    
+    def take(self, recipient):
+        """取出收件人的全部待发送时段"""
+        return self.pending.pop(recipient, None)
+    
+    def restore(self, recipient, entry):
+        """发送失败时放回队列"""
+        if entry:
+            self.pending[recipient] = entry
+    
+    def save(self):
+        """保存队列"""
+        try:
+            if not self.pending and not self.sent:
+                if os.path.exists(self.queue_file):
+                    os.remove(self.queue_file)
+                return
+            with open(self.queue_file, 'w', encoding='utf-8') as f:
+                json.dump({'pending': self.pending, 'sent': self.sent}, f, ensure_ascii=False)
+        except Exception as e:
+            logger.warning(f"保存汇总队列失败: {e}")
+
 class EmailNotifier:
-    def __init__(self):
-        """初始化邮件通知器"""
-        self.gmail_user = os.getenv('GMAIL_USER')
-        self.gmail_password = os.getenv('GMAIL_APP_PASSWORD')
-        self.notification_email = os.getenv('NOTIFICATION_EMAIL')
-        self.smtp_server = os.getenv('SMTP_SERVER', 'smtp.gmail.com')
-        self.smtp_port = int(os.getenv('SMTP_PORT', '587'))
+    def __init__(self, config=None):
+        """
+        初始化邮件通知器
+        
+        Args:
+            config (dict): 订阅的渠道配置 (见 monitor_config.Ruleset.email_config)，为空时读取环境变量
+        """
+        if config is None:
+            config = {
+                'user': os.getenv('GMAIL_USER'),
+                'password': os.getenv('GMAIL_APP_PASSWORD'),
+                'recipients': os.getenv('NOTIFICATION_EMAIL'),
+                'smtp_server': os.getenv('SMTP_SERVER', 'smtp.gmail.com'),
+                'smtp_port': os.getenv('SMTP_PORT', '587'),
+                'locations': os.getenv('MONITOR_LOCATIONS', 'Perth,Booragoon,Fremantle').split(','),
+            }
+        self.gmail_user = config.get('user')
+        self.gmail_password = config.get('password')
+        self.smtp_server = config.get('smtp_server', 'smtp.gmail.com')
+        self.smtp_port = int(config.get('smtp_port', 587))
+        
+        # 支持逗号分隔的多个收件人
+        recipients = config.get('recipients') or ''
+        if isinstance(recipients, str):
+            recipients = recipients.split(',')
+        self.recipients = [email.strip() for email in recipients if email.strip()]
+        self.notification_email = ', '.join(self.recipients)
+        
+        # 邮件中显示的监控地点
+        self.location_label = '/'.join(loc.strip() for loc in config.get('locations', []) if loc.strip())
+        
+        # 汇总模式：合并窗口 (秒，0 表示关闭) 和立即发送的紧急天数
+        self.digest_window = float(config.get('digest_window', os.getenv('DIGEST_WINDOW_SECONDS', '0')))
+        self.urgent_days = int(config.get('urgent_days', os.getenv('DIGEST_URGENT_DAYS', '3')))
+        
+        # 最近一次通知的生成和发送时间戳，用于统计通知延迟
+        self.last_timings = {}
+        # 最近一次 notify 中加入汇总队列的时段数，以及已通知过且没有变化而跳过的时段数
+        self.queued_slots = 0
+        self.unchanged_slots = 0
         
         # 验证配置
         self._validate_config()
     
     def _validate_config(self):
         """验证邮件配置"""
-        required_vars = ['GMAIL_USER', 'GMAIL_APP_PASSWORD', 'NOTIFICATION_EMAIL']
         missing_vars = []
-        
-        for var in required_vars:
-            if not os.getenv(var):
-                missing_vars.append(var)
+        if not self.gmail_user:
+            missing_vars.append('GMAIL_USER')
+        if not self.gmail_password:
+            missing_vars.append('GMAIL_APP_PASSWORD')
+        if not self.recipients:
+            missing_vars.append('NOTIFICATION_EMAIL')
         
         if missing_vars:
             raise ValueError(f"缺少必要的环境变量: {', '.join(missing_vars)}")
         
         logger.info(f"邮件配置验证成功: {self.gmail_user} -> {self.notification_email}")
     
-    def create_notification_email(self, available_slots, cutoff_date):
+    def create_notification_email(self, available_slots, cutoff_date, digest=False):
         """创建预约通知邮件"""
         try:
             # 创建邮件对象
             msg = MIMEMultipart('alternative')
             msg['From'] = self.gmail_user
             msg['To'] = self.notification_email
-            msg['Subject'] = f"🏥 Bupa 医疗预约通知 - 发现 {len(available_slots)} 个符合条件的预约"
+            prefix = "汇总" if digest else "通知"
+            msg['Subject'] = f"🏥 Bupa 医疗预约{prefix} - 发现 {len(available_slots)} 个符合条件的预约"
             
             # 创建HTML邮件内容
             html_content = self._create_html_content(available_slots, cutoff_date)
@@ -101,7 +262,7 @@ class EmailNotifier:
             
             <div class="content">
                 <p><strong>检测时间:</strong> {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</p>
-                <p><strong>筛选条件:</strong> {cutoff_date} 之前的 Perth/Booragoon/Fremantle 预约</p>
+                <p><strong>筛选条件:</strong> {cutoff_date} 之前的 {self.location_label} 预约</p>
                 <p><strong>发现结果:</strong> <span class="highlight">{len(available_slots)} 个符合条件的预约时段</span></p>
                 
                 <hr>
@@ -110,7 +271,9 @@ class EmailNotifier:
         """
         
         for slot in available_slots:
-            urgency_class = "urgent" if slot['distance'] in ['4 km', '7 km'] else ""
+            # 排序阶段已标记紧急时段 (日期临近或距离很近)，未经排序的时段按日期判断
+            # 紧急 (日期临近) 或就近的时段突出显示
+            urgency_class = "urgent" if slot.get('urgent', self._is_urgent(slot)) or slot.get('near') else ""
             html += f"""
                 <div class="appointment {urgency_class}">
                     <h4>🏥 {slot['location_name']} ({slot['distance']})</h4>
@@ -155,7 +318,7 @@ Bupa Medical Visa Services 预约通知
 =====================================
 
 检测时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-筛选条件: {cutoff_date} 之前的 Perth/Booragoon/Fremantle 预约
+筛选条件: {cutoff_date} 之前的 {self.location_label} 预约
 发现结果: {len(available_slots)} 个符合条件的预约时段
 
 可用预约详情:
@@ -200,23 +363,164 @@ Bupa Medical Visa Services 预约通知
             msg = self.create_notification_email(available_slots, cutoff_date)
             if not msg:
                 return False
+            render_time = time.time()
             
             # 发送邮件
             logger.info(f"正在发送邮件通知到 {self.notification_email}...")
+            self._deliver([(self.recipients, msg)])
             
-            # 创建SSL上下文
-            context = ssl.create_default_context()
+            self.last_timings = {'render_time': render_time, 'send_time': time.time(), 'slots': available_slots}
+            logger.info(f"✅ 邮件发送成功! 通知了 {len(available_slots)} 个可用预约")
+            return True
             
-            # 连接SMTP服务器并发送邮件
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                server.starttls(context=context)
-                server.login(self.gmail_user, self.gmail_password)
+        except Exception as e:
+            logger.error(f"❌ 邮件发送失败: {e}")
+            return False
+    
+    def _deliver(self, messages):
+        """在同一个 SMTP 连接中发送多封邮件，messages 为 (收件人列表, 邮件) 列表"""
+        # 创建SSL上下文
+        context = ssl.create_default_context()
+        
+        # 连接SMTP服务器并发送邮件
+        with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
+            server.starttls(context=context)
+            server.login(self.gmail_user, self.gmail_password)
+            
+            for recipients, msg in messages:
+                server.sendmail(self.gmail_user, recipients, msg.as_string())
+    
+    def send_drift_alert(self, drift, recipients=None):
+        """发送页面结构变化告警，recipients 为空时发给本通知器的收件人"""
+        try:
+            recipients = recipients or self.recipients
+            msg = MIMEText(f"""
+Bupa Medical Visa Services 监控系统检测到预约网站的页面结构发生了变化。
+
+检测时间: {drift['detected_at']}
+提取策略: {drift['strategy'] or '全部失败'}
+错误信息: {drift['error'] or '无'}
+
+{'已改用后备提取策略，监控仍在运行，但结果可能不完整，请尽快更新选择器。' if drift['strategy'] else '当前无法提取任何预约数据，在修复之前不会收到预约通知！'}
+
+---
+此邮件由 Bupa Medical Visa Services 监控系统自动发送
+""", 'plain', 'utf-8')
+            msg['From'] = self.gmail_user
+            msg['To'] = ', '.join(recipients)
+            msg['Subject'] = "🚨 Bupa 监控告警 - 预约网站页面结构已变化"
+            
+            self._deliver([(recipients, msg)])
+            logger.info(f"✅ 页面结构变化告警已发送到 {', '.join(recipients)}")
+            return True
+            
+        except Exception as e:
+            logger.error(f"❌ 页面结构变化告警发送失败: {e}")
+            return False
+    
+    def _is_urgent(self, slot):
+        """预约日期在紧急天数以内 (无法解析日期时按紧急处理)"""
+        slot_date = parse_slot_date(slot['availability'])
+        if slot_date is None:
+            return True
+        return (slot_date - datetime.now().date()).days <= self.urgent_days
+    
+    def notify(self, available_slots, cutoff_date):
+        """
+        发送或合并预约通知：紧急时段立即发送，其余时段按收件人在合并窗口内汇总为一封邮件。
+        已发给收件人且可预约时间没有变化的时段不再重复发送。
+        没有新时段时只发送已到期的汇总。未开启汇总模式时等同于 send_notification
+        
+        Returns:
+            bool: 本次是否发送了邮件
+        """
+        self.queued_slots = 0
+        self.unchanged_slots = 0
+        if self.digest_window <= 0:
+            return self.send_notification(available_slots, cutoff_date)
+        
+        try:
+            now = time.time()
+            scope = f"{self.location_label}|{cutoff_date}"
+            
+            queue = DigestQueue()
+            messages = []
+            taken = {}
+            delivered = {}
+            sent_slots = []
+            queued_times = []
+            urgent_count = 0
+            
+            for recipient in self.recipients:
+                pruned = queue.prune(recipient, available_slots, scope)
+                if pruned:
+                    logger.info(f"🗑️  {recipient} 的汇总队列中 {pruned} 个时段已失效，已移除")
+                fresh = [slot for slot in available_slots if queue.is_new(recipient, slot)]
+                self.unchanged_slots = max(self.unchanged_slots, len(available_slots) - len(fresh))
+                # 是否立即发送只看预约日期，距离远近只影响邮件中的突出显示
+                urgent = [slot for slot in fresh if self._is_urgent(slot)]
+                deferred = [slot for slot in fresh if not self._is_urgent(slot)]
+                if deferred:
+                    queue.add(recipient, deferred, cutoff_date, now, scope)
+                    self.queued_slots = max(self.queued_slots, len(deferred))
+                # 有紧急时段时顺带发出该收件人已排队的时段
+                if not urgent and not queue.is_due(recipient, self.digest_window, now):
+                    continue
                 
-                # 发送邮件
-                text = msg.as_string()
-                server.sendmail(self.gmail_user, self.notification_email, text)
+                entry = queue.take(recipient)
+                taken[recipient] = entry
+                slots = list(urgent)
+                urgent_locations = {slot['location_id'] for slot in urgent}
+                if entry:
+                    for location_id, slot in entry['slots'].items():
+                        queued_times.append(slot['queued_at'])
+                        if location_id not in urgent_locations:
+                            slots.append(slot)
+                if not slots:
+                    continue
+                slots.sort(key=lambda slot: slot.get('rank_score', 0))
+                queued = slots
+                slots = [{k: v for k, v in slot.items() if k not in ('queued_at', 'scope')} for slot in slots]
+                
+                msg = self.create_notification_email(
+                    slots, entry['cutoff_date'] if entry else cutoff_date, digest=bool(entry)
+                )
+                if not msg:
+                    continue
+                msg.replace_header('To', recipient)
+                messages.append(([recipient], msg))
+                delivered[recipient] = queued
+                sent_slots = slots
+                urgent_count = max(urgent_count, len(urgent))
             
-            logger.info(f"✅ 邮件发送成功! 通知了 {len(available_slots)} 个可用预约")
+            if not messages:
+                queue.save()
+                if self.queued_slots:
+                    logger.info(f"📥 {self.queued_slots} 个时段已加入汇总队列，{self.digest_window:.0f} 秒内合并发送")
+                elif self.unchanged_slots:
+                    logger.info(f"🔁 {self.unchanged_slots} 个时段已通知过且没有变化，不再重复发送")
+                return False
+            
+            render_time = time.time()
+            logger.info(f"正在发送 {len(messages)} 封邮件 (紧急 {urgent_count} 个时段)...")
+            try:
+                self._deliver(messages)
+                for recipient, slots in delivered.items():
+                    queue.mark_sent(recipient, slots, scope)
+            except Exception:
+                for recipient, entry in taken.items():
+                    queue.restore(recipient, entry)
+                raise
+            finally:
+                queue.save()
+            
+            self.last_timings = {
+                'render_time': render_time,
+                'send_time': time.time(),
+                'slots': sent_slots,
+                'scrape_time': min(queued_times) if queued_times and not urgent_count else None,
+            }
+            logger.info(f"✅ 邮件发送成功! 发送 {len(messages)} 封，包含 {len(sent_slots)} 个可用预约")
             return True
             
         except Exception as e:
@@ -255,7 +559,7 @@ Bupa Medical Visa Services 监控系统
                 server.starttls(context=context)
                 server.login(self.gmail_user, self.gmail_password)
                 text = msg.as_string()
-                server.sendmail(self.gmail_user, self.notification_email, text)
+                server.sendmail(self.gmail_user, self.recipients, text)
             
             logger.info("✅ 测试邮件发送成功!")
             return True
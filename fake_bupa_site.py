@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地模拟预约网站
+模仿 Default.aspx、'New Individual booking' (btnInd) postback 和 Location.aspx 位置列表，
+可注入延迟、5xx 错误、慢响应、页面结构变化和大量医疗中心，用于离线压测和故障演练。
+
+用法:
+    python fake_bupa_site.py --port 8800 --centres 3000 --page-size 100
+    BUPA_BASE_URL=http://127.0.0.1:8800/oasis python bupa_scraper_v2.py
+"""
+
+import argparse
+import html
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import parse_qs, urlparse
+
+SESSION_COOKIE = "ASP.NET_SessionId"
+BUTTON_NAME = "ctl00$ContentPlaceHolder1$btnInd"
+GRID_NAME = "ctl00$ContentPlaceHolder1$gvLocations"
+
+# 与真实网站一致的前几个中心，其余为生成的中心
+KNOWN_CENTRES = [
+    ("193", "Perth", "Perth - Bupa Centre\nLevel 3,\n2 Mill Street,\nPerth", 4, "-31.9548200,115.8526330", True),
+    ("185", "Booragoon", "Booragoon Medical Centre\n508 Marmion Street,\nBooragoon WA 6154", 7, "-32.0394809,115.8226591", False),
+    ("187", "Fremantle", "Fremantle Medical Centre\n10 Market Street,\nFremantle WA 6160", 15, "-32.0554200,115.7480100", False),
+]
+
+# 正常和结构变化后的 CSS 类名
+CLASSES = {
+    False: {'table': 'tbl-location', 'row': 'trlocation', 'name': 'tdloc_name', 'title': 'tdlocNameTitle',
+            'distance': 'td-distance', 'availability': 'tdloc_availability', 'radio': 'rbLocation'},
+    True: {'table': 'location-list', 'row': 'location-row', 'name': 'loc-name', 'title': 'loc-title',
+           'distance': 'loc-distance', 'availability': 'loc-next-slot', 'radio': 'rb-location'},
+}
+
+
+class FakeBupaSite:
+    def __init__(self, host='127.0.0.1', port=0, centres=200, page_size=0, latency=0.0, jitter=0.0,
+                 error_rate=0.0, slow_rate=0.0, slow_seconds=5.0, drift=False, available_rate=0.3, seed=None):
+        """
+        初始化模拟网站，故障参数可在运行中直接修改
+
+        Args:
+            centres (int): 医疗中心数量
+            page_size (int): 每页中心数，0 表示不分页
+            latency (float): 每个请求的固定延迟 (秒)
+            jitter (float): 额外的随机延迟上限 (秒)
+            error_rate (float): 返回 503 的概率
+            slow_rate (float): 慢响应的概率
+            slow_seconds (float): 慢响应的延迟 (秒)
+            drift (bool): 是否使用变化后的页面结构
+            available_rate (float): 中心有可用时段的比例
+            seed (int): 随机种子
+        """
+        self.host = host
+        self.port = port
+        self.page_size = page_size
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.slow_seconds = slow_seconds
+        self.drift = drift
+        self.available_rate = available_rate
+
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.sessions = {}
+        self.stats = {'requests': 0, 'errors': 0, 'slow': 0, 'postbacks': 0}
+        self.centres = self._generate_centres(centres)
+        self.server = None
+        self.thread = None
+
+    def _generate_centres(self, count):
+        """生成按距离递增的医疗中心"""
+        centres = [
+            {'id': cid, 'name': name, 'address': address, 'distance': distance, 'coords': coords, 'bupa': bupa}
+            for cid, name, address, distance, coords, bupa in KNOWN_CENTRES[:count]
+        ]
+        for i in range(len(centres), count):
+            distance = 15 + i * 3 + self.random.randint(0, 2)
+            centres.append({
+                'id': str(1000 + i),
+                'name': f"Centre {i:04d}",
+                'address': f"Centre {i:04d} Medical Centre\n{i} Example Road,\nSuburb {i % 97} WA 6{i % 1000:03d}",
+                'distance': distance,
+                'coords': f"{-31.95 - i * 0.001:.7f},{115.85 + i * 0.001:.7f}",
+                'bupa': i % 25 == 0,
+            })
+        return centres
+
+    @property
+    def base_url(self):
+        """模拟网站的 oasis 根地址"""
+        return f"http://{self.host}:{self.server.server_port}/oasis"
+
+    def availability(self, centre, now=None):
+        """中心的下一个可用时间，每分钟变化一次以模拟放号和被约走"""
+        now = now or datetime.now()
+        rng = random.Random(f"{centre['id']}|{now.strftime('%Y%m%d%H%M')}")
+        if rng.random() >= self.available_rate:
+            return "No available slot"
+        slot = now + timedelta(days=rng.randint(1, 60))
+        return f"{slot.strftime('%A %d/%m/%Y')}\n{rng.choice(['08:30 AM', '10:15 AM', '12:45 PM', '03:00 PM'])}"
+
+    def inject_faults(self):
+        """按配置注入延迟和慢响应，返回是否应返回 5xx"""
+        with self.lock:
+            self.stats['requests'] += 1
+            delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0)
+            if self.slow_rate and self.random.random() < self.slow_rate:
+                delay += self.slow_seconds
+                self.stats['slow'] += 1
+            fail = self.error_rate and self.random.random() < self.error_rate
+            if fail:
+                self.stats['errors'] += 1
+        if delay:
+            time.sleep(delay)
+        return fail
+
+    def render_default(self):
+        """首页：只有一个 New Individual booking 按钮"""
+        return f"""<!DOCTYPE html>
+<html><head><title>Online Appointment Scheduling</title></head>
+<body><form method="post" action="Default.aspx" id="form1">
+<input type="hidden" name="__VIEWSTATE" id="__VIEWSTATE" value="{uuid.uuid4().hex}" />
+<input type="hidden" name="__VIEWSTATEGENERATOR" id="__VIEWSTATEGENERATOR" value="CA0B0334" />
+<input type="hidden" name="__EVENTVALIDATION" id="__EVENTVALIDATION" value="{uuid.uuid4().hex}" />
+<input type="submit" name="{BUTTON_NAME}" value="New Individual booking" id="ContentPlaceHolder1_btnInd" />
+</form></body></html>"""
+
+    def render_location(self, page=1):
+        """位置选择页面，分页时附带 GridView 页码链接"""
+        classes = CLASSES[bool(self.drift)]
+        if self.page_size:
+            pages = max(1, -(-len(self.centres) // self.page_size))
+            page = min(max(page, 1), pages)
+            centres = self.centres[(page - 1) * self.page_size:page * self.page_size]
+        else:
+            pages = 1
+            centres = self.centres
+
+        now = datetime.now()
+        rows = []
+        for centre in centres:
+            cid = centre['id']
+            icon = "blue-dot.png" if centre['bupa'] else "red-dot.png"
+            address = html.escape(centre['address']).replace("\n", "<br />")
+            availability = html.escape(self.availability(centre, now)).replace("\n", "<br />")
+            rows.append(f"""<tr class="{classes['row']}">
+<td class="tdloc_select"><input type="radio" class="{classes['radio']}" name="rbLocation" value="{cid}" />
+<input type="hidden" id="{cid}hidCoords" value="{centre['coords']}" /><img src="/oasis/images/{icon}" alt="" /></td>
+<td class="{classes['name']}"><div class="{classes['title']}">{html.escape(centre['name'])}</div><span>{address}</span></td>
+<td class="{classes['distance']}"><span>{centre['distance']} km</span></td>
+<td class="{classes['availability']}"><span>{availability}</span></td>
+</tr>""")
+
+        pager = ""
+        if pages > 1:
+            links = []
+            for number in range(1, pages + 1):
+                if number == page:
+                    links.append(f"<span>{number}</span>")
+                else:
+                    links.append(f"<a href=\"javascript:__doPostBack(&#39;{GRID_NAME}&#39;,&#39;Page${number}&#39;)\">{number}</a>")
+            pager = f"<div class=\"pager\">{' '.join(links)}</div>"
+
+        return f"""<!DOCTYPE html>
+<html><head><title>Select Location</title></head>
+<body><form method="post" action="Location.aspx" id="form1">
+<input type="hidden" name="__EVENTTARGET" id="__EVENTTARGET" value="" />
+<input type="hidden" name="__EVENTARGUMENT" id="__EVENTARGUMENT" value="" />
+<input type="hidden" name="__VIEWSTATE" id="__VIEWSTATE" value="{uuid.uuid4().hex}" />
+<input type="hidden" name="__EVENTVALIDATION" id="__EVENTVALIDATION" value="{uuid.uuid4().hex}" />
+<table class="{classes['table']}">
+<thead><tr><th></th><th>Location</th><th>Distance</th><th>Next available</th></tr></thead>
+<tbody>
+{''.join(rows)}
+</tbody></table>
+{pager}
+</form></body></html>"""
+
+    def start(self):
+        """在后台线程中启动"""
+        handler = type('FakeBupaHandler', (FakeBupaHandler,), {'site': self})
+        self.server = ThreadingHTTPServer((self.host, self.port), handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, name="fake-bupa-site", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """停止"""
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+class FakeBupaHandler(BaseHTTPRequestHandler):
+    site = None
+
+    def log_message(self, format, *args):
+        """不输出访问日志"""
+        pass
+
+    def _session_id(self):
+        """请求中的会话 ID"""
+        for part in (self.headers.get('Cookie') or '').split(';'):
+            name, _, value = part.strip().partition('=')
+            if name == SESSION_COOKIE:
+                return value
+        return None
+
+    def _form(self):
+        """POST 表单内容"""
+        length = int(self.headers.get('Content-Length') or 0)
+        return {k: v[0] for k, v in parse_qs(self.rfile.read(length).decode('utf-8')).items()}
+
+    def _send(self, status, body='', headers=None):
+        """发送响应"""
+        data = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        try:
+            self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端已超时断开
+            pass
+
+    def _redirect(self, location, headers=None):
+        """302 跳转"""
+        self._send(302, '', dict(headers or {}, Location=location))
+
+    def _route(self, method):
+        """按路径分发请求"""
+        path = urlparse(self.path).path
+        if not path.endswith('.aspx'):
+            # 图片等静态资源
+            self._send(404)
+            return
+        if self.site.inject_faults():
+            self._send(503, '<html><body><h1>Service Unavailable</h1></body></html>')
+            return
+
+        session_id = self._session_id()
+        if path.endswith('/Default.aspx'):
+            headers = {}
+            if session_id is None:
+                session_id = uuid.uuid4().hex
+                headers['Set-Cookie'] = f"{SESSION_COOKIE}={session_id}; path=/; HttpOnly"
+            if method == 'POST' and BUTTON_NAME in self._form():
+                with self.site.lock:
+                    self.site.sessions[session_id] = time.time()
+                    self.site.stats['postbacks'] += 1
+                self._redirect('/oasis/Location.aspx', headers)
+                return
+            self._send(200, self.site.render_default(), headers)
+        elif path.endswith('/Location.aspx'):
+            # 没有经过 btnInd postback 的会话跳回首页
+            if session_id not in self.site.sessions:
+                self._redirect('/oasis/Default.aspx')
+                return
+            page = 1
+            if method == 'POST':
+                argument = self._form().get('__EVENTARGUMENT', '')
+                if argument.startswith('Page$') and argument[5:].isdigit():
+                    page = int(argument[5:])
+                with self.site.lock:
+                    self.site.stats['postbacks'] += 1
+            self._send(200, self.site.render_location(page))
+        else:
+            self._send(404)
+
+    def do_GET(self):
+        self._route('GET')
+
+    def do_POST(self):
+        self._route('POST')
+
+
+def main():
+    """独立运行模拟网站"""
+    parser = argparse.ArgumentParser(description='本地模拟 Bupa 预约网站')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8800)
+    parser.add_argument('--centres', type=int, default=200, help='医疗中心数量')
+    parser.add_argument('--page-size', type=int, default=0, help='每页中心数，0 表示不分页')
+    parser.add_argument('--latency', type=float, default=0.0, help='每个请求的延迟 (秒)')
+    parser.add_argument('--jitter', type=float, default=0.0, help='随机延迟上限 (秒)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='返回 503 的概率')
+    parser.add_argument('--slow-rate', type=float, default=0.0, help='慢响应的概率')
+    parser.add_argument('--slow-seconds', type=float, default=5.0, help='慢响应的延迟 (秒)')
+    parser.add_argument('--drift', action='store_true', help='使用变化后的页面结构')
+    args = parser.parse_args()
+
+    site = FakeBupaSite(args.host, args.port, args.centres, args.page_size, args.latency, args.jitter,
+                        args.error_rate, args.slow_rate, args.slow_seconds, args.drift).start()
+    print(f"🧪 模拟网站已启动: {site.base_url}/Default.aspx ({args.centres} 个中心)")
+    print(f"   BUPA_BASE_URL={site.base_url}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print("\n🛑 已停止")
+    finally:
+        site.stop()
+
+
+if __name__ == "__main__":
+    main()
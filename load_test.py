@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+离线压测与故障演练
+启动本地模拟网站 (fake_bupa_site.py)，用爬虫完成完整的检查流程 (进入位置页面、
+提取全部分页、按订阅筛选并记录时段统计)，输出吞吐量、检查耗时 p50/p99、失败次数和故障恢复时间。
+
+场景:
+    steady  正常网站
+    chaos   延迟抖动 + 5xx + 慢响应
+    outage  中间三分之一的检查期间网站完全不可用，统计恢复时间
+    drift   中间开始页面结构发生变化，统计提取为空的检查和改用的后备策略
+
+引擎 (两者都运行 BupaMedicalScraperV2 的完整流程，检查结果交给 BupaMonitor.check_and_notify，邮件只记录不发送):
+    http     浏览器换成基于 requests 的 RequestsDriver，无需 Chrome
+    browser  使用真实的 Chrome
+
+用法:
+    python load_test.py --scenario steady --centres 3000 --page-size 100 --checks 50 --concurrency 4
+    python load_test.py --scenario outage --engine browser --checks 30
+"""
+
+import argparse
+import logging
+import os
+import statistics
+import tempfile
+import threading
+import time
+from urllib.parse import urljoin, urlparse
+
+import requests
+from bs4 import BeautifulSoup
+from selenium.common.exceptions import NoSuchElementException, WebDriverException
+from selenium.webdriver.common.by import By
+
+from bupa_monitor import BupaMonitor
+from bupa_scraper_v2 import BupaMedicalScraperV2
+from circuit_breaker import CircuitBreaker
+from fake_bupa_site import FakeBupaSite
+from location_pages import form_fields
+from monitor_config import parse_ruleset
+from session_cache import SessionCache
+
+logger = logging.getLogger(__name__)
+
+
+def percentile(values, pct):
+    """简单分位数"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class RequestsElement:
+    """RequestsDriver 页面中的元素"""
+
+    def __init__(self, driver, tag):
+        self.driver = driver
+        self.tag = tag
+
+    @property
+    def text(self):
+        return self.tag.get_text(" ", strip=True)
+
+    def get_attribute(self, name):
+        return self.tag.get(name)
+
+    def is_displayed(self):
+        return True
+
+    def is_enabled(self):
+        return not self.tag.has_attr('disabled')
+
+    def click(self):
+        """提交按钮：带上按钮名称 postback 所在表单"""
+        form = self.tag.find_parent('form')
+        if form is None:
+            return
+        fields = dict(form_fields(form))
+        if self.tag.get('name'):
+            fields[self.tag['name']] = self.tag.get('value', '')
+        action = urljoin(self.driver.current_url, form.get('action') or '')
+        self.driver._load(self.driver.session.post(action, data=fields, timeout=self.driver.timeout))
+
+
+class RequestsDriver:
+    """
+    用 requests 实现爬虫用到的 WebDriver 接口 (导航、postback、Cookie、页面源码和元素查找)，
+    在没有 Chrome 的环境中运行 BupaMedicalScraperV2 的完整流程。不执行 JavaScript
+    """
+
+    USER_AGENT = "Mozilla/5.0 (X11; Linux x86_64) bupa-monitor-load-test"
+
+    def __init__(self, timeout=20):
+        self.session = requests.Session()
+        self.session.headers['User-Agent'] = self.USER_AGENT
+        self.timeout = timeout
+        self.current_url = "about:blank"
+        self.page_source = ""
+        self.soup = BeautifulSoup("", "html.parser")
+
+    def _load(self, response):
+        """与浏览器一样跟随跳转，错误状态视为页面加载失败"""
+        if response.status_code >= 400:
+            raise WebDriverException(f"HTTP {response.status_code}: {response.url}")
+        self.current_url = response.url
+        self.page_source = response.text
+        self.soup = BeautifulSoup(response.text, "html.parser")
+
+    def get(self, url):
+        self._load(self.session.get(url, timeout=self.timeout))
+
+    def set_page_load_timeout(self, timeout):
+        self.timeout = timeout
+
+    def implicitly_wait(self, timeout):
+        pass
+
+    def execute_cdp_cmd(self, cmd, params):
+        """只支持写入 Cookie，其他命令忽略"""
+        if cmd == "Network.setCookie":
+            self.session.cookies.set(params['name'], params['value'],
+                                     domain=params.get('domain') or urlparse(params['url']).hostname,
+                                     path=params.get('path', '/'))
+        return {}
+
+    def execute_script(self, script, *args):
+        if "navigator.userAgent" in script:
+            return self.USER_AGENT
+        return None
+
+    def get_cookies(self):
+        return [{'name': c.name, 'value': c.value, 'domain': c.domain or '', 'path': c.path}
+                for c in self.session.cookies]
+
+    def find_elements(self, by, value):
+        if by == By.ID:
+            tags = self.soup.find_all(id=value)
+        elif by == By.TAG_NAME:
+            tags = self.soup.find_all(value)
+        elif by == By.CSS_SELECTOR:
+            tags = self.soup.select(value)
+        else:
+            raise WebDriverException(f"RequestsDriver 不支持的定位方式: {by}")
+        return [RequestsElement(self, tag) for tag in tags]
+
+    def find_element(self, by, value):
+        elements = self.find_elements(by, value)
+        if not elements:
+            raise NoSuchElementException(f"{by}={value}")
+        return elements[0]
+
+    def save_screenshot(self, filename):
+        return False
+
+    def quit(self):
+        self.session.close()
+
+
+class HttpScraper(BupaMedicalScraperV2):
+    """浏览器换成 RequestsDriver 的爬虫，其余流程 (会话复用、postback、分页、熔断、结构变化检测) 不变"""
+
+    def setup_driver(self):
+        self.driver = RequestsDriver(timeout=self.breaker.timeout_for("load_page", self.page_timeout))
+        return True
+
+
+class OfflineMonitor(BupaMonitor):
+    """邮件只记录在 delivered 中，不连接 SMTP"""
+
+    def __init__(self, ruleset=None):
+        self.delivered = []
+        super().__init__(ruleset)
+
+    def _notifier_for(self, subscription):
+        notifier = super()._notifier_for(subscription)
+        notifier._deliver = self.delivered.extend
+        return notifier
+
+
+def make_scraper(engine, base_url, breaker, session_cache, timeout=None):
+    """
+    创建指向模拟网站的爬虫
+
+    Args:
+        timeout (float): 页面请求的默认超时 (秒)，为空时沿用爬虫的默认值
+    """
+    scraper_class = BupaMedicalScraperV2 if engine == 'browser' else HttpScraper
+    scraper = scraper_class(headless=True, breaker=breaker, session_cache=session_cache)
+    scraper.url = f"{base_url}/Default.aspx"
+    scraper.location_url = f"{base_url}/Location.aspx"
+    if timeout is not None:
+        scraper.page_timeout = timeout
+    return scraper
+
+
+class LoadTest:
+    def __init__(self, args):
+        """
+        初始化压测
+
+        Args:
+            args (argparse.Namespace): 命令行参数
+        """
+        self.args = args
+        self.site = FakeBupaSite(centres=args.centres, page_size=args.page_size, latency=args.latency,
+                                 jitter=args.jitter, seed=args.seed)
+        if args.scenario == 'chaos':
+            self.site.jitter = max(args.jitter, 0.2)
+            self.site.error_rate = args.error_rate or 0.1
+            self.site.slow_rate = args.slow_rate or 0.05
+            self.site.slow_seconds = args.slow_seconds
+        else:
+            self.site.error_rate = args.error_rate
+            self.site.slow_rate = args.slow_rate
+            self.site.slow_seconds = args.slow_seconds
+
+        self.lock = threading.Lock()
+        self.next_check = 0
+        self.results = []
+        self.fault_started = None
+        self.fault_ended = None
+        self.monitor = None
+
+    def _phase(self, index):
+        """按检查序号切换故障阶段 (outage / drift 场景)"""
+        third = self.args.checks // 3
+        if self.args.scenario == 'outage':
+            if index == third:
+                self.site.error_rate = 1.0
+                self.fault_started = time.time()
+            elif index == 2 * third:
+                self.site.error_rate = self.args.error_rate
+                self.fault_ended = time.time()
+        elif self.args.scenario == 'drift' and index == third:
+            self.site.drift = True
+            self.fault_started = time.time()
+
+    def _worker(self, engine, monitor):
+        """循环领取检查序号直到完成"""
+        while True:
+            with self.lock:
+                index = self.next_check
+                if index >= self.args.checks:
+                    return
+                self.next_check += 1
+                self._phase(index)
+
+            # 熔断期间与常驻模式一样等待退避结束，而不是立即记为失败
+            wait = engine.breaker.remaining_backoff()
+            if wait:
+                time.sleep(wait)
+
+            start = time.time()
+            success, locations_data = engine.scrape()
+            matched = 0
+            if success and locations_data:
+                # 筛选、通知和时段统计不是线程安全的，与常驻模式一样串行处理
+                with self.lock:
+                    monitor.check_and_notify(locations_data)
+                    matched = len(monitor.last_matching_slots)
+            elif not success:
+                # 与常驻模式一致：检查失败后回收浏览器
+                engine.close()
+            end = time.time()
+
+            with self.lock:
+                self.results.append({
+                    'index': index, 'start': start, 'end': end, 'success': success,
+                    'locations': len(locations_data), 'matched': matched,
+                    'drift': (engine.selector_drift['strategy'] or 'failed') if engine.selector_drift else None,
+                })
+            if self.args.pause:
+                time.sleep(self.args.pause)
+
+    def run(self):
+        """运行压测并返回统计"""
+        self.site.start()
+        base_url = self.site.base_url
+        ruleset = parse_ruleset({
+            'channels': {'email': {'user': 'load-test@example.com', 'password': 'unused'}},
+            'subscriptions': [
+                {'name': 'perth', 'locations': ['Perth', 'Booragoon', 'Fremantle'],
+                 'cutoff_date': '2099-12-31', 'recipients': ['perth@example.com']},
+                {'name': 'wide', 'locations': [f"Centre {i:04d}" for i in range(3, min(self.args.centres, 200))] or ['Perth'],
+                 'cutoff_date': '2099-12-31', 'recipients': ['wide@example.com']},
+            ],
+        }, 'load_test')
+        monitor = self.monitor = OfflineMonitor(ruleset)
+
+        engines = []
+        for i in range(self.args.concurrency):
+            breaker = CircuitBreaker(state_file=f"circuit_state_{i}.json",
+                                     failure_threshold=3, base_backoff=self.args.backoff,
+                                     max_backoff=self.args.backoff * 8)
+            engines.append(make_scraper(self.args.engine, base_url, breaker,
+                                        SessionCache(cache_file=f"session_{i}.json"), timeout=self.args.timeout))
+
+        started = time.time()
+        threads = [threading.Thread(target=self._worker, args=(engine, monitor)) for engine in engines]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.time() - started
+
+        for engine in engines:
+            engine.close()
+        self.site.stop()
+        return self.report(elapsed)
+
+    def report(self, elapsed):
+        """汇总结果"""
+        results = sorted(self.results, key=lambda r: r['index'])
+        ok = [r for r in results if r['success'] and r['locations']]
+        durations = [(r['end'] - r['start']) * 1000 for r in ok]
+        report = {
+            'checks': len(results),
+            'succeeded': len(ok),
+            'failed': sum(1 for r in results if not r['success']),
+            'empty': sum(1 for r in results if r['success'] and not r['locations']),
+            'elapsed_seconds': round(elapsed, 2),
+            'throughput_per_second': round(len(ok) / elapsed, 2) if elapsed else 0,
+            'p50_ms': round(percentile(durations, 50), 1) if durations else None,
+            'p99_ms': round(percentile(durations, 99), 1) if durations else None,
+            'mean_ms': round(statistics.mean(durations), 1) if durations else None,
+            'locations_per_check': max((r['locations'] for r in ok), default=0),
+            'emails': len(self.monitor.delivered),
+            'site': dict(self.site.stats),
+        }
+        if self.args.scenario == 'outage' and self.fault_ended:
+            recovered = [r for r in ok if r['start'] >= self.fault_ended]
+            if recovered:
+                report['recovery_seconds'] = round(recovered[0]['end'] - self.fault_ended, 2)
+                report['recovery_checks'] = sum(
+                    1 for r in results if r['start'] >= self.fault_ended and r['index'] <= recovered[0]['index'])
+            else:
+                report['recovery_seconds'] = None
+        if self.args.scenario == 'drift' and self.fault_started:
+            after = [r for r in results if r['start'] >= self.fault_started and r['success']]
+            report['empty_after_drift'] = sum(1 for r in after if not r['locations'])
+            report['fallback_strategies'] = sorted({r['drift'] for r in after if r['drift']})
+        return report
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='Bupa 监控离线压测与故障演练')
+    parser.add_argument('--scenario', choices=['steady', 'chaos', 'outage', 'drift'], default='steady')
+    parser.add_argument('--engine', choices=['http', 'browser'], default='http')
+    parser.add_argument('--checks', type=int, default=30, help='检查次数')
+    parser.add_argument('--concurrency', type=int, default=1, help='并发检查数 (每个并发使用独立会话)')
+    parser.add_argument('--centres', type=int, default=500, help='医疗中心数量')
+    parser.add_argument('--page-size', type=int, default=100, help='每页中心数，0 表示不分页')
+    parser.add_argument('--latency', type=float, default=0.05, help='每个请求的延迟 (秒)')
+    parser.add_argument('--jitter', type=float, default=0.0, help='随机延迟上限 (秒)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='返回 503 的概率')
+    parser.add_argument('--slow-rate', type=float, default=0.0, help='慢响应的概率')
+    parser.add_argument('--slow-seconds', type=float, default=3.0, help='慢响应的延迟 (秒)')
+    parser.add_argument('--timeout', type=float, default=2.0, help='请求超时 (秒)')
+    parser.add_argument('--backoff', type=float, default=1.0, help='熔断退避基数 (秒)')
+    parser.add_argument('--pause', type=float, default=0.0, help='两次检查之间的间隔 (秒)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--verbose', action='store_true', help='输出监控日志')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.ERROR,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+    # 所有状态文件写入临时目录，不影响正在运行的监控
+    os.chdir(tempfile.mkdtemp(prefix='bupa_load_test_'))
+
+    print(f"🧪 场景 {args.scenario} | 引擎 {args.engine} | {args.checks} 次检查, 并发 {args.concurrency} | "
+          f"{args.centres} 个中心, 每页 {args.page_size or '全部'}")
+    report = LoadTest(args).run()
+
+    print("=" * 60)
+    print(f"检查: {report['checks']} 次, 成功 {report['succeeded']}, 失败 {report['failed']}, 提取为空 {report['empty']}")
+    print(f"耗时: {report['elapsed_seconds']} 秒, 吞吐量 {report['throughput_per_second']} 次/秒")
+    if report['p50_ms'] is not None:
+        print(f"检查耗时: p50 {report['p50_ms']}ms, p99 {report['p99_ms']}ms, 平均 {report['mean_ms']}ms "
+              f"(每次 {report['locations_per_check']} 个位置)")
+    if 'recovery_seconds' in report:
+        print(f"故障恢复: {report['recovery_seconds']} 秒 ({report.get('recovery_checks')} 次检查)")
+    if 'empty_after_drift' in report:
+        print(f"页面结构变化后提取为空: {report['empty_after_drift']} 次, "
+              f"检测到变化并改用: {', '.join(report['fallback_strategies']) or '无'}")
+    site = report['site']
+    print(f"通知: {report['emails']} 封邮件 (未实际发送)")
+    print(f"模拟网站: {site['requests']} 个请求, 503 {site['errors']} 次, 慢响应 {site['slow']} 次, postback {site['postbacks']} 次")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,452 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+位置列表分页
+用 BeautifulSoup 解析位置选择页面的 HTML，发现 GridView 分页链接和 "显示更多" 按钮，
+通过 requests 复用浏览器会话并发提交 ASP.NET postback 获取其余页面，按距离稳定排序合并。
+每页先抽查几行确定提取策略 (CSS 选择器 → 表头对应列 → 按内容识别)，页面结构变化时不再逐行失败
+"""
+
+import logging
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+from bs4 import BeautifulSoup
+
+logger = logging.getLogger(__name__)
+
+POSTBACK_PATTERN = re.compile(r"__doPostBack\('([^']*)','([^']*)'\)")
+PAGE_ARGUMENT_PATTERN = re.compile(r"^Page\$(\d+)$")
+SHOW_MORE_PATTERN = re.compile(r"show more|load more|more locations|更多", re.IGNORECASE)
+DISTANCE_PATTERN = re.compile(r"([\d,]+(?:\.\d+)?)\s*km", re.IGNORECASE)
+SLOT_PATTERN = re.compile(r"\d{1,2}/\d{1,2}/\d{4}|No available slot", re.IGNORECASE)
+
+# 表头文字到字段的对应关系 (表头匹配策略)
+HEADER_KEYWORDS = {
+    'name': ("location", "centre", "center", "name"),
+    'distance': ("distance", "km"),
+    'availability': ("available", "availability", "next", "appointment", "date"),
+}
+
+# 校验页面结构时抽查的行数
+SCHEMA_SAMPLE_ROWS = 3
+
+
+class SelectorDriftError(Exception):
+    """页面结构变化，所有提取策略都无法解析位置表格"""
+
+
+def _cell_text(element):
+    """与浏览器 .text 相近的文本：按元素拆行并去掉首尾空白"""
+    return element.get_text("\n", strip=True) if element is not None else ""
+
+
+def _required(element, description):
+    """元素不存在时抛出异常，说明缺少的选择器"""
+    if element is None:
+        raise ValueError(f"缺少 {description}")
+    return element
+
+
+def _coordinates(row, location_id):
+    """隐藏的坐标字段"""
+    coords_input = row.find(id=f"{location_id}hidCoords")
+    return coords_input.get("value", "") if coords_input is not None else ""
+
+
+def _name_and_address(cell):
+    """位置单元格：第一行为名称，span 中为完整地址 (没有 span 时取其余各行)"""
+    lines = _cell_text(cell).split("\n")
+    span = cell.find("span")
+    address = _cell_text(span) if span is not None else "\n".join(lines[1:])
+    return lines[0], address
+
+
+def _radio_value(row):
+    """行内单选框的值 (位置 ID)"""
+    radio = _required(row.find("input", attrs={"type": "radio"}), "input[type=radio]")
+    return _required(radio.get("value"), "单选框的 value")
+
+
+def _prepare_css(table):
+    """原有的 CSS 选择器，无需预处理"""
+    return {}
+
+
+def _extract_css(row, context):
+    """原有的 CSS 选择器"""
+    location_id = _required(row.select_one("input.rbLocation"), "input.rbLocation")["value"]
+    name_cell = _required(row.select_one(".tdloc_name"), ".tdloc_name")
+    return {
+        "location_id": location_id,
+        "location_name": _cell_text(_required(name_cell.select_one(".tdlocNameTitle"), ".tdlocNameTitle")),
+        "full_address": _cell_text(name_cell.find("span")),
+        "distance": _cell_text(_required(row.select_one(".td-distance span"), ".td-distance span")),
+        "availability": _cell_text(_required(row.select_one(".tdloc_availability span"), ".tdloc_availability span")),
+        "coordinates": _coordinates(row, location_id),
+    }
+
+
+def _prepare_header(table):
+    """按表头文字确定名称、距离、可用时间所在的列"""
+    headers = [_cell_text(th).lower() for th in table.select("thead th")] or \
+              [_cell_text(th).lower() for th in table.select("tr th")]
+    columns = {}
+    for field, keywords in HEADER_KEYWORDS.items():
+        for index, text in enumerate(headers):
+            if index not in columns.values() and any(keyword in text for keyword in keywords):
+                columns[field] = index
+                break
+    return columns if len(columns) == len(HEADER_KEYWORDS) else None
+
+
+def _extract_header(row, columns):
+    """按表头确定的列位置提取"""
+    cells = row.find_all("td", recursive=False)
+    if len(cells) <= max(columns.values()):
+        raise ValueError(f"行只有 {len(cells)} 列，与表头不一致")
+    location_id = _radio_value(row)
+    location_name, full_address = _name_and_address(cells[columns['name']])
+    return {
+        "location_id": location_id,
+        "location_name": location_name,
+        "full_address": full_address,
+        "distance": _cell_text(cells[columns['distance']]),
+        "availability": _cell_text(cells[columns['availability']]),
+        "coordinates": _coordinates(row, location_id),
+    }
+
+
+def _prepare_content(table):
+    """不依赖类名和表头，按单元格内容识别"""
+    return {}
+
+
+def _extract_content(row, context):
+    """距离列含 "km"，可用时间列含日期或 "No available slot"，其余第一个有文字的列为位置"""
+    distance = availability = name_cell = None
+    for cell in row.find_all("td", recursive=False):
+        text = _cell_text(cell)
+        if not text:
+            continue
+        if distance is None and DISTANCE_PATTERN.fullmatch(text):
+            distance = text
+        elif availability is None and SLOT_PATTERN.search(text):
+            availability = text
+        elif name_cell is None:
+            name_cell = cell
+    _required(distance, "距离列")
+    _required(availability, "可用时间列")
+    location_id = _radio_value(row)
+    location_name, full_address = _name_and_address(_required(name_cell, "位置列"))
+    return {
+        "location_id": location_id,
+        "location_name": location_name,
+        "full_address": full_address,
+        "distance": distance,
+        "availability": availability,
+        "coordinates": _coordinates(row, location_id),
+    }
+
+
+# 按优先级排列的提取策略：(名称, 预处理, 单行提取)
+STRATEGIES = [
+    ("css", _prepare_css, _extract_css),
+    ("header", _prepare_header, _extract_header),
+    ("content", _prepare_content, _extract_content),
+]
+
+
+def _find_table(soup):
+    """
+    查找位置表格，class 变化时找含单选框和距离的表格
+
+    Returns:
+        tuple: (表格, 是否通过后备方式找到)
+    """
+    table = soup.select_one("table.tbl-location")
+    if table is not None:
+        return table, False
+    for candidate in soup.find_all("table"):
+        if candidate.find("input", attrs={"type": "radio"}) and DISTANCE_PATTERN.search(candidate.get_text(" ")):
+            return candidate, True
+    return None, False
+
+
+def _table_rows(table):
+    """位置行：优先使用 tr.trlocation，class 变化时取含单选框的行"""
+    rows = table.select("tbody tr.trlocation")
+    if rows:
+        return rows
+    return [tr for tr in table.find_all("tr") if tr.find("input", attrs={"type": "radio"})]
+
+
+def _valid(location):
+    """抽查结果是否像一个位置"""
+    return (location["location_id"] and location["location_name"] and location["availability"]
+            and distance_km(location["distance"]) != float("inf"))
+
+
+def select_strategy(table, rows):
+    """
+    每页校验一次页面结构：依次尝试各策略，抽查前几行全部解析成功的策略即被选用
+
+    Raises:
+        SelectorDriftError: 所有策略都失败
+    """
+    sample = rows[:SCHEMA_SAMPLE_ROWS]
+    errors = []
+    for name, prepare, extract in STRATEGIES:
+        context = prepare(table)
+        if context is None:
+            errors.append(f"{name}: 表头不匹配")
+            continue
+        try:
+            if all(_valid(extract(row, context)) for row in sample):
+                return name, extract, context
+            errors.append(f"{name}: 抽查结果不完整")
+        except Exception as e:
+            errors.append(f"{name}: {e}")
+    raise SelectorDriftError("; ".join(errors))
+
+
+def parse_location_rows(html, extracted_time=None):
+    """
+    解析一页位置列表
+
+    Returns:
+        tuple: (位置数据列表, 行数, 失败行数, 首个错误, 使用的策略)
+
+    Raises:
+        SelectorDriftError: 页面有位置表格但无法解析
+    """
+    soup = html if isinstance(html, BeautifulSoup) else BeautifulSoup(html, "html.parser")
+    extracted_time = extracted_time or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    table, table_fallback = _find_table(soup)
+    if table is None:
+        raise SelectorDriftError("找不到位置表格 (table.tbl-location)")
+
+    rows = _table_rows(table)
+    if not rows:
+        return [], 0, 0, None, None
+    strategy, extract, context = select_strategy(table, rows)
+    if table_fallback:
+        strategy = f"table+{strategy}"
+
+    locations_data = []
+    failed_rows = 0
+    first_error = None
+
+    for i, row in enumerate(rows):
+        try:
+            location = extract(row, context)
+            location["center_type"] = "Bupa Centre" if "blue-dot.png" in str(row) else "Regional Medical Centre"
+            location["has_available_slots"] = "No available slot" not in location["availability"]
+            location["extracted_time"] = extracted_time
+            locations_data.append(location)
+            logger.debug("提取数据: %s - %s", location["location_name"], location["availability"])
+
+        except Exception as row_error:
+            failed_rows += 1
+            if first_error is None:
+                first_error = row_error
+            logger.debug("提取第 %d 行数据失败: %s", i + 1, row_error)
+
+    return locations_data, len(rows), failed_rows, first_error, strategy
+
+
+def form_fields(soup):
+    """页面表单中的隐藏字段 (__VIEWSTATE、__EVENTVALIDATION 等)"""
+    form = soup.find("form") or soup
+    return {
+        field["name"]: field.get("value", "")
+        for field in form.select("input[type=hidden]")
+        if field.get("name")
+    }
+
+
+def find_more_pages(html, known_count):
+    """
+    发现当前页面可以继续加载的页面
+
+    只识别数字分页 (Page$N) 和 "显示更多" 按钮；"显示更多" 的标识带上已知位置数，
+    返回的位置增加后才会再次跟进
+
+    Args:
+        html (str | BeautifulSoup): 页面内容
+        known_count (int): 已获取的位置数
+
+    Returns:
+        list: (页面标识, 提交的表单字段) 列表
+    """
+    soup = html if isinstance(html, BeautifulSoup) else BeautifulSoup(html, "html.parser")
+    base = form_fields(soup)
+    pages = []
+
+    for link in soup.select("a[href*='__doPostBack']"):
+        match = POSTBACK_PATTERN.search(link["href"])
+        if not match:
+            continue
+        target, argument = match.groups()
+        if PAGE_ARGUMENT_PATTERN.match(argument):
+            key = argument
+        elif SHOW_MORE_PATTERN.search(link.get_text()):
+            key = f"more:{target}:{known_count}"
+        else:
+            continue
+        pages.append((key, dict(base, __EVENTTARGET=target, __EVENTARGUMENT=argument)))
+
+    for button in soup.select("input[type=submit]"):
+        if button.get("name") and SHOW_MORE_PATTERN.search(button.get("value", "")):
+            pages.append((f"more:{button['name']}:{known_count}",
+                          dict(base, __EVENTTARGET="", __EVENTARGUMENT="", **{button["name"]: button.get("value", "")})))
+
+    return pages
+
+
+def distance_km(distance):
+    """距离文本转换为公里数，无法解析时排在最后"""
+    match = DISTANCE_PATTERN.search(distance or "")
+    if not match:
+        return float("inf")
+    return float(match.group(1).replace(",", ""))
+
+
+def merge_location_pages(pages):
+    """合并多页数据：按位置 ID 去重 (保留先出现的一份)，按距离稳定排序"""
+    merged = {}
+    for page in pages:
+        for location in page:
+            merged.setdefault(location["location_id"], location)
+    return sorted(merged.values(), key=lambda location: distance_km(location["distance"]))
+
+
+def collect_location_pages(first_html, fetch_all, max_pages=None, extracted_time=None):
+    """
+    从第一页开始逐轮发现并抓取其余页面，同一轮发现的页面交给 fetch_all 并发获取
+
+    Args:
+        first_html (str): 第一页 HTML
+        fetch_all (callable): 接收表单字段列表，返回对应页面 HTML 列表 (失败的页面为 None)
+        max_pages (int): 最多获取的页面数，默认读取 LOCATION_MAX_PAGES
+
+    Returns:
+        dict: pages (每页位置数据), rows, failed_rows, first_error, strategy (第一页使用的提取策略),
+              page_count, failed_pages
+
+    Raises:
+        SelectorDriftError: 第一页结构无法解析
+    """
+    max_pages = max_pages or int(os.getenv('LOCATION_MAX_PAGES', '20'))
+    extracted_time = extracted_time or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    soup = BeautifulSoup(first_html, "html.parser")
+    locations, rows, failed_rows, first_error, strategy = parse_location_rows(soup, extracted_time)
+    result = {
+        'pages': [locations],
+        'rows': rows,
+        'failed_rows': failed_rows,
+        'first_error': first_error,
+        'strategy': strategy,
+        'page_count': 1,
+        'failed_pages': 0,
+    }
+    known_ids = {location['location_id'] for location in locations}
+    seen = {"Page$1"}
+    frontier = [soup]
+
+    while frontier and result['page_count'] < max_pages:
+        batch = []
+        for page in frontier:
+            for key, fields in find_more_pages(page, len(known_ids)):
+                if key not in seen:
+                    seen.add(key)
+                    batch.append(fields)
+        batch = batch[:max_pages - result['page_count']]
+        if not batch:
+            break
+
+        frontier = []
+        for html in fetch_all(batch):
+            if html is None:
+                result['failed_pages'] += 1
+                continue
+            page = BeautifulSoup(html, "html.parser")
+            try:
+                locations, rows, failed_rows, error, _ = parse_location_rows(page, extracted_time)
+            except SelectorDriftError as e:
+                logger.warning(f"分页结构无法解析: {e}")
+                result['failed_pages'] += 1
+                continue
+            result['page_count'] += 1
+            result['rows'] += rows
+            result['failed_rows'] += failed_rows
+            result['first_error'] = result['first_error'] or error
+            new_ids = {location['location_id'] for location in locations} - known_ids
+            if new_ids:
+                known_ids |= new_ids
+                result['pages'].append(locations)
+                frontier.append(page)
+
+    return result
+
+
+class LocationPageFetcher:
+    def __init__(self, url, cookies, user_agent=None, max_workers=None, timeout=20):
+        """
+        初始化分页抓取器
+
+        Args:
+            url (str): 位置选择页面地址 (postback 提交地址)
+            cookies (list): 浏览器会话 Cookie (driver.get_cookies() 格式)
+            user_agent (str): 与浏览器一致的 User-Agent
+            max_workers (int): 并发请求数，默认读取 LOCATION_PAGE_WORKERS
+            timeout (float): 单个请求超时 (秒)
+        """
+        self.url = url
+        self.cookies = cookies
+        self.user_agent = user_agent
+        self.max_workers = max_workers or int(os.getenv('LOCATION_PAGE_WORKERS', '4'))
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _session(self):
+        """每个线程一个 requests 会话，复用连接"""
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            for cookie in self.cookies:
+                session.cookies.set(cookie['name'], cookie['value'],
+                                    domain=cookie.get('domain', ''), path=cookie.get('path', '/'))
+            if self.user_agent:
+                session.headers['User-Agent'] = self.user_agent
+            session.headers['Referer'] = self.url
+            self._local.session = session
+        return session
+
+    def fetch(self, fields):
+        """提交一次 postback，返回页面 HTML"""
+        response = self._session().post(self.url, data=fields, timeout=self.timeout)
+        response.raise_for_status()
+        if "Location.aspx" not in response.url:
+            raise ValueError(f"响应不是位置页面 (会话可能已失效): {response.url}")
+        return response.text
+
+    def _fetch_or_none(self, fields):
+        """抓取失败时记录日志并返回 None"""
+        try:
+            return self.fetch(fields)
+        except Exception as e:
+            logger.warning(f"获取分页失败 ({fields.get('__EVENTARGUMENT') or '显示更多'}): {e}")
+            return None
+
+    def fetch_all(self, forms):
+        """并发提交多个 postback，按提交顺序返回页面 HTML"""
+        if len(forms) == 1:
+            return [self._fetch_or_none(forms[0])]
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(forms))) as executor:
+            return list(executor.map(self._fetch_or_none, forms))
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+日志配置
+支持文本和结构化 JSON 两种格式，可通过队列把格式化和磁盘写入移出检查流程
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+from datetime import datetime
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+# 写入 JSON 的标准字段之外的附加字段，通过 extra={'fields': {...}} 传入
+FIELDS_ATTR = 'fields'
+
+_listener = None
+
+
+def _stop_listener():
+    """停止后台日志线程，写完队列中剩余的日志"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """每条日志输出为一行 JSON"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created).strftime('%Y-%m-%d %H:%M:%S.%f')[:-3],
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        fields = getattr(record, FIELDS_ATTR, None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def setup_logging(log_file=None, level=logging.INFO, log_format=None, use_queue=None):
+    """
+    配置根日志记录器，替换已有的处理器
+
+    Args:
+        log_file (str): 日志文件路径，按大小轮转；为空时只输出到控制台
+        level (int): 日志级别
+        log_format (str): 'text' 或 'json'，默认读取 LOG_FORMAT
+        use_queue (bool): 是否使用队列异步写日志，默认读取 LOG_QUEUE (JSON 模式下默认开启)
+
+    Returns:
+        QueueListener: 使用队列时返回监听器，否则返回 None
+    """
+    global _listener
+
+    log_format = (log_format or os.getenv('LOG_FORMAT', 'text')).lower()
+    if use_queue is None:
+        use_queue = os.getenv('LOG_QUEUE', 'true' if log_format == 'json' else 'false').lower() in ['true', '1', 'yes']
+
+    formatter = JsonFormatter() if log_format == 'json' else logging.Formatter(TEXT_FORMAT)
+
+    handlers = [logging.StreamHandler()]
+    if log_file:
+        handlers.append(logging.handlers.RotatingFileHandler(
+            log_file,
+            maxBytes=int(os.getenv('LOG_MAX_BYTES', str(10 * 1024 * 1024))),
+            backupCount=int(os.getenv('LOG_BACKUP_COUNT', '5')),
+            encoding='utf-8'
+        ))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    root = logging.getLogger()
+    _stop_listener()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+    root.setLevel(level)
+
+    if use_queue:
+        # 调用方只把日志记录放入队列，格式化和写入在后台线程中完成
+        log_queue = queue.SimpleQueue()
+        root.addHandler(logging.handlers.QueueHandler(log_queue))
+        _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+    else:
+        for handler in handlers:
+            root.addHandler(handler)
+
+    return _listener
+
+
+atexit.register(_stop_listener)
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+监控配置
+从 JSON 配置文件加载多个订阅 (监控地点、截止日期、收件人) 和通知渠道，
+编译为只读规则集；常驻模式下按修改时间轮询配置文件，校验通过后在两次检查之间整体替换。
+没有配置文件时从环境变量生成单个订阅，与原有行为一致
+"""
+
+import json
+import logging
+import os
+from datetime import datetime
+
+from slot_ranking import parse_coordinates
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LOCATIONS = 'Perth,Booragoon,Fremantle'
+DEFAULT_CUTOFF_DATE = '2025-08-29'
+
+
+class Subscription:
+    """一个订阅：在截止日期前监控哪些地点，通知谁"""
+
+    def __init__(self, name, locations, cutoff_date, recipients, channel='email', urgent_days=None, home=None):
+        self.name = name
+        self.locations = tuple(locations)
+        self.location_set = frozenset(self.locations)
+        self.cutoff_date = cutoff_date
+        self.cutoff = datetime.strptime(cutoff_date, '%Y-%m-%d').date()
+        self.recipients = tuple(recipients)
+        self.channel = channel
+        self.urgent_days = urgent_days
+        # 订阅者坐标 (纬度, 经度)，用于按实际距离排序
+        self.home = home
+
+
+class Ruleset:
+    """编译后的只读规则集，替换时整体替换引用"""
+
+    def __init__(self, subscriptions, channels, source):
+        self.subscriptions = tuple(subscriptions)
+        self.channels = channels
+        self.source = source
+        # 所有订阅关注的地点，保持首次出现的顺序
+        self.all_locations = tuple(dict.fromkeys(loc for sub in self.subscriptions for loc in sub.locations))
+
+    def email_config(self, subscription):
+        """生成订阅对应的 EmailNotifier 配置"""
+        channel = self.channels[subscription.channel]
+        config = dict(channel)
+        config['recipients'] = list(subscription.recipients)
+        config['locations'] = list(subscription.locations)
+        if subscription.urgent_days is not None:
+            config['urgent_days'] = subscription.urgent_days
+        return config
+
+
+def _env_email_channel():
+    """从环境变量读取邮件渠道配置"""
+    return {
+        'type': 'email',
+        'user': os.getenv('GMAIL_USER'),
+        'password': os.getenv('GMAIL_APP_PASSWORD'),
+        'smtp_server': os.getenv('SMTP_SERVER', 'smtp.gmail.com'),
+        'smtp_port': int(os.getenv('SMTP_PORT', '587')),
+    }
+
+
+def ruleset_from_env():
+    """由环境变量生成单订阅规则集"""
+    locations = [loc.strip() for loc in os.getenv('MONITOR_LOCATIONS', DEFAULT_LOCATIONS).split(',') if loc.strip()]
+    recipients = [email.strip() for email in os.getenv('NOTIFICATION_EMAIL', '').split(',') if email.strip()]
+    subscription = Subscription('default', locations, os.getenv('CUTOFF_DATE', DEFAULT_CUTOFF_DATE), recipients,
+                                home=parse_coordinates(os.getenv('HOME_COORDINATES')))
+    return Ruleset([subscription], {'email': _env_email_channel()}, 'env')
+
+
+def parse_ruleset(data, source):
+    """
+    校验配置内容并编译为规则集
+
+    Raises:
+        ValueError: 配置不合法
+    """
+    if not isinstance(data, dict):
+        raise ValueError("配置文件顶层必须是对象")
+
+    channels = {}
+    for name, channel in (data.get('channels') or {'email': {}}).items():
+        if not isinstance(channel, dict):
+            raise ValueError(f"渠道 {name} 必须是对象")
+        merged = _env_email_channel()
+        merged.update({k: v for k, v in channel.items() if v is not None})
+        if merged.get('type', 'email') != 'email':
+            raise ValueError(f"渠道 {name}: 不支持的类型 {merged.get('type')}")
+        if not merged.get('user') or not merged.get('password'):
+            raise ValueError(f"渠道 {name}: 缺少 user / password (或 GMAIL_USER / GMAIL_APP_PASSWORD)")
+        try:
+            merged['smtp_port'] = int(merged['smtp_port'])
+        except (TypeError, ValueError):
+            raise ValueError(f"渠道 {name}: smtp_port 必须是整数")
+        channels[name] = merged
+
+    raw_subscriptions = data.get('subscriptions')
+    if not isinstance(raw_subscriptions, list) or not raw_subscriptions:
+        raise ValueError("subscriptions 必须是非空列表")
+
+    subscriptions = []
+    names = set()
+    for index, raw in enumerate(raw_subscriptions, 1):
+        if not isinstance(raw, dict):
+            raise ValueError(f"第 {index} 个订阅必须是对象")
+        name = raw.get('name') or f"subscription-{index}"
+        if name in names:
+            raise ValueError(f"订阅名称重复: {name}")
+        names.add(name)
+
+        locations = raw.get('locations')
+        if isinstance(locations, str):
+            locations = locations.split(',')
+        if not isinstance(locations, list) or not [loc for loc in locations if str(loc).strip()]:
+            raise ValueError(f"订阅 {name}: locations 不能为空")
+        locations = [str(loc).strip() for loc in locations if str(loc).strip()]
+
+        cutoff_date = raw.get('cutoff_date', '')
+        try:
+            datetime.strptime(cutoff_date, '%Y-%m-%d')
+        except (TypeError, ValueError):
+            raise ValueError(f"订阅 {name}: cutoff_date 格式应为 YYYY-MM-DD，实际为 {cutoff_date!r}")
+
+        recipients = raw.get('recipients')
+        if isinstance(recipients, str):
+            recipients = recipients.split(',')
+        recipients = [str(r).strip() for r in (recipients or []) if str(r).strip()]
+        if not recipients or any('@' not in r for r in recipients):
+            raise ValueError(f"订阅 {name}: recipients 必须是有效的邮箱列表")
+
+        channel = raw.get('channel', 'email')
+        if channel not in channels:
+            raise ValueError(f"订阅 {name}: 未定义的渠道 {channel}")
+
+        urgent_days = raw.get('urgent_days')
+        if urgent_days is not None and not isinstance(urgent_days, int):
+            raise ValueError(f"订阅 {name}: urgent_days 必须是整数")
+
+        home = raw.get('home')
+        if home is not None:
+            if isinstance(home, (list, tuple)):
+                home = ','.join(str(part) for part in home)
+            home = parse_coordinates(home)
+            if home is None:
+                raise ValueError(f"订阅 {name}: home 格式应为 \"纬度,经度\"")
+
+        subscriptions.append(Subscription(name, locations, cutoff_date, recipients, channel, urgent_days, home))
+
+    return Ruleset(subscriptions, channels, source)
+
+
+def load_ruleset(path):
+    """从配置文件加载规则集"""
+    with open(path, 'r', encoding='utf-8') as f:
+        try:
+            data = json.load(f)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"配置文件不是合法的 JSON: {e}")
+    return parse_ruleset(data, path)
+
+
+def config_path():
+    """配置文件路径"""
+    return os.getenv('MONITOR_CONFIG_FILE', 'monitor_config.json')
+
+
+def load_active_ruleset():
+    """存在配置文件时从文件加载，否则使用环境变量"""
+    path = config_path()
+    if os.path.exists(path):
+        return load_ruleset(path)
+    return ruleset_from_env()
+
+
+class ConfigWatcher:
+    def __init__(self, path=None):
+        """
+        初始化配置监视器
+
+        Args:
+            path (str): 配置文件路径
+        """
+        self.path = path or config_path()
+        self._mtime = self._current_mtime()
+        self.ruleset = load_active_ruleset() if path is None else (
+            load_ruleset(self.path) if self._mtime else ruleset_from_env()
+        )
+
+    def _current_mtime(self):
+        """配置文件修改时间，不存在时返回 None"""
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def poll(self):
+        """
+        检查配置文件是否变化，变化且校验通过时替换规则集
+
+        Returns:
+            bool: 规则集是否被替换
+        """
+        mtime = self._current_mtime()
+        if mtime == self._mtime:
+            return False
+        self._mtime = mtime
+
+        try:
+            ruleset = load_ruleset(self.path) if mtime else ruleset_from_env()
+        except Exception as e:
+            logger.error(f"❌ 配置文件校验失败，继续使用当前配置: {e}")
+            return False
+
+        self.ruleset = ruleset
+        logger.info(f"🔄 已加载新配置 ({ruleset.source}): {len(ruleset.subscriptions)} 个订阅, "
+                    f"监控地点 {', '.join(ruleset.all_locations)}")
+        return True
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+常驻监控进程
+在同一个进程中复用浏览器定期检查预约，监控内存占用，
+超过上限时回收浏览器，并清理异常退出后遗留的孤儿浏览器进程；
+每次检查前检测配置文件变化，无需重启即可更新订阅。
+集群模式下多个节点通过 cluster_coordinator 轮流检查，只由通知节点发送邮件
+"""
+
+import logging
+import os
+import time
+from datetime import datetime
+
+from bupa_monitor import BupaMonitor
+from bupa_scraper_v2 import BupaMedicalScraperV2, BROWSER_MARKER
+from monitor_config import ConfigWatcher
+from process_stats import get_memory_stats, reap_orphan_browsers
+from status_api import StatusServer
+
+logger = logging.getLogger(__name__)
+
+
+class MonitorDaemon:
+    def __init__(self, interval_minutes=None, memory_limit_mb=None, coordinator=None):
+        """
+        初始化常驻监控
+
+        Args:
+            interval_minutes (int): 检查间隔 (分钟)
+            memory_limit_mb (float): 浏览器进程内存上限 (MB)，超过后重启浏览器
+            coordinator (ClusterCoordinator): 集群协调器，为空时单节点运行
+        """
+        self.interval_minutes = interval_minutes or int(os.getenv('CHECK_INTERVAL', '30'))
+        self.fast_interval_minutes = int(os.getenv('CHECK_INTERVAL_FAST', str(self.interval_minutes)))
+        self.memory_limit_mb = memory_limit_mb or float(os.getenv('BROWSER_MEMORY_LIMIT_MB', '1024'))
+
+        self.scraper = BupaMedicalScraperV2(headless=True)
+        self.config_watcher = ConfigWatcher()
+        self.monitor = BupaMonitor(self.config_watcher.ruleset)
+
+        self.started_at = datetime.now()
+        self.polls = 0
+        self.failed_polls = 0
+        self.driver_recycles = 0
+        self.reaped_processes = 0
+        self.last_poll_time = None
+        self.memory = {}
+        
+        self.coordinator = coordinator
+        # 单节点时本节点总是通知节点
+        self.is_notifier = coordinator is None
+        
+        # STATUS_API_PORT=0 时不启动状态 API
+        self.status_server = StatusServer() if self._status_api_enabled() else None
+
+    @staticmethod
+    def _status_api_enabled():
+        """是否启用本地状态 API"""
+        return os.getenv('STATUS_API_PORT', '8765') != '0'
+
+    def poll(self):
+        """执行一次检查，任何异常路径都会回收浏览器"""
+        self.polls += 1
+        self.last_poll_time = datetime.now()
+        self.reload_config()
+        try:
+            success, locations_data = self.scraper.scrape()
+            if self.scraper.selector_drift and self.is_notifier:
+                self.monitor.alert_selector_drift(self.scraper.selector_drift)
+            if not success or not locations_data:
+                self.failed_polls += 1
+                # 页面状态未知，下次检查重新启动浏览器
+                self.recycle_driver("检查失败")
+                return
+            if self.coordinator:
+                # 集群模式：交给通知节点筛选和发送
+                self.coordinator.publish(locations_data)
+            else:
+                self.monitor.check_and_notify(locations_data)
+            # 先通知再写文件，导出不占用通知延迟
+            self.scraper.export_data(locations_data)
+            if self.status_server and not self.coordinator:
+                self.status_server.publish(locations_data, self.monitor.last_matching_slots)
+        except Exception as e:
+            self.failed_polls += 1
+            logger.error(f"检查过程中发生异常: {e}")
+            self.recycle_driver("异常")
+        finally:
+            self.check_memory()
+            if self.status_server:
+                self.status_server.publish(status=self.status())
+
+    def reload_config(self):
+        """配置文件变化时在本次检查开始前替换规则集，不影响进行中的检查"""
+        if self.config_watcher.poll():
+            self.monitor.apply_ruleset(self.config_watcher.ruleset)
+
+    def check_memory(self):
+        """统计内存，超过上限时回收浏览器，并清理孤儿浏览器进程"""
+        try:
+            self.reaped_processes += reap_orphan_browsers(BROWSER_MARKER, self.scraper.browser_pids())
+            self.memory = get_memory_stats()
+            if self.memory['browser_rss_mb'] > self.memory_limit_mb:
+                self.recycle_driver(f"浏览器内存 {self.memory['browser_rss_mb']}MB 超过上限 {self.memory_limit_mb:.0f}MB")
+                self.memory = get_memory_stats()
+        except Exception as e:
+            logger.warning(f"内存检查失败: {e}")
+
+    def recycle_driver(self, reason):
+        """关闭浏览器，下次检查时重新启动"""
+        if self.scraper.driver is None:
+            return
+        logger.info(f"♻️  回收浏览器: {reason}")
+        try:
+            self.scraper.close()
+        except Exception as e:
+            logger.warning(f"关闭浏览器失败，交由孤儿进程清理处理: {e}")
+            self.scraper.driver = None
+        self.driver_recycles += 1
+
+    def status(self):
+        """当前运行状态，包括内存统计"""
+        return {
+            'started_at': self.started_at.strftime('%Y-%m-%d %H:%M:%S'),
+            'last_poll_time': self.last_poll_time.strftime('%Y-%m-%d %H:%M:%S') if self.last_poll_time else None,
+            'polls': self.polls,
+            'failed_polls': self.failed_polls,
+            'driver_recycles': self.driver_recycles,
+            'reaped_processes': self.reaped_processes,
+            'memory': self.memory,
+            'selector_drift': self.scraper.selector_drift,
+            'subscriptions': [sub.name for sub in self.monitor.ruleset.subscriptions],
+            'alert_latency': self.monitor.slot_tracker.report(),
+            'cluster': self.cluster_status(),
+        }
+
+    def cluster_status(self):
+        """集群状态，单节点时为 None"""
+        if not self.coordinator:
+            return None
+        try:
+            return self.coordinator.status()
+        except Exception as e:
+            return {'error': str(e)}
+
+    def log_status(self):
+        """输出运行状态"""
+        memory = self.memory or {}
+        logger.info(
+            f"📊 运行状态: 第 {self.polls} 次检查 (失败 {self.failed_polls}) | "
+            f"Python {memory.get('python_rss_mb', 0)}MB | "
+            f"浏览器 {memory.get('browser_rss_mb', 0)}MB ({memory.get('browser_processes', 0)} 个进程) | "
+            f"回收浏览器 {self.driver_recycles} 次 | 清理孤儿进程 {self.reaped_processes} 个"
+        )
+
+    def next_interval(self):
+        """根据放号预测决定下一次检查的间隔 (分钟)"""
+        if self.fast_interval_minutes >= self.interval_minutes:
+            return self.interval_minutes
+        return self.monitor.forecaster.next_interval(
+            datetime.now(), self.interval_minutes, self.fast_interval_minutes, self.monitor.monitor_locations
+        )
+
+    def process_cluster_snapshot(self):
+        """通知节点：筛选集群中最新的抓取结果并发送通知"""
+        snapshot = self.coordinator.take_snapshot()
+        if not snapshot:
+            return
+        node_id, locations_data = snapshot
+        logger.info(f"📥 处理节点 {node_id} 的抓取结果 ({len(locations_data)} 个位置)")
+        self.monitor.check_and_notify(locations_data)
+        # 放号预测只在通知节点上积累，由它决定整个集群的检查间隔
+        self.coordinator.set_interval(self.next_interval() * 60)
+        if self.status_server:
+            self.status_server.publish(locations_data, self.monitor.last_matching_slots, self.status())
+
+    def run_cluster(self):
+        """集群模式：每个循环更新心跳、竞选通知节点、领取检查轮次"""
+        logger.info(f"🚀 集群节点 {self.coordinator.node_id} 启动，集群每 {self.interval_minutes} 分钟检查一次")
+        if self.status_server:
+            self.status_server.start()
+        try:
+            while True:
+                try:
+                    self.coordinator.heartbeat()
+                    self.is_notifier = self.coordinator.is_notifier()
+                    if self.coordinator.claim_poll(self.interval_minutes * 60):
+                        self.poll()
+                        self.log_status()
+                        # 检查可能耗时较长，结束后立即续期
+                        self.coordinator.heartbeat()
+                        self.is_notifier = self.coordinator.is_notifier()
+                    if self.is_notifier:
+                        self.process_cluster_snapshot()
+                except Exception as e:
+                    # 数据库暂时不可用时等待下一个循环，租约到期后由其他节点接管
+                    logger.error(f"集群协调失败: {e}")
+                time.sleep(self.coordinator.tick_seconds)
+        finally:
+            self.recycle_driver("集群节点退出")
+            self.coordinator.leave()
+            if self.status_server:
+                self.status_server.stop()
+
+    def run_forever(self):
+        """按间隔持续检查，直到被中断"""
+        logger.info(f"🚀 常驻监控启动，每 {self.interval_minutes} 分钟检查一次，浏览器内存上限 {self.memory_limit_mb:.0f}MB")
+        if self.status_server:
+            self.status_server.start()
+        try:
+            while True:
+                self.poll()
+                self.log_status()
+                time.sleep(self.next_interval() * 60)
+        finally:
+            self.recycle_driver("常驻监控退出")
+            if self.status_server:
+                self.status_server.stop()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+进程内存统计
+统计 Python 进程及其 chromedriver / Chrome 子进程的 RSS
+"""
+
+import logging
+import os
+import socket
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+BROWSER_PROCESS_NAMES = ('chrome', 'chromium', 'chromedriver')
+
+
+def is_browser_process(proc):
+    """是否是 chromedriver / Chrome 进程"""
+    try:
+        name = proc.name().lower()
+    except (psutil.NoSuchProcess, psutil.AccessDenied):
+        return False
+    return any(browser in name for browser in BROWSER_PROCESS_NAMES)
+
+
+def chrome_profile_locked(profile_dir):
+    """
+    浏览器配置目录是否正被运行中的 Chrome 使用 (同一目录只能由一个 Chrome 打开)
+
+    Chrome 在配置目录中创建指向 "主机名-进程号" 的 SingletonLock 符号链接，
+    进程已退出的残留锁不算占用 (Chrome 启动时会自行清理)
+    """
+    try:
+        target = os.readlink(os.path.join(profile_dir, 'SingletonLock'))
+    except OSError:
+        return False
+    host, _, pid = target.rpartition('-')
+    if host != socket.gethostname():
+        # 其他主机的锁无法检查，按占用处理
+        return True
+    try:
+        return psutil.pid_exists(int(pid))
+    except ValueError:
+        return True
+
+
+def get_memory_stats(pid=None):
+    """
+    统计进程树内存占用 (MB)
+
+    Returns:
+        dict: python_rss_mb / browser_rss_mb / total_rss_mb / browser_processes
+    """
+    root = psutil.Process(pid or os.getpid())
+    python_rss = root.memory_info().rss
+    browser_rss = 0
+    browser_processes = 0
+
+    for child in root.children(recursive=True):
+        try:
+            rss = child.memory_info().rss
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            continue
+        if is_browser_process(child):
+            browser_rss += rss
+            browser_processes += 1
+
+    mb = 1024 * 1024
+    return {
+        'python_rss_mb': round(python_rss / mb, 1),
+        'browser_rss_mb': round(browser_rss / mb, 1),
+        'total_rss_mb': round((python_rss + browser_rss) / mb, 1),
+        'browser_processes': browser_processes,
+    }
+
+
+def _process_tree(pid):
+    """进程及其全部子孙进程的 PID"""
+    try:
+        return {pid} | {child.pid for child in psutil.Process(pid).children(recursive=True)}
+    except (psutil.NoSuchProcess, psutil.AccessDenied):
+        return set()
+
+
+def _has_marker(procs, marker):
+    """进程中是否有命令行带标记的 (即由本程序启动的 Chrome)"""
+    for proc in procs:
+        try:
+            if marker in (proc.cmdline() or []):
+                return True
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            continue
+    return False
+
+
+def reap_orphan_browsers(marker, keep_pids=()):
+    """
+    清理孤儿浏览器进程：父进程已退出 (被 init 收养) 且由本程序启动的 Chrome，
+    以及下面还有这类 Chrome 的 chromedriver。其他程序的 Selenium 进程不会被清理
+
+    本进程就是 PID 1 (容器中) 时孤儿进程会被本进程收养，此时只跳过 keep_pids
+    (当前正在使用的 chromedriver) 的进程树；否则跳过本进程的全部子孙进程
+
+    Args:
+        marker (str): 本程序启动 Chrome 时加入的命令行标记
+        keep_pids (iterable): 仍在使用、不能清理的浏览器进程
+
+    Returns:
+        int: 清理的进程数量
+    """
+    username = psutil.Process().username()
+    protected = set()
+    for pid in keep_pids:
+        protected |= _process_tree(pid)
+    if os.getpid() != 1:
+        protected |= _process_tree(os.getpid())
+    reaped = 0
+
+    for proc in psutil.process_iter(['name', 'ppid', 'cmdline', 'username']):
+        try:
+            if proc.pid in protected:
+                continue
+            if proc.info['ppid'] != 1 or proc.info['username'] != username:
+                continue
+            if not is_browser_process(proc):
+                continue
+            children = proc.children(recursive=True)
+            is_driver = 'chromedriver' in (proc.info['name'] or '').lower()
+            if is_driver:
+                if not _has_marker(children, marker):
+                    continue
+            elif marker not in (proc.info['cmdline'] or []):
+                continue
+
+            targets = children + [proc]
+            for target in targets:
+                target.kill()
+            psutil.wait_procs(targets, timeout=5)
+            reaped += len(targets)
+            logger.warning(f"已清理孤儿浏览器进程 {proc.pid} ({proc.info['name']})")
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            continue
+
+    return reaped
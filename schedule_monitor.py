@@ -4,6 +4,7 @@
 定时调度脚本 - 定期运行 Bupa 监控
 """
 
+import argparse
 import schedule
 import time
 import subprocess
@@ -11,19 +12,16 @@ import logging
 import os
 from datetime import datetime
 from dotenv import load_dotenv
+from circuit_breaker import CircuitBreaker
+from log_config import setup_logging
+from monitor_config import load_active_ruleset
+from slot_forecast import SlotForecaster
 
 # 加载环境变量
 load_dotenv()
 
-# 配置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('schedule_monitor.log'),
-        logging.StreamHandler()
-    ]
-)
+# 配置日志 (按大小轮转，LOG_FORMAT=json 时输出结构化日志)
+setup_logging(log_file='schedule_monitor.log')
 logger = logging.getLogger(__name__)
 
 def run_bupa_monitor():
@@ -32,6 +30,12 @@ def run_bupa_monitor():
         logger.info("=" * 60)
         logger.info(f"开始定时监控任务 - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         
+        # 站点熔断期间跳过本次任务，避免重复支付超时等待
+        breaker = CircuitBreaker()
+        if breaker.is_open():
+            logger.warning(f"⏸️  站点访问已熔断，跳过本次监控 (剩余 {breaker.remaining_backoff():.0f} 秒)")
+            return
+        
         # 运行监控脚本
         result = subprocess.run([
             'python', 'bupa_monitor.py'
@@ -41,52 +45,98 @@ def run_bupa_monitor():
         input='y\n'  # 自动选择无头模式
         )
         
+        # 子进程输出合并为一条日志记录，而不是逐行记录
         if result.returncode == 0:
             logger.info("✅ 监控任务执行成功")
             if result.stdout:
-                logger.info("程序输出:")
-                for line in result.stdout.strip().split('\n'):
-                    logger.info(f"  {line}")
+                output = result.stdout.strip()
+                logger.info("程序输出:\n%s", output,
+                            extra={'fields': {'event': 'child_output', 'lines': output.count('\n') + 1}})
         else:
-            logger.error("❌ 监控任务执行失败")
+            logger.error("❌ 监控任务执行失败 (返回码 %d)", result.returncode)
             if result.stderr:
-                logger.error("错误信息:")
-                for line in result.stderr.strip().split('\n'):
-                    logger.error(f"  {line}")
+                output = result.stderr.strip()
+                logger.error("错误信息:\n%s", output,
+                             extra={'fields': {'event': 'child_error', 'returncode': result.returncode}})
         
         logger.info(f"定时监控任务完成 - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         
     except Exception as e:
         logger.error(f"执行定时任务时发生错误: {e}")
 
+def get_check_interval():
+    """根据放号预测决定下一次检查的间隔 (分钟)"""
+    base = int(os.getenv('CHECK_INTERVAL', '30'))
+    fast = int(os.getenv('CHECK_INTERVAL_FAST', str(base)))
+    if fast >= base:
+        return base
+    try:
+        locations = list(load_active_ruleset().all_locations)
+    except Exception as e:
+        logger.warning(f"读取监控配置失败，按全部地点预测: {e}")
+        locations = None
+    return SlotForecaster().next_interval(datetime.now(), base, fast, locations)
+
+def run_and_reschedule():
+    """运行一次监控，然后按预测的间隔安排下一次"""
+    run_bupa_monitor()
+    interval = get_check_interval()
+    schedule.every(interval).minutes.do(run_and_reschedule)
+    logger.info(f"下一次检查安排在 {interval} 分钟后")
+    return schedule.CancelJob
+
 def main():
     """主函数"""
+    parser = argparse.ArgumentParser(description="Bupa Medical Visa Services 定时监控调度器")
+    parser.add_argument('--daemon', action='store_true',
+                        help='常驻模式：在本进程中复用浏览器，监控内存并自动回收')
+    parser.add_argument('--cluster', action='store_true',
+                        help='集群模式：常驻运行，与共享 CLUSTER_DB 的其他节点轮流检查并选出一个通知节点')
+    args = parser.parse_args()
+    
     check_interval = int(os.getenv('CHECK_INTERVAL', '30'))
     
     print("🕐 Bupa Medical Visa Services 定时监控调度器")
     print("=" * 60)
+    print(f"运行模式: {'集群节点' if args.cluster else '常驻进程' if args.daemon else '子进程'}")
     print(f"监控间隔: 每 {check_interval} 分钟运行一次")
     print("监控内容: Perth/Booragoon/Fremantle 在 2025-08-29 之前的预约")
     print("日志文件: schedule_monitor.log")
     print("-" * 60)
     
     # 检查依赖文件
-    required_files = ['.env', 'bupa_monitor.py', 'bupa_scraper_v2.py', 'email_notifier.py']
+    required_files = ['.env', 'bupa_monitor.py', 'bupa_scraper_v2.py', 'email_notifier.py', 'circuit_breaker.py']
     missing_files = [f for f in required_files if not os.path.exists(f)]
     
     if missing_files:
         print(f"❌ 缺少必要文件: {', '.join(missing_files)}")
         return
     
-    # 设置定时任务
-    schedule.every(check_interval).minutes.do(run_bupa_monitor)
+    if args.cluster:
+        from cluster_coordinator import ClusterCoordinator
+        from monitor_daemon import MonitorDaemon
+        try:
+            MonitorDaemon(interval_minutes=check_interval, coordinator=ClusterCoordinator()).run_cluster()
+        except KeyboardInterrupt:
+            logger.info("🛑 集群节点已停止")
+            print("\n🛑 集群节点已停止")
+        return
+    
+    if args.daemon:
+        from monitor_daemon import MonitorDaemon
+        try:
+            MonitorDaemon(interval_minutes=check_interval).run_forever()
+        except KeyboardInterrupt:
+            logger.info("🛑 常驻监控已停止")
+            print("\n🛑 常驻监控已停止")
+        return
     
     logger.info(f"🚀 定时监控调度器启动，每 {check_interval} 分钟检查一次")
     logger.info("按 Ctrl+C 停止调度器")
     
-    # 立即执行一次
+    # 立即执行一次，之后每次运行结束时按放号预测安排下一次
     print("🤖 执行初始检查...")
-    run_bupa_monitor()
+    run_and_reschedule()
     
     # 开始定时循环
     try:
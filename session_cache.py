@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ASP.NET 会话缓存
+保存预约网站的会话 Cookie，下次运行时直接进入位置选择页面，
+省去首页加载和 'New Individual booking' 的 postback
+"""
+
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class SessionCache:
+    def __init__(self, cache_file=None, max_age=None):
+        """
+        初始化会话缓存
+
+        Args:
+            cache_file (str): 缓存文件路径
+            max_age (float): 会话最长复用秒数，超过后重新建立会话
+        """
+        self.cache_file = cache_file or os.getenv('SESSION_CACHE_FILE', '.bupa_session.json')
+        self.max_age = max_age or float(os.getenv('SESSION_MAX_AGE', '3600'))
+
+    def load(self):
+        """读取未过期的会话 Cookie，没有可用会话时返回空列表"""
+        if not os.path.exists(self.cache_file):
+            return []
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            age = time.time() - data.get('created_at', 0)
+            if age > self.max_age:
+                logger.info(f"缓存会话已超过 {self.max_age:.0f} 秒，重新建立会话")
+                self.invalidate()
+                return []
+            return data.get('cookies', [])
+        except Exception as e:
+            logger.warning(f"读取会话缓存失败: {e}")
+            return []
+
+    def save(self, cookies):
+        """保存会话 Cookie；会话未变化时保留原创建时间"""
+        if not cookies:
+            return
+        try:
+            created_at = time.time()
+            if os.path.exists(self.cache_file):
+                with open(self.cache_file, 'r', encoding='utf-8') as f:
+                    previous = json.load(f)
+                if self._session_ids(previous.get('cookies', [])) == self._session_ids(cookies):
+                    created_at = previous.get('created_at', created_at)
+            with open(self.cache_file, 'w', encoding='utf-8') as f:
+                json.dump({'created_at': created_at, 'cookies': cookies}, f)
+        except Exception as e:
+            logger.warning(f"保存会话缓存失败: {e}")
+
+    def invalidate(self):
+        """删除缓存的会话"""
+        try:
+            if os.path.exists(self.cache_file):
+                os.remove(self.cache_file)
+        except Exception as e:
+            logger.warning(f"删除会话缓存失败: {e}")
+
+    @staticmethod
+    def _session_ids(cookies):
+        """提取会话标识，用于判断是否仍是同一个会话"""
+        return sorted((c.get('name'), c.get('value')) for c in cookies if 'session' in c.get('name', '').lower())
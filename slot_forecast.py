@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+预约放号预测
+根据每次抓取的可用时间，按星期和小时统计各中心放出更早预约的规律，
+并估算预约时段的存续时间，用于在放号高峰期加密检查
+"""
+
+import json
+import logging
+import os
+import re
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+DAYS = 7
+HOURS = 24
+WEEKDAY_NAMES = ['周一', '周二', '周三', '周四', '周五', '周六', '周日']
+
+
+def parse_slot_date(availability_text):
+    """从可用时间文本中解析日期 (例如 "Friday 29/08/2025\\n10:15 AM")，无可用时段时返回 None"""
+    if not availability_text or "No available slot" in availability_text:
+        return None
+    date_match = re.search(r'(\d{1,2}/\d{1,2}/\d{4})', availability_text)
+    if not date_match:
+        return None
+    try:
+        return datetime.strptime(date_match.group(1), '%d/%m/%Y').date()
+    except ValueError:
+        return None
+
+
+def _new_stats(name):
+    """单个中心的初始统计数据"""
+    return {
+        'name': name,
+        'observations': 0,
+        'releases': 0,
+        # 按 [星期][小时] 统计的观测次数和放号次数
+        'observed_hist': [[0] * HOURS for _ in range(DAYS)],
+        'release_hist': [[0] * HOURS for _ in range(DAYS)],
+        'last_availability': None,
+        'last_date': None,
+        'since': None,
+        # 可用时间保持不变的时长 (秒)，Welford 增量均值和方差
+        'lifetime_count': 0,
+        'lifetime_mean': 0.0,
+        'lifetime_m2': 0.0,
+    }
+
+
+class SlotForecaster:
+    def __init__(self, state_file=None):
+        """
+        初始化预测器
+
+        Args:
+            state_file (str): 统计数据文件路径
+        """
+        self.state_file = state_file or os.getenv('FORECAST_STATE_FILE', 'slot_forecast.json')
+        self.threshold = float(os.getenv('FORECAST_THRESHOLD', '0.1'))
+        self.min_observations = int(os.getenv('FORECAST_MIN_OBSERVATIONS', '20'))
+        self.centres = {}
+        self._load()
+
+    def _load(self):
+        """读取已有统计数据"""
+        if not os.path.exists(self.state_file):
+            return
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                self.centres = json.load(f)
+        except Exception as e:
+            logger.warning(f"读取放号统计失败，重新开始统计: {e}")
+            self.centres = {}
+
+    def save(self):
+        """保存统计数据"""
+        try:
+            with open(self.state_file, 'w', encoding='utf-8') as f:
+                json.dump(self.centres, f, ensure_ascii=False)
+        except Exception as e:
+            logger.warning(f"保存放号统计失败: {e}")
+
+    def observe(self, location, when=None):
+        """
+        记录一个中心的一次观测，O(1)
+
+        Args:
+            location (dict): 爬虫提取的位置数据
+            when (datetime): 观测时间，默认取 extracted_time
+        """
+        if when is None:
+            try:
+                when = datetime.strptime(location['extracted_time'], '%Y-%m-%d %H:%M:%S')
+            except (KeyError, ValueError):
+                when = datetime.now()
+
+        stats = self.centres.get(location['location_id'])
+        if stats is None:
+            stats = self.centres[location['location_id']] = _new_stats(location['location_name'].strip())
+
+        weekday, hour = when.weekday(), when.hour
+        timestamp = when.timestamp()
+        availability = location['availability']
+        slot_date = parse_slot_date(availability)
+        last_date = stats['last_date']
+
+        stats['observations'] += 1
+        stats['observed_hist'][weekday][hour] += 1
+
+        # 出现了比上一次更早的预约 (或从无到有)，视为一次放号
+        if stats['observations'] > 1 and slot_date and (last_date is None or slot_date.isoformat() < last_date):
+            stats['releases'] += 1
+            stats['release_hist'][weekday][hour] += 1
+
+        # 可用时间发生变化：上一个时段的存续时间结束
+        if availability != stats['last_availability']:
+            if stats['last_date'] is not None and stats['since'] is not None:
+                self._add_lifetime(stats, timestamp - stats['since'])
+            stats['since'] = timestamp
+            stats['last_availability'] = availability
+
+        stats['last_date'] = slot_date.isoformat() if slot_date else None
+
+    def observe_all(self, locations_data, when=None):
+        """记录一次抓取中所有中心的观测"""
+        for location in locations_data:
+            self.observe(location, when)
+
+    @staticmethod
+    def _add_lifetime(stats, seconds):
+        """Welford 增量更新存续时间的均值和方差"""
+        stats['lifetime_count'] += 1
+        delta = seconds - stats['lifetime_mean']
+        stats['lifetime_mean'] += delta / stats['lifetime_count']
+        stats['lifetime_m2'] += delta * (seconds - stats['lifetime_mean'])
+
+    def _select(self, location_names=None):
+        """按名称筛选中心，为空时返回全部"""
+        if not location_names:
+            return list(self.centres.values())
+        names = set(location_names)
+        return [stats for stats in self.centres.values() if stats['name'] in names]
+
+    def release_probability(self, weekday, hour, location_names=None):
+        """某个星期/小时时段内每次检查观测到放号的概率，观测不足时返回 None"""
+        selected = self._select(location_names)
+        observed = sum(stats['observed_hist'][weekday][hour] for stats in selected)
+        total = sum(stats['observations'] for stats in selected)
+        if total < self.min_observations:
+            return None
+        releases = sum(stats['release_hist'][weekday][hour] for stats in selected)
+        # 向整体放号率收缩，避免观测很少的时段得到极端概率
+        overall = sum(stats['releases'] for stats in selected) / total
+        return (releases + 2 * overall) / (observed + 2)
+
+    def next_interval(self, now, base_minutes, fast_minutes, location_names=None):
+        """当前或下一个小时是放号高峰时返回加密的检查间隔，否则返回常规间隔"""
+        upcoming = now + timedelta(hours=1)
+        probabilities = [
+            self.release_probability(now.weekday(), now.hour, location_names),
+            self.release_probability(upcoming.weekday(), upcoming.hour, location_names),
+        ]
+        probabilities = [p for p in probabilities if p is not None]
+        if probabilities and max(probabilities) >= self.threshold:
+            logger.info(f"🔮 预测当前处于放号高峰 (概率 {max(probabilities):.0%})，检查间隔缩短为 {fast_minutes} 分钟")
+            return fast_minutes
+        return base_minutes
+
+    def summary(self, location_names=None, top=3):
+        """各中心放号最集中的时段和平均存续时间"""
+        result = []
+        for stats in self._select(location_names):
+            buckets = [
+                (stats['release_hist'][d][h], d, h)
+                for d in range(DAYS) for h in range(HOURS) if stats['release_hist'][d][h]
+            ]
+            buckets.sort(reverse=True)
+            lifetime_std = (stats['lifetime_m2'] / (stats['lifetime_count'] - 1)) ** 0.5 if stats['lifetime_count'] > 1 else 0.0
+            result.append({
+                'location_name': stats['name'],
+                'observations': stats['observations'],
+                'releases': stats['releases'],
+                'top_windows': [f"{WEEKDAY_NAMES[d]} {h:02d}:00 ({count} 次)" for count, d, h in buckets[:top]],
+                'mean_lifetime_minutes': round(stats['lifetime_mean'] / 60, 1),
+                'lifetime_std_minutes': round(lifetime_std / 60, 1),
+            })
+        return result
+
+
+def main():
+    """输出放号统计"""
+    forecaster = SlotForecaster()
+    if not forecaster.centres:
+        print("暂无放号统计数据")
+        return
+
+    print("📈 预约放号统计")
+    print("=" * 60)
+    for item in forecaster.summary():
+        print(f"🏥 {item['location_name']}: 观测 {item['observations']} 次, 放号 {item['releases']} 次, "
+              f"平均存续 {item['mean_lifetime_minutes']} 分钟 (±{item['lifetime_std_minutes']})")
+        if item['top_windows']:
+            print(f"   放号高峰: {', '.join(item['top_windows'])}")
+
+
+if __name__ == "__main__":
+    main()
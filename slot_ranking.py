@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+预约时段排序
+按预约日期距今天数、距离 (页面显示的距离，或订阅者坐标到中心的直线距离) 和中心类型
+为符合条件的时段打分，通知邮件和状态 API 中最好的时段排在最前。
+每个中心的距离、坐标等特征在多次检查之间缓存，中心信息变化时才重新计算
+"""
+
+import logging
+import math
+import os
+from datetime import datetime
+
+from location_pages import distance_km
+from slot_forecast import parse_slot_date
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def parse_coordinates(text):
+    """解析 "纬度,经度"，无法解析时返回 None"""
+    try:
+        lat, lng = (float(part) for part in str(text).split(','))
+    except (TypeError, ValueError):
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return None
+    return lat, lng
+
+
+def haversine_km(a, b):
+    """两个 (纬度, 经度) 之间的球面距离 (公里)"""
+    lat1, lng1, lat2, lng2 = map(math.radians, (a[0], a[1], b[0], b[1]))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(h))
+
+
+class SlotRanker:
+    def __init__(self, weight_days=None, weight_km=None, regional_penalty=None, near_km=None, urgent_days=None):
+        """
+        初始化排序器，得分越低越好 (以 "天" 为单位)
+
+        Args:
+            weight_days (float): 每晚一天增加的分数
+            weight_km (float): 每远一公里增加的分数
+            regional_penalty (float): 非 Bupa Centre 增加的分数
+            near_km (float): 距离在此以内的时段标记为就近 (只影响邮件中的突出显示)
+            urgent_days (int): 预约日期在此天数以内的时段标记为紧急 (立即发送)
+        """
+        self.weight_days = weight_days if weight_days is not None else float(os.getenv('RANK_WEIGHT_DAYS', '1.0'))
+        self.weight_km = weight_km if weight_km is not None else float(os.getenv('RANK_WEIGHT_KM', '0.2'))
+        self.regional_penalty = regional_penalty if regional_penalty is not None else \
+            float(os.getenv('RANK_REGIONAL_PENALTY', '1.0'))
+        self.near_km = near_km if near_km is not None else float(os.getenv('RANK_NEAR_KM', '10'))
+        self.urgent_days = urgent_days if urgent_days is not None else int(os.getenv('DIGEST_URGENT_DAYS', '3'))
+        # location_id -> (中心信息签名, 特征)
+        self._features = {}
+
+    def features(self, location, home=None):
+        """中心的特征，中心的距离、坐标、类型未变化时直接使用缓存"""
+        signature = (location['distance'], location['coordinates'], location['center_type'])
+        cached = self._features.get(location['location_id'])
+        if cached is None or cached[0] != signature:
+            cached = (signature, {
+                'distance_km': distance_km(location['distance']),
+                'coordinates': parse_coordinates(location['coordinates']),
+                'bupa_centre': location['center_type'] == "Bupa Centre",
+                'home_km': {},
+            })
+            self._features[location['location_id']] = cached
+        features = cached[1]
+
+        if home is not None and home not in features['home_km']:
+            features['home_km'][home] = haversine_km(home, features['coordinates']) \
+                if features['coordinates'] else features['distance_km']
+        return features
+
+    def rank(self, slots, home=None, urgent_days=None, today=None):
+        """
+        为时段打分并按得分排序 (同分保持原顺序)
+
+        Args:
+            slots (list): 符合条件的时段
+            home (tuple): 订阅者坐标 (纬度, 经度)，为空时使用页面显示的距离
+            urgent_days (int): 订阅自己的紧急天数，为空时使用默认值
+            today (date): 计算天数的基准日期
+
+        Returns:
+            list: 带 rank_score、rank_distance_km、urgent、near 字段的时段副本，最好的在前
+        """
+        today = today or datetime.now().date()
+        urgent_days = urgent_days if urgent_days is not None else self.urgent_days
+        ranked = []
+        for slot in slots:
+            features = self.features(slot, home)
+            km = features['home_km'][home] if home is not None else features['distance_km']
+            slot_date = parse_slot_date(slot['availability'])
+            days = (slot_date - today).days if slot_date else None
+
+            score = (days if days is not None else 0) * self.weight_days
+            score += (km if km != float('inf') else 0) * self.weight_km
+            if not features['bupa_centre']:
+                score += self.regional_penalty
+
+            ranked.append(dict(
+                slot,
+                rank_score=round(score, 2),
+                rank_distance_km=round(km, 1) if km != float('inf') else None,
+                urgent=days is not None and days <= urgent_days,
+                near=km <= self.near_km,
+            ))
+        ranked.sort(key=lambda slot: slot['rank_score'])
+        return ranked
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+预约时段存续与通知延迟统计
+跟踪每个可用时段从首次出现到消失的时间，记录每次通知的抓取、筛选、
+生成和发送时间，对比两者得出通知晚于时段消失的比例
+"""
+
+import json
+import logging
+import os
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+
+def _percentile(values, pct):
+    """简单分位数，空列表返回 None"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def slot_key(location):
+    """时段标识：同一中心的同一可用时间视为同一个时段"""
+    return f"{location['location_id']}|{location['availability']}"
+
+
+class SlotTracker:
+    # 保留的已消失时段和通知记录数量
+    MAX_FINISHED = 1000
+    MAX_ALERTS = 500
+
+    def __init__(self, state_file=None):
+        """
+        初始化时段跟踪器
+
+        Args:
+            state_file (str): 状态文件路径
+        """
+        self.state_file = state_file or os.getenv('SLOT_TRACKER_FILE', 'slot_tracker.json')
+        self.active = {}
+        self.finished = []
+        self.alerts = []
+        self._load()
+
+    def _load(self):
+        """读取已有记录"""
+        if not os.path.exists(self.state_file):
+            return
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.active = data.get('active', {})
+            self.finished = data.get('finished', [])
+            self.alerts = data.get('alerts', [])
+        except Exception as e:
+            logger.warning(f"读取时段跟踪记录失败，重新开始统计: {e}")
+
+    def save(self):
+        """保存记录"""
+        try:
+            with open(self.state_file, 'w', encoding='utf-8') as f:
+                json.dump({'active': self.active, 'finished': self.finished, 'alerts': self.alerts},
+                          f, ensure_ascii=False)
+        except Exception as e:
+            logger.warning(f"保存时段跟踪记录失败: {e}")
+
+    @staticmethod
+    def scrape_time(locations_data):
+        """一次抓取的时间戳 (取最早的 extracted_time)"""
+        times = []
+        for location in locations_data:
+            try:
+                times.append(datetime.strptime(location['extracted_time'], '%Y-%m-%d %H:%M:%S').timestamp())
+            except (KeyError, ValueError):
+                continue
+        return min(times) if times else time.time()
+
+    def observe(self, locations_data, scrape_time=None):
+        """
+        记录一次抓取：新出现的时段开始计时，本次不再出现的时段标记为已消失
+
+        Args:
+            locations_data (list): 爬虫提取的位置数据
+            scrape_time (float): 抓取时间戳
+        """
+        scrape_time = scrape_time or self.scrape_time(locations_data)
+        seen = set()
+
+        for location in locations_data:
+            if not location['has_available_slots']:
+                continue
+            key = slot_key(location)
+            seen.add(key)
+            slot = self.active.get(key)
+            if slot is None:
+                self.active[key] = {
+                    'location_name': location['location_name'].strip(),
+                    'availability': location['availability'],
+                    'first_seen': scrape_time,
+                    'last_seen': scrape_time,
+                }
+            else:
+                slot['last_seen'] = scrape_time
+
+        gone = {}
+        for key in [key for key in self.active if key not in seen]:
+            slot = self.active.pop(key)
+            # 时段在 last_seen 和本次抓取之间消失
+            slot['gone_at'] = scrape_time
+            gone[key] = slot
+            self.finished.append(slot)
+        del self.finished[:-self.MAX_FINISHED]
+
+        # 通知中的时段消失后补记到通知记录上
+        if gone:
+            for alert in self.alerts:
+                for key in alert['slots']:
+                    if key in gone and key not in alert['gone']:
+                        alert['gone'][key] = [gone[key]['last_seen'], gone[key]['gone_at']]
+
+    def record_alert(self, matching_slots, scrape_time, match_time, render_time, send_time):
+        """记录一次通知的各阶段时间戳"""
+        self.alerts.append({
+            'slots': [slot_key(slot) for slot in matching_slots],
+            'scrape_time': scrape_time,
+            'match_time': match_time,
+            'render_time': render_time,
+            'send_time': send_time,
+            'gone': {},
+        })
+        del self.alerts[:-self.MAX_ALERTS]
+        logger.info(
+            "通知延迟: 抓取→筛选 %.2fs, 筛选→生成 %.2fs, 生成→发送 %.2fs, 总计 %.2fs",
+            match_time - scrape_time, render_time - match_time, send_time - render_time, send_time - scrape_time,
+            extra={'fields': {
+                'event': 'alert_latency',
+                'slots': len(matching_slots),
+                'latency_seconds': round(send_time - scrape_time, 3),
+            }}
+        )
+
+    def report(self):
+        """时段存续时间分布、通知延迟分布以及通知晚于时段消失的比例"""
+        # 消失时间只能确定在两次抓取之间，取中点作为估计
+        lifetimes = [
+            ((slot['last_seen'] + slot['gone_at']) / 2 - slot['first_seen']) / 60
+            for slot in self.finished
+        ]
+        latencies = [alert['send_time'] - alert['scrape_time'] for alert in self.alerts]
+
+        # 通知发送后仍抓取到其中任一时段 (无论之后是否消失) 即视为及时；
+        # 否则要等通知中的时段消失后才能判断是否晚到
+        resolved = 0
+        on_time = 0
+        late_estimated = 0
+        late_certain = 0
+        for alert in self.alerts:
+            bounds = alert['gone'].values()
+            seen_times = [last_seen for last_seen, _ in bounds]
+            seen_times += [self.active[key]['last_seen'] for key in alert['slots'] if key in self.active]
+            if any(seen > alert['send_time'] for seen in seen_times):
+                resolved += 1
+                on_time += 1
+                continue
+            if not bounds:
+                continue
+            resolved += 1
+            if any(alert['send_time'] > (last_seen + gone_at) / 2 for last_seen, gone_at in bounds):
+                late_estimated += 1
+            if any(alert['send_time'] > gone_at for _, gone_at in bounds):
+                late_certain += 1
+
+        def distribution(values, digits):
+            return {
+                'count': len(values),
+                'p50': round(_percentile(values, 50), digits) if values else None,
+                'p90': round(_percentile(values, 90), digits) if values else None,
+                'min': round(min(values), digits) if values else None,
+                'max': round(max(values), digits) if values else None,
+            }
+
+        return {
+            'slot_lifetime_minutes': distribution(lifetimes, 1),
+            'alert_latency_seconds': distribution(latencies, 2),
+            'alerts_resolved': resolved,
+            'alerts_on_time': on_time,
+            'late_alert_ratio': round(late_estimated / resolved, 3) if resolved else None,
+            'late_alert_ratio_certain': round(late_certain / resolved, 3) if resolved else None,
+            'active_slots': len(self.active),
+        }
+
+
+def main():
+    """输出时段存续与通知延迟统计"""
+    report = SlotTracker().report()
+    lifetime = report['slot_lifetime_minutes']
+    latency = report['alert_latency_seconds']
+
+    print("⏱️  预约时段存续与通知延迟")
+    print("=" * 60)
+    print(f"已消失时段: {lifetime['count']} 个, 当前可用: {report['active_slots']} 个")
+    if lifetime['count']:
+        print(f"时段存续 (分钟): p50 {lifetime['p50']}, p90 {lifetime['p90']}, "
+              f"最短 {lifetime['min']}, 最长 {lifetime['max']}")
+    print(f"通知次数: {latency['count']}")
+    if latency['count']:
+        print(f"通知延迟 (秒): p50 {latency['p50']}, p90 {latency['p90']}, "
+              f"最短 {latency['min']}, 最长 {latency['max']}")
+    if report['alerts_resolved']:
+        print(f"已能判断是否及时的通知: {report['alerts_resolved']} 次 (及时 {report['alerts_on_time']} 次), "
+              f"估计晚到比例 {report['late_alert_ratio']:.1%} (确定晚到 {report['late_alert_ratio_certain']:.1%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地状态 API
+常驻监控进程内的 HTTP 服务，提供 /locations、/matches、/history、/health 和简单的看板页面。
+每次检查后整体替换内存快照，请求只读取预先序列化好的快照，不读磁盘也不阻塞爬虫
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+logger = logging.getLogger(__name__)
+
+DASHBOARD_HTML = """<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="utf-8">
+    <title>Bupa 预约监控</title>
+    <style>
+        body { font-family: Arial, sans-serif; margin: 20px; color: #333; }
+        table { border-collapse: collapse; width: 100%; }
+        th, td { border-bottom: 1px solid #ddd; padding: 6px 10px; text-align: left; }
+        tr.match { background-color: #d4edda; }
+        .muted { color: #888; }
+    </style>
+</head>
+<body>
+    <h2>🏥 Bupa Medical Visa Services 预约监控</h2>
+    <p id="health" class="muted">加载中...</p>
+    <table>
+        <thead><tr><th>位置</th><th>距离</th><th>可用时间</th><th>类型</th></tr></thead>
+        <tbody id="rows"></tbody>
+    </table>
+    <script>
+        async function refresh() {
+            const [locations, matches, health] = await Promise.all(
+                ['/locations', '/matches', '/health'].map(p => fetch(p).then(r => r.json())));
+            const matched = new Set(matches.map(m => m.location_id));
+            // 站点数据只通过 textContent 写入，不当作 HTML 解析
+            const rows = locations.map(loc => {
+                const tr = document.createElement('tr');
+                if (matched.has(loc.location_id)) tr.className = 'match';
+                for (const value of [loc.location_name, loc.distance,
+                                     String(loc.availability || '').replace(/\\n/g, ' '), loc.center_type]) {
+                    const td = document.createElement('td');
+                    td.textContent = value == null ? '' : value;
+                    tr.appendChild(td);
+                }
+                return tr;
+            });
+            document.getElementById('rows').replaceChildren(...rows);
+            document.getElementById('health').textContent =
+                `最近更新: ${health.updated_at || '-'} | 状态: ${health.status} | 符合条件: ${matches.length}`;
+        }
+        refresh();
+        setInterval(refresh, 30000);
+    </script>
+</body>
+</html>
+""".encode('utf-8')
+
+
+def _dumps(value):
+    """序列化为 UTF-8 JSON"""
+    return json.dumps(value, ensure_ascii=False).encode('utf-8')
+
+
+class StatusSnapshot:
+    """一次检查结果的只读快照，所有响应体在创建时序列化完成"""
+
+    def __init__(self, locations, matches, history_bodies, status, updated_at,
+                 locations_body=None, matches_body=None):
+        """
+        Args:
+            history_bodies (dict): location_id -> 已序列化的历史记录
+            locations_body (bytes): 已序列化的位置数据，为空时由 locations 序列化
+            matches_body (bytes): 已序列化的符合条件时段，为空时由 matches 序列化
+        """
+        self.locations_body = locations_body if locations_body is not None else _dumps(locations)
+        self.matches_body = matches_body if matches_body is not None else _dumps(matches)
+        self.history_bodies = history_bodies
+        self.locations = locations
+        self.matches = matches
+        self.status = status
+        self.updated_at = updated_at
+
+
+class StatusServer:
+    def __init__(self, host=None, port=None, history_size=None):
+        """
+        初始化状态服务
+
+        Args:
+            host (str): 监听地址，默认只监听本机
+            port (int): 监听端口
+            history_size (int): 每个位置保留的历史记录条数
+        """
+        self.host = host or os.getenv('STATUS_API_HOST', '127.0.0.1')
+        self.port = port if port is not None else int(os.getenv('STATUS_API_PORT', '8765'))
+        self.history_size = history_size or int(os.getenv('STATUS_HISTORY_SIZE', '288'))
+
+        self.started_at = time.time()
+        self.snapshot = StatusSnapshot([], [], {}, {}, None)
+        # 历史记录只由发布线程修改，请求线程只读取快照中的序列化结果
+        self._history = {}
+        self._httpd = None
+
+    def publish(self, locations_data=None, matching_slots=None, status=None):
+        """
+        发布新的快照；参数为 None 时沿用上一份快照中的数据
+
+        Args:
+            locations_data (list): 本次抓取的全部位置数据
+            matching_slots (list): 符合条件的预约时段
+            status (dict): 监控运行状态
+        """
+        previous = self.snapshot
+        updated_at = previous.updated_at
+        # 未变化的部分沿用上一份快照中已序列化的响应体
+        locations_body = previous.locations_body
+        matches_body = previous.matches_body
+        history_bodies = previous.history_bodies
+
+        if locations_data is not None:
+            updated_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            locations_body = None
+            history_bodies = dict(history_bodies)
+            for location in locations_data:
+                # 每条记录只序列化一次，响应体由已序列化的记录拼接而成
+                entries = self._history.setdefault(location['location_id'], deque(maxlen=self.history_size))
+                entries.append(_dumps({
+                    'extracted_time': location.get('extracted_time'),
+                    'availability': location['availability'],
+                    'has_available_slots': location['has_available_slots'],
+                }))
+                history_bodies[location['location_id']] = b'[' + b', '.join(entries) + b']'
+        else:
+            locations_data = previous.locations
+
+        if matching_slots is not None:
+            matches_body = None
+        else:
+            matching_slots = previous.matches
+        if status is None:
+            status = previous.status
+
+        # 整体替换引用，请求线程看到的总是完整的一份快照
+        self.snapshot = StatusSnapshot(locations_data, matching_slots, history_bodies, status, updated_at,
+                                       locations_body, matches_body)
+
+    def health(self):
+        """健康状态，包括快照时间和监控运行状态"""
+        snapshot = self.snapshot
+        return {
+            'status': 'ok' if snapshot.updated_at else 'starting',
+            'updated_at': snapshot.updated_at,
+            'uptime_seconds': round(time.time() - self.started_at),
+            'locations': len(snapshot.locations),
+            'matches': len(snapshot.matches),
+            'monitor': snapshot.status,
+        }
+
+    def start(self):
+        """在后台线程中启动 HTTP 服务"""
+        server = self
+
+        class Handler(StatusRequestHandler):
+            status_server = server
+
+        self._httpd = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._httpd.daemon_threads = True
+        thread = threading.Thread(target=self._httpd.serve_forever, name='status-api', daemon=True)
+        thread.start()
+        logger.info(f"📡 状态 API 已启动: http://{self.host}:{self._httpd.server_address[1]}/")
+        return self._httpd.server_address[1]
+
+    def stop(self):
+        """停止 HTTP 服务"""
+        if self._httpd:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+
+class StatusRequestHandler(BaseHTTPRequestHandler):
+    """只读请求处理，响应直接取自当前快照"""
+
+    protocol_version = 'HTTP/1.1'
+    # 头部和响应体分两次写出，关闭 Nagle 避免 keep-alive 连接上的延迟确认等待
+    disable_nagle_algorithm = True
+    status_server = None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        snapshot = self.status_server.snapshot
+
+        if url.path == '/locations':
+            self._send(200, snapshot.locations_body)
+        elif url.path == '/matches':
+            self._send(200, snapshot.matches_body)
+        elif url.path == '/history':
+            location_id = parse_qs(url.query).get('location_id', [None])[0]
+            if not location_id:
+                self._send_json(400, {'error': '缺少 location_id 参数'})
+            elif location_id not in snapshot.history_bodies:
+                self._send_json(404, {'error': f'未找到位置 {location_id}'})
+            else:
+                self._send(200, snapshot.history_bodies[location_id])
+        elif url.path == '/health':
+            self._send_json(200, self.status_server.health())
+        elif url.path in ('/', '/index.html'):
+            self._send(200, DASHBOARD_HTML, 'text/html; charset=utf-8')
+        else:
+            self._send_json(404, {'error': '未知路径'})
+
+    def _send_json(self, code, data):
+        self._send(code, json.dumps(data, ensure_ascii=False).encode('utf-8'))
+
+    def _send(self, code, body, content_type='application/json; charset=utf-8'):
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # 每个请求都写日志会成为瓶颈，只在 DEBUG 级别记录
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("%s - %s", self.address_string(), format % args)
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+"""测试公共配置：模块在仓库根目录，状态文件写入临时目录"""
+
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+# 会影响默认行为的环境变量，测试中一律清除
+ISOLATED_ENV = (
+    'GMAIL_USER', 'GMAIL_APP_PASSWORD', 'NOTIFICATION_EMAIL', 'MONITOR_LOCATIONS', 'CUTOFF_DATE',
+    'MONITOR_CONFIG_FILE', 'HOME_COORDINATES', 'DIGEST_WINDOW_SECONDS', 'DIGEST_URGENT_DAYS',
+    'DIGEST_QUEUE_FILE', 'RANK_WEIGHT_DAYS', 'RANK_WEIGHT_KM', 'RANK_REGIONAL_PENALTY', 'RANK_NEAR_KM',
+    'BUPA_BASE_URL', 'LEAN_BROWSER', 'SESSION_CACHE_FILE', 'CIRCUIT_STATE_FILE', 'LOCATION_MAX_PAGES',
+    'CLUSTER_DB', 'CLUSTER_NODE_ID', 'EXPORT_NDJSON_FILE', 'EXPORT_STATE_FILE', 'EXPORT_JSON_PRETTY',
+    'FORECAST_STATE_FILE', 'FORECAST_THRESHOLD', 'FORECAST_MIN_OBSERVATIONS',
+)
+
+
+@pytest.fixture(autouse=True)
+def isolated(tmp_path, monkeypatch):
+    """每个测试在独立的临时目录中运行，不读写仓库中的状态文件"""
+    for name in ISOLATED_ENV:
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
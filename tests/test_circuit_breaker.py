@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""熔断器状态转换、退避和自适应超时"""
+
+import time
+
+import pytest
+
+from circuit_breaker import CircuitBreaker
+
+
+@pytest.fixture
+def breaker(tmp_path):
+    return CircuitBreaker(state_file=str(tmp_path / "circuit.json"), failure_threshold=3,
+                          base_backoff=10, max_backoff=25)
+
+
+def test_opens_after_consecutive_failures(breaker):
+    breaker.record_failure("a")
+    breaker.record_failure("b")
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow_request()
+
+    breaker.record_failure("c")
+
+    assert breaker.is_open()
+    assert not breaker.allow_request()
+    # 一半固定、一半随机
+    assert 5 <= breaker.remaining_backoff() <= 10
+
+
+def test_success_resets_failure_count(breaker):
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.consecutive_failures == 1
+
+
+def test_half_open_probe_failure_doubles_backoff_up_to_the_cap(breaker):
+    for _ in range(3):
+        breaker.record_failure()
+    breaker.open_until = time.time() - 1
+
+    assert breaker.allow_request()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+    breaker.record_failure("probe")
+    assert breaker.trip_count == 2
+    assert 10 <= breaker.remaining_backoff() <= 20
+
+    breaker.open_until = time.time() - 1
+    breaker.allow_request()
+    breaker.record_failure("probe")
+    assert 12.5 <= breaker.remaining_backoff() <= 25
+
+
+def test_half_open_probe_success_closes(breaker):
+    for _ in range(3):
+        breaker.record_failure()
+    breaker.open_until = time.time() - 1
+    breaker.allow_request()
+
+    breaker.record_success()
+
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.trip_count == 0 and breaker.remaining_backoff() == 0
+
+
+def test_state_survives_a_restart(breaker):
+    for _ in range(3):
+        breaker.record_failure()
+
+    restored = CircuitBreaker(state_file=breaker.state_file)
+
+    assert restored.is_open()
+    assert restored.open_until == breaker.open_until
+
+
+def test_timeout_follows_p95_latency(breaker):
+    assert breaker.timeout_for("load_page", 20) == 20
+
+    for seconds in (1.0, 1.2, 1.5, 2.0, 4.0):
+        breaker.record_latency("load_page", seconds)
+
+    assert breaker.percentile("load_page", 95) == 4.0
+    assert breaker.timeout_for("load_page", 20) == 8.0
+    # 不超过原有默认值，也不低于最小超时
+    assert breaker.timeout_for("load_page", 6) == 6
+    for _ in range(50):
+        breaker.record_latency("load_page", 0.1)
+    assert breaker.timeout_for("load_page", 20) == breaker.min_timeout
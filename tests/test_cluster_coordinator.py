@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""多节点协调：通知租约、检查轮次和抓取结果交接"""
+
+import time
+
+import pytest
+
+from cluster_coordinator import ClusterCoordinator
+
+
+@pytest.fixture
+def nodes(tmp_path):
+    """共享同一个数据库的两个节点"""
+    db = str(tmp_path / "cluster.db")
+    a = ClusterCoordinator(db, node_id='node-a', tick_seconds=0.05, lease_seconds=0.5)
+    b = ClusterCoordinator(db, node_id='node-b', tick_seconds=0.05, lease_seconds=0.5)
+    a.heartbeat()
+    b.heartbeat()
+    return a, b
+
+
+def test_only_one_notifier_holds_the_lease(nodes):
+    a, b = nodes
+
+    assert a.is_notifier()
+    assert not b.is_notifier()
+    # 持有者续期
+    assert a.is_notifier()
+    assert b.status()['notifier'] == 'node-a'
+
+
+def test_lease_is_taken_over_after_leave_or_expiry(nodes):
+    a, b = nodes
+    assert a.is_notifier()
+
+    a.leave()
+    assert b.is_notifier()
+    assert b.live_nodes() == ['node-b']
+
+    time.sleep(0.6)
+    assert a.is_notifier()
+
+
+def test_polls_once_per_interval_and_take_turns(nodes):
+    a, b = nodes
+    interval = 0.2
+
+    assert a.claim_poll(interval)
+    assert not a.claim_poll(interval)
+    assert not b.claim_poll(interval)
+
+    time.sleep(interval)
+    # 轮到 node-b，node-a 不能抢先
+    assert not a.claim_poll(interval)
+    assert b.claim_poll(interval)
+    assert b.status()['last_poll_node'] == 'node-b'
+
+
+def test_missed_turn_is_taken_over(nodes):
+    a, b = nodes
+    interval = 0.2
+    assert a.claim_poll(interval)
+
+    # node-b 没有来领取，超过两个循环间隔后 node-a 接管
+    time.sleep(interval + 2 * a.tick_seconds + 0.05)
+    assert a.claim_poll(interval)
+
+
+def test_notifier_interval_overrides_local_interval(nodes):
+    a, b = nodes
+    a.set_interval(60)
+    assert b.claim_poll(0.01)
+
+    time.sleep(0.05)
+    assert not a.claim_poll(0.01)
+
+
+def test_snapshots_are_handed_over_once(nodes):
+    a, b = nodes
+    assert b.take_snapshot() is None
+
+    a.publish([{'location_id': '1'}])
+    a.publish([{'location_id': '2'}])
+
+    assert b.take_snapshot() == ('node-a', [{'location_id': '2'}])
+    assert b.take_snapshot() is None
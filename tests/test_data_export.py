@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""数据导出：原子替换、内容未变化时跳过、NDJSON 追加和文件权限"""
+
+import csv
+import json
+import os
+
+import pytest
+
+import data_export
+from data_export import DataExporter, atomic_write_bytes
+
+
+def row(location_id, availability, extracted_time='2026-10-19 10:00:00'):
+    return {
+        'location_id': location_id, 'location_name': f"Centre {location_id}", 'full_address': '',
+        'distance': '5 km', 'availability': availability, 'coordinates': '',
+        'center_type': 'Bupa Centre', 'has_available_slots': True, 'extracted_time': extracted_time,
+    }
+
+
+@pytest.fixture
+def exporter():
+    return DataExporter(state_file='export_state.json')
+
+
+def test_atomic_write_replaces_the_file_without_leftovers(tmp_path, monkeypatch):
+    path = tmp_path / "data.json"
+    path.write_bytes(b'old')
+
+    atomic_write_bytes(str(path), b'new')
+    assert path.read_bytes() == b'new'
+
+    def fail(fd):
+        raise OSError("disk full")
+    monkeypatch.setattr(os, 'fsync', fail)
+    with pytest.raises(OSError):
+        atomic_write_bytes(str(path), b'broken')
+    # 写入失败时目标文件不变，临时文件被删除
+    assert path.read_bytes() == b'new'
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['data.json']
+
+
+def test_unchanged_content_is_not_rewritten(exporter):
+    rows = [row('193', 'Monday 10/11/2026')]
+    assert exporter.export_csv(rows, 'data.csv')
+    assert exporter.export_json(rows, 'data.json')
+
+    # 只有抓取时间变化
+    later = [row('193', 'Monday 10/11/2026', extracted_time='2026-10-19 10:05:00')]
+    assert not exporter.export_csv(later, 'data.csv')
+    assert not DataExporter(state_file='export_state.json').export_json(later, 'data.json')
+
+    assert DataExporter(state_file='export_state.json').export_json([row('193', 'Tuesday 11/11/2026')], 'data.json')
+    assert json.load(open('data.json', encoding='utf-8'))[0]['availability'] == 'Tuesday 11/11/2026'
+    with open('data.csv', newline='', encoding='utf-8') as f:
+        assert [r['location_id'] for r in csv.DictReader(f)] == ['193']
+
+
+def test_deleted_export_is_written_again(exporter):
+    rows = [row('193', 'Monday 10/11/2026')]
+    exporter.export_json(rows, 'data.json')
+    os.remove('data.json')
+    assert exporter.export_json(rows, 'data.json')
+
+
+def test_ndjson_appends_only_changed_locations(exporter):
+    assert exporter.append_ndjson([row('193', 'a'), row('187', 'b')], 'changes.ndjson') == 2
+    assert exporter.append_ndjson([row('193', 'a', extracted_time='2026-10-19 10:05:00'), row('187', 'c')],
+                                  'changes.ndjson') == 1
+    assert DataExporter(state_file='export_state.json').append_ndjson([row('187', 'c')], 'changes.ndjson') == 0
+
+    lines = [json.loads(line) for line in open('changes.ndjson', encoding='utf-8')]
+    assert [(line['location_id'], line['availability']) for line in lines] == [('193', 'a'), ('187', 'b'), ('187', 'c')]
+
+
+def test_new_files_follow_the_umask_and_existing_files_keep_their_mode(exporter):
+    exporter.export_json([row('193', 'a')], 'data.json')
+    assert os.stat('data.json').st_mode & 0o777 == data_export._DEFAULT_MODE
+
+    os.chmod('data.json', 0o640)
+    exporter.export_json([row('193', 'b')], 'data.json')
+    assert os.stat('data.json').st_mode & 0o777 == 0o640
+
+
+def test_umask_is_read_without_changing_it():
+    current = os.umask(0o027)
+    try:
+        assert data_export._read_umask() == 0o027
+        assert os.umask(0o027) == 0o027
+    finally:
+        os.umask(current)
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""汇总模式：紧急时段立即发送，其余时段按收件人合并，失效时段被替换或移除"""
+
+import time
+from datetime import date, timedelta
+
+import pytest
+
+from email_notifier import DigestQueue, EmailNotifier
+
+CUTOFF = '2099-12-31'
+
+
+def slot(location_id, name, days, distance='20 km', **extra):
+    when = date.today() + timedelta(days=days)
+    return dict({
+        'location_id': location_id, 'location_name': name, 'full_address': f"{name} Medical Centre",
+        'distance': distance, 'availability': f"{when.strftime('%A %d/%m/%Y')}\n10:15 AM",
+        'coordinates': '', 'center_type': 'Regional Medical Centre', 'has_available_slots': True,
+        'extracted_time': '2026-10-19 10:00:00',
+    }, **extra)
+
+
+def plain_text(message):
+    return next(part.get_payload(decode=True).decode('utf-8')
+                for part in message.walk() if part.get_content_type() == 'text/plain')
+
+
+@pytest.fixture
+def notifier():
+    notifier = EmailNotifier({'user': 'monitor@example.com', 'password': 'secret', 'recipients': 'me@example.com',
+                              'locations': ['Perth', 'Fremantle'], 'digest_window': 600, 'urgent_days': 3})
+    notifier.sent = []
+    notifier._deliver = notifier.sent.extend
+    return notifier
+
+
+def expire_window():
+    """把收件人的合并窗口提前到已到期"""
+    queue = DigestQueue()
+    for entry in queue.pending.values():
+        entry['first_queued'] -= 3600
+    queue.save()
+
+
+def test_urgent_slot_is_sent_immediately(notifier):
+    assert notifier.notify([slot('193', 'Perth', 1)], CUTOFF)
+    assert len(notifier.sent) == 1
+    assert not DigestQueue().has_pending()
+
+
+def test_near_slots_are_still_batched_by_date(notifier):
+    # 距离很近但日期较远：只在邮件中突出显示，仍然排队合并
+    assert not notifier.notify([slot('193', 'Perth', 20, distance='4 km', urgent=False, near=True)], CUTOFF)
+    assert notifier.queued_slots == 1 and notifier.sent == []
+
+
+def test_default_centres_far_out_are_batched_across_checks(monkeypatch):
+    from load_test import OfflineMonitor
+    from monitor_config import parse_ruleset
+
+    monkeypatch.setenv('DIGEST_WINDOW_SECONDS', '3600')
+    monitor = OfflineMonitor(parse_ruleset({
+        'channels': {'email': {'user': 'monitor@example.com', 'password': 'secret'}},
+        'subscriptions': [{'name': 'perth', 'locations': ['Perth', 'Booragoon', 'Fremantle'],
+                           'cutoff_date': CUTOFF, 'recipients': ['me@example.com']}],
+    }, 'test'))
+    locations = [slot('193', 'Perth', 40, '4 km'), slot('185', 'Booragoon', 40, '7 km'),
+                 slot('187', 'Fremantle', 40, '15 km')]
+
+    for _ in range(3):
+        monitor.check_and_notify(locations)
+
+    assert monitor.delivered == []
+    assert len(DigestQueue().pending['me@example.com']['slots']) == 3
+
+
+def test_deferred_slots_wait_for_the_window(notifier):
+    assert not notifier.notify([slot('187', 'Fremantle', 20)], CUTOFF)
+    assert notifier.queued_slots == 1 and notifier.sent == []
+
+    expire_window()
+    assert notifier.notify([slot('187', 'Fremantle', 20)], CUTOFF)
+
+    recipients, message = notifier.sent[0]
+    assert recipients == ['me@example.com']
+    assert "1 个符合条件" in plain_text(message)
+    assert not DigestQueue().has_pending()
+
+
+def test_moved_slot_supersedes_the_queued_one(notifier):
+    original = slot('193', 'Perth', 20)
+    notifier.notify([original], CUTOFF)
+    moved = slot('193', 'Perth', 21)
+    notifier.notify([moved], CUTOFF)
+
+    queued = DigestQueue().pending['me@example.com']['slots']
+    assert list(queued) == ['193']
+    assert queued['193']['availability'] == moved['availability']
+
+    expire_window()
+    assert notifier.notify([moved], CUTOFF)
+    text = plain_text(notifier.sent[0][1])
+    assert "1 个符合条件" in text
+    assert moved['availability'].split('\n')[0] in text
+    assert original['availability'].split('\n')[0] not in text
+
+
+def test_vanished_slots_are_dropped_before_the_digest(notifier):
+    notifier.notify([slot('193', 'Perth', 20), slot('187', 'Fremantle', 25)], CUTOFF)
+    notifier.notify([slot('187', 'Fremantle', 25)], CUTOFF)
+    assert list(DigestQueue().pending['me@example.com']['slots']) == ['187']
+
+    expire_window()
+    # 没有符合条件的时段：已排队的时段都已失效，不再发送
+    assert not notifier.notify([], CUTOFF)
+    assert notifier.sent == []
+    assert not DigestQueue().has_pending()
+
+
+def test_prune_only_touches_its_own_subscription_scope():
+    queue = DigestQueue()
+    now = time.time()
+    queue.add('me@example.com', [slot('193', 'Perth', 20)], CUTOFF, now, scope='perth')
+    queue.add('me@example.com', [slot('500', 'Bunbury', 20)], CUTOFF, now, scope='south')
+
+    assert queue.prune('me@example.com', [], scope='perth') == 1
+    assert list(queue.pending['me@example.com']['slots']) == ['500']
+
+
+def test_failed_delivery_keeps_the_queue(notifier):
+    notifier.notify([slot('187', 'Fremantle', 20)], CUTOFF)
+    expire_window()
+
+    def fail(messages):
+        raise OSError("smtp down")
+    notifier._deliver = fail
+
+    assert not notifier.notify([slot('187', 'Fremantle', 20)], CUTOFF)
+    assert list(DigestQueue().pending['me@example.com']['slots']) == ['187']
+
+
+def test_urgent_slot_that_stays_listed_is_sent_once(notifier):
+    perth = slot('193', 'Perth', 1)
+    assert notifier.notify([perth], CUTOFF)
+    assert not notifier.notify([perth], CUTOFF)
+    assert notifier.unchanged_slots == 1 and len(notifier.sent) == 1
+
+    # 可预约时间变化后再次发送
+    assert notifier.notify([slot('193', 'Perth', 2)], CUTOFF)
+    assert len(notifier.sent) == 2
+
+
+def test_digest_is_not_resent_in_the_next_window(notifier):
+    fremantle = slot('187', 'Fremantle', 20)
+    notifier.notify([fremantle], CUTOFF)
+    expire_window()
+    assert notifier.notify([fremantle], CUTOFF)
+
+    assert not notifier.notify([fremantle], CUTOFF)
+    assert notifier.queued_slots == 0 and not DigestQueue().has_pending()
+    assert len(notifier.sent) == 1
+
+
+def test_sent_record_is_cleared_when_the_slot_goes_away(notifier):
+    perth = slot('193', 'Perth', 1)
+    notifier.notify([perth], CUTOFF)
+    notifier.notify([], CUTOFF)
+    assert 'me@example.com' not in DigestQueue().sent
+
+    # 同一时段重新出现 (例如被取消后再次放出) 时重新通知
+    assert notifier.notify([perth], CUTOFF)
+    assert len(notifier.sent) == 2
+
+
+def test_failed_delivery_is_not_recorded_as_sent(notifier):
+    def fail(messages):
+        raise OSError("smtp down")
+    notifier._deliver = fail
+    assert not notifier.notify([slot('193', 'Perth', 1)], CUTOFF)
+
+    notifier._deliver = notifier.sent.extend
+    assert notifier.notify([slot('193', 'Perth', 1)], CUTOFF)
+
+
+def test_monitor_clears_sent_records_when_nothing_matches(monkeypatch):
+    from load_test import OfflineMonitor
+    from monitor_config import parse_ruleset
+
+    monkeypatch.setenv('DIGEST_WINDOW_SECONDS', '3600')
+    monitor = OfflineMonitor(parse_ruleset({
+        'channels': {'email': {'user': 'monitor@example.com', 'password': 'secret'}},
+        'subscriptions': [{'name': 'perth', 'locations': ['Perth'], 'cutoff_date': CUTOFF,
+                           'recipients': ['me@example.com']}],
+    }, 'test'))
+    perth = slot('193', 'Perth', 1, '4 km')
+
+    monitor.check_and_notify([perth])
+    monitor.check_and_notify([perth])
+    assert len(monitor.delivered) == 1
+
+    monitor.check_and_notify([dict(perth, availability='No available slot', has_available_slots=False)])
+    assert 'me@example.com' not in DigestQueue().sent
+    monitor.check_and_notify([perth])
+    assert len(monitor.delivered) == 2
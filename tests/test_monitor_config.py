@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""订阅配置校验和热加载"""
+
+import json
+import os
+
+import pytest
+
+from monitor_config import ConfigWatcher, parse_ruleset
+
+CHANNELS = {'email': {'user': 'monitor@example.com', 'password': 'secret'}}
+
+
+def subscription(**overrides):
+    raw = {'name': 'perth', 'locations': ['Perth', 'Fremantle'], 'cutoff_date': '2026-12-31',
+           'recipients': ['me@example.com']}
+    raw.update(overrides)
+    return raw
+
+
+def write_config(path, subscriptions, mtime_ns):
+    """写入配置文件并设置修改时间，保证监视器能看到变化"""
+    path.write_text(json.dumps({'channels': CHANNELS, 'subscriptions': subscriptions}), encoding='utf-8')
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_parses_subscriptions():
+    ruleset = parse_ruleset({
+        'channels': CHANNELS,
+        'subscriptions': [
+            subscription(recipients='a@example.com, b@example.com', home=[-31.95, 115.86]),
+            subscription(name='south', locations='Bunbury', urgent_days=5),
+        ],
+    }, 'test')
+
+    perth, south = ruleset.subscriptions
+    assert list(perth.recipients) == ['a@example.com', 'b@example.com']
+    assert perth.home == (-31.95, 115.86)
+    assert list(south.locations) == ['Bunbury'] and south.urgent_days == 5
+    assert set(ruleset.all_locations) == {'Perth', 'Fremantle', 'Bunbury'}
+
+    config = ruleset.email_config(south)
+    assert config['recipients'] == ['me@example.com']
+    assert config['urgent_days'] == 5 and config['smtp_port'] == 587
+
+
+@pytest.mark.parametrize("overrides, message", [
+    ({'locations': []}, "locations"),
+    ({'cutoff_date': '31/12/2026'}, "cutoff_date"),
+    ({'recipients': ['not-an-email']}, "recipients"),
+    ({'channel': 'sms'}, "未定义的渠道"),
+    ({'urgent_days': '3'}, "urgent_days"),
+    ({'home': 'Perth'}, "home"),
+    ({'home': '-95,115'}, "home"),
+])
+def test_rejects_invalid_subscription(overrides, message):
+    with pytest.raises(ValueError, match=message):
+        parse_ruleset({'channels': CHANNELS, 'subscriptions': [subscription(**overrides)]}, 'test')
+
+
+def test_rejects_duplicate_names_and_missing_credentials():
+    with pytest.raises(ValueError, match="重复"):
+        parse_ruleset({'channels': CHANNELS, 'subscriptions': [subscription(), subscription()]}, 'test')
+    with pytest.raises(ValueError, match="password"):
+        parse_ruleset({'channels': {'email': {'user': 'x@example.com'}}, 'subscriptions': [subscription()]}, 'test')
+    with pytest.raises(ValueError, match="subscriptions"):
+        parse_ruleset({'channels': CHANNELS, 'subscriptions': []}, 'test')
+
+
+def test_watcher_swaps_valid_config_and_keeps_the_old_one_on_error(tmp_path):
+    path = tmp_path / "monitor_config.json"
+    write_config(path, [subscription()], 1_000_000_000_000_000_000)
+    watcher = ConfigWatcher(str(path))
+    assert watcher.poll() is False
+    assert [sub.name for sub in watcher.ruleset.subscriptions] == ['perth']
+
+    write_config(path, [subscription(), subscription(name='south', locations=['Bunbury'])],
+                 1_000_000_001_000_000_000)
+    assert watcher.poll() is True
+    assert [sub.name for sub in watcher.ruleset.subscriptions] == ['perth', 'south']
+
+    write_config(path, [subscription(cutoff_date='soon')], 1_000_000_002_000_000_000)
+    assert watcher.poll() is False
+    assert [sub.name for sub in watcher.ruleset.subscriptions] == ['perth', 'south']
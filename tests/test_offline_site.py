@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""对本地模拟网站运行真实的爬虫和监控流程 (RequestsDriver 代替 Chrome)"""
+
+import re
+import time
+
+import pytest
+
+from circuit_breaker import CircuitBreaker
+from fake_bupa_site import FakeBupaSite
+from load_test import OfflineMonitor, make_scraper
+from location_pages import SelectorDriftError, distance_km, parse_location_rows
+from monitor_config import parse_ruleset
+from session_cache import SessionCache
+
+
+@pytest.fixture
+def site():
+    site = FakeBupaSite(centres=250, page_size=100, available_rate=1.0, seed=7).start()
+    yield site
+    site.stop()
+
+
+@pytest.fixture
+def breaker(tmp_path):
+    return CircuitBreaker(state_file=str(tmp_path / "circuit.json"), failure_threshold=2,
+                          base_backoff=0.2, max_backoff=0.4)
+
+
+@pytest.fixture
+def scraper(site, breaker, tmp_path):
+    scraper = make_scraper('http', site.base_url, breaker, SessionCache(cache_file=str(tmp_path / "session.json")))
+    yield scraper
+    scraper.close()
+
+
+def broken_location_page(site):
+    """位置表格仍在，但类名、表头和可用时间都无法识别"""
+    render = site.render_location
+
+    def render_location(page=1):
+        html = render(page).replace(
+            "<thead><tr><th></th><th>Location</th><th>Distance</th><th>Next available</th></tr></thead>", "")
+        return re.sub(r'<td class="(tdloc_availability|loc-next-slot)">.*?</td>',
+                      '<td class="slot"><span>Call to book</span></td>', html, flags=re.S)
+    return render_location
+
+
+def test_paginated_listing_is_merged_in_distance_order(site, scraper):
+    success, locations = scraper.scrape()
+
+    assert success
+    assert len(locations) == 250
+    assert len({loc['location_id'] for loc in locations}) == 250
+    distances = [distance_km(loc['distance']) for loc in locations]
+    assert distances == sorted(distances)
+    assert [loc['location_name'] for loc in locations[:3]] == ["Perth", "Booragoon", "Fremantle"]
+    assert scraper.selector_drift is None
+
+
+def test_second_check_reuses_the_cached_session(site, scraper):
+    assert scraper.scrape()[0]
+    postbacks = site.stats['postbacks']
+
+    scraper.close()
+    success, locations = scraper.scrape()
+
+    assert success and len(locations) == 250
+    # 只有两个分页 postback，没有重新点击 btnInd
+    assert site.stats['postbacks'] == postbacks + 2
+
+
+def test_breaker_opens_during_outage_and_recovers(site, scraper, breaker):
+    site.error_rate = 1.0
+    for _ in range(2):
+        assert scraper.scrape() == (False, [])
+        scraper.close()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    # 熔断期间不访问网站
+    requests_before = site.stats['requests']
+    assert scraper.scrape() == (False, [])
+    assert site.stats['requests'] == requests_before
+
+    site.error_rate = 0.0
+    time.sleep(breaker.remaining_backoff())
+    success, locations = scraper.scrape()
+
+    assert success and len(locations) == 250
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_drift_falls_back_to_header_strategy(site, scraper):
+    expected = [loc['location_id'] for loc in scraper.scrape()[1]]
+
+    site.drift = True
+    success, locations = scraper.scrape()
+
+    assert success
+    assert [loc['location_id'] for loc in locations] == expected
+    assert scraper.selector_drift['strategy'] == "table+header"
+    assert scraper.selector_drift['error'] is None
+
+
+def test_drift_error_when_every_strategy_fails(site, scraper):
+    site.drift = True
+    with pytest.raises(SelectorDriftError) as raised:
+        parse_location_rows(broken_location_page(site)())
+    assert "css" in str(raised.value) and "header" in str(raised.value) and "content" in str(raised.value)
+
+    site.render_location = broken_location_page(site)
+    success, locations = scraper.scrape()
+
+    assert success and locations == []
+    assert scraper.selector_drift['strategy'] is None
+    assert "content" in scraper.selector_drift['error']
+
+
+def test_check_and_notify_sends_ranked_matches(site, scraper):
+    ruleset = parse_ruleset({
+        'channels': {'email': {'user': 'monitor@example.com', 'password': 'secret'}},
+        'subscriptions': [{'name': 'perth', 'locations': ['Perth', 'Booragoon', 'Fremantle'],
+                           'cutoff_date': '2099-12-31', 'recipients': ['me@example.com']}],
+    }, 'test')
+    monitor = OfflineMonitor(ruleset)
+    success, locations = scraper.scrape()
+    assert success
+
+    assert monitor.check_and_notify(locations)
+
+    assert len(monitor.delivered) == 1
+    recipients, message = monitor.delivered[0]
+    assert recipients == ['me@example.com']
+    text = next(part.get_payload(decode=True).decode('utf-8')
+                for part in message.walk() if part.get_content_type() == 'text/plain')
+    assert "Perth" in text and "Booragoon" in text and "Fremantle" in text
+    names = {slot['location_name'] for slot in monitor.last_matching_slots}
+    assert names == {"Perth", "Booragoon", "Fremantle"}
+    scores = [slot['rank_score'] for slot in monitor.last_matching_slots]
+    assert scores == sorted(scores)
+
+
+def test_timeout_is_passed_to_the_driver(site, breaker, tmp_path):
+    site.latency = 0.5
+    scraper = make_scraper('http', site.base_url, breaker, SessionCache(cache_file=str(tmp_path / "session.json")),
+                           timeout=0.1)
+    try:
+        started = time.time()
+        success, _ = scraper.scrape()
+        assert not success
+        assert scraper.driver is None or scraper.driver.timeout == 0.1
+        assert time.time() - started < 2
+    finally:
+        scraper.close()
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""放号预测：放号判定、概率收缩和高峰期加密检查"""
+
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from slot_forecast import SlotForecaster, parse_slot_date
+
+MONDAY = datetime(2026, 11, 2, 9, 0)
+FIRST_DATE = date(2026, 12, 1)
+
+
+def location(slot_date=None, location_id='193', name='Perth'):
+    availability = f"{slot_date.strftime('%A %d/%m/%Y')}\n10:15 AM" if slot_date else "No available slot"
+    return {'location_id': location_id, 'location_name': name, 'availability': availability}
+
+
+@pytest.fixture
+def forecaster():
+    return SlotForecaster(state_file='slot_forecast.json')
+
+
+def learn_monday_releases(forecaster, weeks):
+    """每周日多次看到较晚的日期，周一 9 点看到更早的日期 (一次放号)"""
+    for week in range(weeks):
+        sunday = MONDAY + timedelta(weeks=week, days=-1, hours=3)
+        for minute in range(12):
+            forecaster.observe(location(FIRST_DATE + timedelta(days=30)), sunday + timedelta(minutes=minute))
+        forecaster.observe(location(FIRST_DATE), MONDAY + timedelta(weeks=week))
+
+
+def test_parse_slot_date():
+    assert parse_slot_date("Friday 29/08/2025\n10:15 AM") == date(2025, 8, 29)
+    assert parse_slot_date("No available slot") is None
+    assert parse_slot_date("31/02/2025") is None
+
+
+def test_earlier_or_new_slots_count_as_releases(forecaster):
+    forecaster.observe(location(FIRST_DATE), MONDAY)
+    stats = forecaster.centres['193']
+    # 第一次观测没有可比较的基准
+    assert stats['releases'] == 0
+
+    forecaster.observe(location(FIRST_DATE - timedelta(days=3)), MONDAY + timedelta(hours=1))
+    assert stats['releases'] == 1 and stats['release_hist'][0][10] == 1
+
+    # 更晚的日期不是放号
+    forecaster.observe(location(FIRST_DATE + timedelta(days=5)), MONDAY + timedelta(hours=2))
+    forecaster.observe(location(None), MONDAY + timedelta(hours=3))
+    assert stats['releases'] == 1
+
+    # 从无到有
+    forecaster.observe(location(FIRST_DATE + timedelta(days=20)), MONDAY + timedelta(hours=4))
+    assert stats['releases'] == 2 and stats['release_hist'][0][13] == 1
+
+
+def test_sparse_buckets_shrink_towards_the_overall_rate(forecaster):
+    forecaster.min_observations = 0
+    forecaster.observe(location(FIRST_DATE + timedelta(days=30)), MONDAY - timedelta(hours=1))
+    for minute in range(8):
+        forecaster.observe(location(FIRST_DATE + timedelta(days=30)), MONDAY + timedelta(days=1, minutes=minute))
+    forecaster.observe(location(FIRST_DATE), MONDAY)
+
+    # 10 次观测 1 次放号：只观测过一次的时段不会得到 100%
+    overall = 1 / 10
+    assert forecaster.release_probability(0, 9) == pytest.approx((1 + 2 * overall) / 3)
+    assert forecaster.release_probability(3, 12) == pytest.approx(overall)
+    assert forecaster.release_probability(1, 9) == pytest.approx(2 * overall / 10)
+
+
+def test_fast_interval_needs_enough_observations(forecaster):
+    learn_monday_releases(forecaster, weeks=1)
+    assert forecaster.release_probability(0, 9) is None
+    assert forecaster.next_interval(MONDAY, 5, 1) == 5
+
+    learn_monday_releases(forecaster, weeks=3)
+    assert forecaster.next_interval(MONDAY, 5, 1) == 1
+    # 下一个小时是高峰时提前加密
+    assert forecaster.next_interval(MONDAY - timedelta(hours=1), 5, 1) == 1
+    # 其他时段仍是常规间隔
+    assert forecaster.next_interval(MONDAY + timedelta(days=2, hours=5), 5, 1) == 5
+    assert forecaster.next_interval(MONDAY - timedelta(days=1, hours=-3), 5, 1) == 5
+
+
+def test_statistics_are_per_selected_centre(forecaster):
+    learn_monday_releases(forecaster, weeks=3)
+    forecaster.save()
+
+    restored = SlotForecaster(state_file='slot_forecast.json')
+    assert restored.next_interval(MONDAY, 5, 1, ['Perth']) == 1
+    # 没有该中心的数据时不加密
+    assert restored.next_interval(MONDAY, 5, 1, ['Bunbury']) == 5
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""时段排序：天数、距离、中心类型和紧急标记"""
+
+from datetime import date, timedelta
+
+import pytest
+
+from slot_ranking import SlotRanker, haversine_km, parse_coordinates
+
+TODAY = date(2026, 11, 1)
+PERTH = (-31.9548200, 115.8526330)
+FREMANTLE = (-32.0554200, 115.7480100)
+
+
+def location(location_id, name, days, distance, coordinates='', bupa=False):
+    when = TODAY + timedelta(days=days)
+    return {
+        'location_id': location_id, 'location_name': name, 'distance': distance,
+        'availability': f"{when.strftime('%A %d/%m/%Y')}\n10:15 AM", 'coordinates': coordinates,
+        'center_type': "Bupa Centre" if bupa else "Regional Medical Centre",
+    }
+
+
+@pytest.fixture
+def ranker():
+    return SlotRanker(weight_days=1.0, weight_km=0.2, regional_penalty=1.0, near_km=10, urgent_days=3)
+
+
+def test_parse_coordinates():
+    assert parse_coordinates("-31.95,115.86") == (-31.95, 115.86)
+    assert parse_coordinates("Perth") is None
+    assert parse_coordinates("-95,115") is None
+    assert parse_coordinates(None) is None
+
+
+def test_haversine_distance():
+    assert haversine_km(PERTH, PERTH) == 0
+    assert haversine_km(PERTH, FREMANTLE) == pytest.approx(14.6, abs=0.5)
+
+
+def test_score_combines_days_distance_and_centre_type(ranker):
+    slots = [
+        location('1', 'Far soon', 2, '40 km'),            # 2 + 8 + 1 = 11
+        location('2', 'Near later', 6, '5 km', bupa=True),  # 6 + 1 = 7
+        location('3', 'Regional near', 6, '5 km'),         # 6 + 1 + 1 = 8
+    ]
+
+    ranked = ranker.rank(slots, today=TODAY)
+
+    assert [slot['location_name'] for slot in ranked] == ['Near later', 'Regional near', 'Far soon']
+    assert [slot['rank_score'] for slot in ranked] == [7.0, 8.0, 11.0]
+    assert ranked[0]['rank_distance_km'] == 5.0
+    # 返回的是副本，原数据不变
+    assert 'rank_score' not in slots[0]
+
+
+def test_urgent_by_days_and_near_by_distance(ranker):
+    ranked = {slot['location_name']: slot for slot in ranker.rank([
+        location('1', 'Soon', 3, '40 km'),
+        location('2', 'Near', 20, '7 km'),
+        location('3', 'Neither', 20, '40 km'),
+    ], today=TODAY)}
+
+    assert ranked['Soon']['urgent'] and not ranked['Soon']['near']
+    assert ranked['Near']['near'] and not ranked['Near']['urgent']
+    assert not ranked['Neither']['urgent'] and not ranked['Neither']['near']
+    # 订阅自己的紧急天数优先
+    assert ranker.rank([location('3', 'Neither', 20, '40 km')], urgent_days=30, today=TODAY)[0]['urgent']
+
+
+def test_home_coordinates_replace_page_distance(ranker):
+    slots = [
+        location('193', 'Perth', 5, '4 km', ','.join(map(str, PERTH)), bupa=True),
+        location('187', 'Fremantle', 5, '15 km', ','.join(map(str, FREMANTLE))),
+        location('999', 'Unknown', 5, '2 km'),
+    ]
+
+    ranked = {slot['location_name']: slot for slot in ranker.rank(slots, home=FREMANTLE, today=TODAY)}
+
+    assert ranked['Fremantle']['rank_distance_km'] == 0
+    assert ranked['Perth']['rank_distance_km'] == pytest.approx(14.6, abs=0.5)
+    # 没有坐标时沿用页面显示的距离
+    assert ranked['Unknown']['rank_distance_km'] == 2.0
+
+
+def test_features_are_cached_until_the_centre_changes(ranker):
+    perth = location('193', 'Perth', 5, '4 km', bupa=True)
+    first = ranker.features(perth)
+    assert ranker.features(dict(perth, availability='No available slot')) is first
+
+    moved = ranker.features(dict(perth, distance='6 km'))
+    assert moved is not first and moved['distance_km'] == 6.0
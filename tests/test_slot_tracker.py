@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""时段存续跟踪和通知晚到比例"""
+
+import pytest
+
+from slot_tracker import SlotTracker
+
+T = 1_800_000_000
+
+
+def location(location_id, availability):
+    return {'location_id': location_id, 'location_name': f"Centre {location_id}", 'availability': availability,
+            'has_available_slots': True}
+
+
+@pytest.fixture
+def tracker(tmp_path):
+    return SlotTracker(state_file=str(tmp_path / "slot_tracker.json"))
+
+
+def alert(tracker, slots, send_time):
+    tracker.record_alert(slots, send_time - 3, send_time - 2, send_time - 1, send_time)
+
+
+def test_slots_are_timed_until_they_disappear(tracker):
+    a, b = location('1', 'Monday 10/11/2026'), location('2', 'Tuesday 11/11/2026')
+    tracker.observe([a, b], scrape_time=T)
+    tracker.observe([a], scrape_time=T + 60)
+    tracker.observe([], scrape_time=T + 120)
+
+    report = tracker.report()
+    # 消失时间取两次抓取的中点
+    assert report['slot_lifetime_minutes']['count'] == 2
+    assert report['slot_lifetime_minutes']['min'] == 0.5
+    assert report['slot_lifetime_minutes']['max'] == 1.5
+    assert report['active_slots'] == 0
+
+
+def test_alert_is_on_time_once_a_slot_is_seen_after_sending(tracker):
+    a = location('1', 'Monday 10/11/2026')
+    tracker.observe([a], scrape_time=T)
+    alert(tracker, [a], send_time=T + 10)
+    assert tracker.report()['alerts_resolved'] == 0
+
+    # 时段仍然可用，但发送后已再次抓取到
+    tracker.observe([a], scrape_time=T + 60)
+    report = tracker.report()
+    assert report['alerts_resolved'] == 1 and report['alerts_on_time'] == 1
+    assert report['late_alert_ratio'] == 0 and report['late_alert_ratio_certain'] == 0
+
+
+def test_late_ratio_counts_all_resolved_alerts(tracker):
+    on_time, late, certain = location('1', 'a'), location('2', 'b'), location('3', 'c')
+    tracker.observe([on_time, late, certain], scrape_time=T)
+    alert(tracker, [on_time], send_time=T + 10)
+    # 在两次抓取的中点之后发送：估计晚到
+    alert(tracker, [late], send_time=T + 40)
+    tracker.observe([on_time, certain], scrape_time=T + 60)
+    # 在时段确定消失之后发送：确定晚到
+    alert(tracker, [certain], send_time=T + 130)
+    tracker.observe([on_time], scrape_time=T + 120)
+    tracker.observe([], scrape_time=T + 180)
+
+    report = tracker.report()
+    assert report['alerts_resolved'] == 3 and report['alerts_on_time'] == 1
+    assert report['late_alert_ratio'] == pytest.approx(2 / 3, abs=0.001)
+    assert report['late_alert_ratio_certain'] == pytest.approx(1 / 3, abs=0.001)
+
+
+def test_records_survive_a_restart(tracker):
+    a = location('1', 'Monday 10/11/2026')
+    tracker.observe([a], scrape_time=T)
+    alert(tracker, [a], send_time=T + 10)
+    tracker.save()
+
+    restored = SlotTracker(state_file=tracker.state_file)
+    restored.observe([], scrape_time=T + 60)
+    assert restored.alerts[0]['gone'] == {'1|Monday 10/11/2026': [T, T + 60]}
+    assert restored.report()['alerts_resolved'] == 1